@@ -54,6 +54,30 @@ INSTALLED_APPS = [
 
 ON_RAILWAY = bool(os.getenv('RAILWAY_ENVIRONMENT'))
 
+# Worker processes in the shared simulator pool, 0 uses every CPU
+SIMULATOR_WORKERS = int(os.getenv('SIMULATOR_WORKERS', '0'))
+# numba threading layer for the payout kernel (omp, tbb or workqueue). numba would pick
+# tbb first, but with tbb the server process hangs on exit once a background job has run
+# the kernel, so default to omp. Exported before numba is imported, which reads it then
+NUMBA_THREADING_LAYER = os.getenv('NUMBA_THREADING_LAYER', 'omp')
+os.environ['NUMBA_THREADING_LAYER'] = NUMBA_THREADING_LAYER
+# Start the pool and compile the numba kernels when the app loads
+SIMULATOR_WARM_UP = os.getenv('SIMULATOR_WARM_UP', 'True') == 'True'
+# Parsed slates kept per cache namespace, in memory and under MEDIA_ROOT/slate_cache
+SLATE_CACHE_SIZE = int(os.getenv('SLATE_CACHE_SIZE', '8'))
+# Optimizer MILP backend: 'cbc' solves each lineup in a new CBC process, 'highs' keeps
+# the model resident in HiGHS. highspy is an optional extra, not in requirements.txt,
+# install it (pip install highspy) before choosing 'highs'. Without it the optimizer
+# falls back to CBC
+OPTIMIZER_SOLVER = os.getenv('OPTIMIZER_SOLVER', 'cbc')
+# Randomized lineup streams the optimizer solves at once on the shared pool, 0 uses one
+# per pool worker and 1 keeps the sequential loop
+OPTIMIZER_WORKERS = int(os.getenv('OPTIMIZER_WORKERS', '0'))
+# Background simulation and optimizer jobs each server process runs at once
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '1'))
+# Days simulation and optimizer downloads stay available before a later run may remove them
+JOB_OUTPUT_DAYS = int(os.getenv('JOB_OUTPUT_DAYS', '7'))
+
 MEDIA_URL = '/media/'
 if ON_RAILWAY:
     MEDIA_ROOT = '/tmp/app_media' 
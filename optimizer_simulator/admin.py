@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import UploadedFile
+from .models import UploadedFile, Job
 
 # Register your models here.
 admin.site.register(UploadedFile)
+admin.site.register(Job)
@@ -24,3 +24,7 @@ class OptimizerConfig(AppConfig):
                     os.chmod(directory, 0o755)
             except Exception as e:
                 print(f"Error creating directory {directory}: {str(e)}")
+
+        # Start the simulator pool and compile its kernels before the first request needs them
+        from optimizer_simulator.utils.worker_pool import start_warm_up
+        start_warm_up()
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from optimizer_simulator.utils.simulator import NFL_GPP_Simulator, shared_ndarray
+from optimizer_simulator.utils.worker_pool import warm_up
+import numpy as np
+import time
+
+class Command(BaseCommand):
+    help = 'Compare tournament results ranked with float32 and float16 lineup scores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('config_path', help='simulator config.json to benchmark')
+        parser.add_argument('--site', default='dk')
+        parser.add_argument('--field-size', type=int, default=1000)
+        parser.add_argument('--iterations', type=int, default=1000)
+        parser.add_argument('--use-contest-data', action='store_true')
+        parser.add_argument('--use-lineup-input', action='store_true')
+
+    def handle(self, *args, **options):
+        simulator = NFL_GPP_Simulator(
+            site=options['site'],
+            field_size=options['field_size'],
+            num_iterations=options['iterations'],
+            use_contest_data=options['use_contest_data'],
+            use_lineup_input=options['use_lineup_input'],
+            config_path=options['config_path'],
+        )
+        # compile the kernels up front so they are not billed to the first dtype
+        warm_up()
+        simulator.generate_field_lineups()
+        num_iterations = simulator.num_iterations
+
+        # Both dtypes rank the exact same player samples, so every difference comes from precision
+        results = {}
+        timings = {}
+        samples_shape = (len(simulator.player_table), num_iterations)
+        with shared_ndarray(samples_shape, np.float32) as (samples_name, player_samples):
+            simulator.simulate_player_samples(samples_name, samples_shape)
+            for dtype in ('float32', 'float16'):
+                start_time = time.time()
+                results[dtype] = simulator.accumulate_tournament(player_samples, dtype)
+                timings[dtype] = time.time() - start_time
+            del player_samples
+
+        self.stdout.write(
+            f'{len(simulator.field_lineups)} unique lineups, {num_iterations} iterations'
+        )
+        for dtype, result in results.items():
+            self.stdout.write(
+                f'{dtype}: {timings[dtype]:.2f}s, '
+                f'{result["TieRate"]:.2%} of neighbouring ranked places tied'
+            )
+
+        # Differences in percentage points, the same units output() reports
+        counts = np.array([lineup['Count'] for lineup in simulator.field_lineups.values()])
+        roi_scale = (simulator.entry_fee or 1) * num_iterations / 100
+        reference, candidate = results['float32'], results['float16']
+        metrics = {
+            'Win %': (reference['Wins'], candidate['Wins'], num_iterations / 100),
+            'Top 1%': (reference['Top1Percent'], candidate['Top1Percent'], num_iterations / 100),
+            'Cash %': (reference['Cashes'], candidate['Cashes'], num_iterations / 100),
+            'ROI %': (reference['ROI'] / counts, candidate['ROI'] / counts, roi_scale),
+        }
+        for name, (expected, actual, scale) in metrics.items():
+            diff = np.abs(actual - expected) / scale
+            self.stdout.write(
+                f'{name}: max diff {diff.max():.3f}, mean diff {diff.mean():.4f}, '
+                f'{np.count_nonzero(diff)} lineups changed'
+            )
+
+        top_reference = np.argsort(-reference['ROI'] / counts, kind='stable')[:10]
+        top_candidate = np.argsort(-candidate['ROI'] / counts, kind='stable')[:10]
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(np.intersect1d(top_reference, top_candidate))}/10 of the top ROI lineups agree'
+        ))
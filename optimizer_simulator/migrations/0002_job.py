@@ -0,0 +1,31 @@
+from django.db import migrations, models
+import optimizer_simulator.utils.numpy_encoder
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimizer_simulator', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=32)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=16)),
+                ('phase', models.CharField(blank=True, max_length=64)),
+                ('timings', models.JSONField(default=dict)),
+                ('result', models.JSONField(blank=True, encoder=optimizer_simulator.utils.numpy_encoder.NumpyEncoder, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -1,4 +1,6 @@
+import uuid
 from django.db import models
+from optimizer_simulator.utils.numpy_encoder import NumpyEncoder
 
 # Create your models here.
 class UploadedFile(models.Model):
@@ -7,4 +9,39 @@ class UploadedFile(models.Model):
 
     def __str__(self):
         return self.file.name
-    
\ No newline at end of file
+    
+
+class Job(models.Model):
+    """A simulation or optimizer run executed in the background"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=32)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    # The phase currently running and the seconds each finished phase took, in order
+    phase = models.CharField(max_length=64, blank=True)
+    timings = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True, encoder=NumpyEncoder)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.kind} {self.id} ({self.status})'
+
+    @property
+    def done(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
@@ -814,7 +814,12 @@ document.addEventListener("DOMContentLoaded", function () {
             // Show loading overlay
             document.getElementById("loading-overlay").style.display = "flex";
 
-            fetch("/optimizer_simulator/run_optimizer/", {
+            if (typeof window.clearLineups === "function") {
+                window.clearLineups();
+            }
+
+            // The optimizer runs as a background job, lineups are shown as they are solved
+            fetch("/optimizer_simulator/optimizations/", {
                 method: "POST",
                 headers: {
                     "Content-Type": "application/json",
@@ -825,6 +830,12 @@ document.addEventListener("DOMContentLoaded", function () {
                 body: JSON.stringify(config),
             })
                 .then((response) => response.json())
+                .then((data) => {
+                    if (!data.success) {
+                        throw new Error(data.error);
+                    }
+                    return streamOptimizerLineups(data.job_id);
+                })
                 .then((data) => {
                     // Hide loading overlay
                     document.getElementById("loading-overlay").style.display =
@@ -854,9 +865,10 @@ document.addEventListener("DOMContentLoaded", function () {
                             });
                         }
 
-                        // Initialize lineup display
-                        if (typeof window.initializeLineups === "function") {
-                            window.initializeLineups(data.lineups);
+                        const sendBtn =
+                            document.getElementById("send-to-simulator");
+                        if (sendBtn) {
+                            sendBtn.style.display = "inline-block";
                         }
                     } else {
                         alert("Error running optimizer: " + data.error);
@@ -874,6 +886,44 @@ document.addEventListener("DOMContentLoaded", function () {
                 });
         });
 
+    // Page through a job's lineups until it finishes, then resolve with its results
+    function streamOptimizerLineups(jobId) {
+        let offset = 0;
+        return new Promise((resolve, reject) => {
+            const poll = () => {
+                fetch(
+                    `/optimizer_simulator/jobs/${jobId}/lineups/?offset=${offset}`
+                )
+                    .then((response) => response.json())
+                    .then((page) => {
+                        if (page.lineups.length > 0) {
+                            offset = page.next_offset;
+                            document.getElementById(
+                                "loading-overlay"
+                            ).style.display = "none";
+                            if (typeof window.appendLineups === "function") {
+                                window.appendLineups(page.lineups);
+                            }
+                        }
+
+                        if (page.status === "failed") {
+                            resolve({ success: false, error: page.error });
+                        } else if (page.done) {
+                            fetch(`/optimizer_simulator/jobs/${jobId}/result/`)
+                                .then((response) => response.json())
+                                .then(resolve)
+                                .catch(reject);
+                        } else {
+                            // more lineups may already be waiting
+                            setTimeout(poll, page.lineups.length > 0 ? 0 : 1000);
+                        }
+                    })
+                    .catch(reject);
+            };
+            poll();
+        });
+    }
+
     // Toggle configuration section
     const configHeader = document.querySelector(".config-header");
     if (configHeader) {
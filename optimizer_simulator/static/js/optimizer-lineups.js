@@ -100,6 +100,32 @@ window.initializeLineups = function (lineups) {
     renderLineup(0);
 };
 
+// Add lineups as a background optimizer job solves them, showing the first straight away
+window.appendLineups = function (lineups) {
+    if (!lineups || lineups.length === 0) {
+        return;
+    }
+
+    const wasEmpty = lineupData.length === 0;
+    lineupData = lineupData.concat(lineups);
+    document.getElementById("total-lineups").textContent = lineupData.length;
+    document.getElementById("lineups-section").style.display = "block";
+
+    if (wasEmpty) {
+        currentLineupIndex = 0;
+        renderLineup(0);
+    } else {
+        // the next button may have been disabled on what was the last lineup
+        document.getElementById("next-lineup").disabled =
+            currentLineupIndex === lineupData.length - 1;
+    }
+};
+
+window.clearLineups = function () {
+    lineupData = [];
+    currentLineupIndex = 0;
+};
+
 // Set up event listeners when DOM is loaded
 document.addEventListener("DOMContentLoaded", function () {
     document
@@ -170,11 +170,16 @@ function runSimulation(config) {
     if (loadingOverlay) {
         loadingOverlay.style.display = "flex";
     }
+    const loadingStatus = document.getElementById("loading-status");
+    if (loadingStatus) {
+        loadingStatus.textContent = "Running simulation...";
+    }
 
     // Collapse the config panel when running simulation
     toggleConfig(false);
 
-    fetch("/optimizer_simulator/run_simulation/", {
+    // The simulation runs as a background job, poll it until its results are ready
+    fetch("/optimizer_simulator/simulations/", {
         method: "POST",
         headers: {
             "Content-Type": "application/json",
@@ -189,6 +194,12 @@ function runSimulation(config) {
             }
             return response.json();
         })
+        .then((data) => {
+            if (!data.success) {
+                throw new Error(data.error);
+            }
+            return waitForJob(data.job_id);
+        })
         .then((data) => {
             if (data.success) {
                 if (typeof window.initializeLineups === "function") {
@@ -236,6 +247,44 @@ function runSimulation(config) {
         });
 }
 
+const simulationPhases = {
+    setup: "Loading players...",
+    field_lineups: "Generating field lineups...",
+    tournament: "Simulating tournament...",
+    output: "Writing results...",
+    results: "Preparing lineups...",
+};
+
+// Poll a background job, showing its phase, and resolve with its results
+function waitForJob(jobId) {
+    const loadingStatus = document.getElementById("loading-status");
+    return new Promise((resolve, reject) => {
+        const poll = () => {
+            fetch(`/optimizer_simulator/jobs/${jobId}/`)
+                .then((response) => response.json())
+                .then((job) => {
+                    if (job.status === "succeeded") {
+                        fetch(`/optimizer_simulator/jobs/${jobId}/result/`)
+                            .then((response) => response.json())
+                            .then(resolve)
+                            .catch(reject);
+                    } else if (job.status === "failed" || !job.success) {
+                        resolve({ success: false, error: job.error });
+                    } else {
+                        if (loadingStatus) {
+                            loadingStatus.textContent =
+                                simulationPhases[job.phase] ||
+                                "Waiting for a free simulator...";
+                        }
+                        setTimeout(poll, 1000);
+                    }
+                })
+                .catch(reject);
+        };
+        poll();
+    });
+}
+
 // Gather simulation configuration from form inputs
 function gatherSimulationConfig() {
     const customLineups = [];
@@ -1,3 +1,1335 @@
-from django.test import TestCase
+import collections
+import contextlib
+import copy
+import io
+import itertools
+import json
+import math
+import os
+import tempfile
+from unittest import mock, skipUnless
+import numpy as np
+import pandas as pd
+import pulp as plp
+from django.test import SimpleTestCase, override_settings
+from numba import jit
 
-# Create your tests here.
+from optimizer_simulator.utils import optimal_baseline, slate_cache
+from optimizer_simulator.utils.highs_model import HighsModel
+from optimizer_simulator.utils.optimizer import NFL_Optimizer
+from optimizer_simulator.utils.player_table import PlayerTable
+from optimizer_simulator.utils.simulation_result import SimulationResult, iter_chunks, stream_csv
+from optimizer_simulator.utils.simulator import (
+    NO_SALARY_LIMIT,
+    NFL_GPP_Simulator,
+    build_lineup_batch,
+    draw_player,
+    salary_boost,
+)
+
+MATCHUPS = {("KC", "BUF"), ("DAL", "PHI")}
+ROSTER = (("QB", 1), ("RB", 2), ("WR", 3), ("TE", 1), ("DST", 1))
+ROSTER_CONSTRUCTION = ["QB", "RB", "RB", "WR", "WR", "WR", "TE", "FLEX", "DST"]
+
+
+def make_player(player_id, name, positions, team, opp, row):
+    matchup = next(m for m in MATCHUPS if team in m)
+    # RBs, WRs and TEs are FLEX eligible, as load_projections marks them
+    if set(positions) & {"RB", "WR", "TE"}:
+        positions = positions + ["FLEX"]
+    return {
+        "ID": player_id,
+        "Name": name,
+        "Position": positions,
+        "Team": team,
+        "Opp": opp,
+        "Matchup": matchup,
+        "Salary": 3000 + 500 * (row % 12),
+        "Fpts": 5.0 + row % 7,
+        "fieldFpts": 4.5 + row % 5,
+        "Ceiling": 12.0 + row % 9,
+        "StdDev": 4.0,
+        "Ownership": 2.5 + row % 11,
+        "Correlations": {},
+    }
+
+
+def make_players():
+    # Two games of eight players a team, IDs 1000 up in table row order
+    players = []
+    for away, home in sorted(MATCHUPS):
+        for team, opp in ((away, home), (home, away)):
+            for position, count in ROSTER:
+                for n in range(count):
+                    row = len(players)
+                    players.append(
+                        make_player(str(1000 + row), f"{team} {position}{n}", [position],
+                                    team, opp, row)
+                    )
+    return players
+
+
+def make_table(players=None):
+    return PlayerTable(players or make_players(), MATCHUPS)
+
+
+@jit(nopython=True)
+def seed_numba(seed):
+    # numba's generator is separate from NumPy's and is only seeded from compiled code
+    np.random.seed(seed)
+
+
+def make_simulator(table, **attributes):
+    # A simulator holding only what the method under test reads, no slate files needed
+    sim = NFL_GPP_Simulator.__new__(NFL_GPP_Simulator)
+    sim.player_table = table
+    sim.roster_construction = ROSTER_CONSTRUCTION
+    sim.__dict__.update(attributes)
+    return sim
+
+
+class AccumulateTournamentTests(SimpleTestCase):
+    """accumulate_tournament ranks only the places that can pay, check it against a full
+    sort of every iteration paying each lineup the average of the places it fills
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(6)
+        self.table = make_table()
+        num_players = len(self.table)
+        self.field_lineups = {
+            index: {
+                "Lineup": [
+                    self.table.ids[row] for row in rng.choice(num_players, 9, replace=False)
+                ],
+                "Count": int(rng.integers(1, 4)),
+            }
+            for index in range(150)
+        }
+        self.num_iterations = 40
+        self.player_samples = rng.normal(
+            10, 5, size=(num_players, self.num_iterations)
+        ).astype(np.float32)
+
+    def simulator(self, payout_structure, block_size):
+        return make_simulator(
+            self.table,
+            field_lineups=self.field_lineups,
+            payout_structure=payout_structure,
+            entry_fee=3.0,
+            field_size=sum(x["Count"] for x in self.field_lineups.values()),
+            num_iterations=self.num_iterations,
+            sim_block_size=block_size,
+            sim_memory_mb=1,
+        )
+
+    def full_sort_results(self, sim):
+        lineup_rows = sim.get_lineup_rows()
+        num_lineups = len(lineup_rows)
+        counts = np.array([x["Count"] for x in sim.field_lineups.values()])
+        scores = sim.score_lineups(
+            self.player_samples,
+            lineup_rows,
+            np.empty((num_lineups, self.num_iterations), dtype=np.float32),
+        )
+        places = max(sim.field_size, int(counts.sum()))
+        payouts = np.full(places, -sim.entry_fee)
+        payouts[: len(sim.payout_structure)] += np.array(list(sim.payout_structure.values()))
+        num_top1pct = math.ceil(0.01 * num_lineups)
+
+        expected = {
+            name: np.zeros(num_lineups, dtype=np.int64)
+            for name in ("Wins", "Top1Percent", "Cashes")
+        }
+        expected["ROI"] = np.zeros(num_lineups)
+        for iteration in range(self.num_iterations):
+            place = 0
+            for rank, lineup in enumerate(np.argsort(-scores[:, iteration], kind="stable")):
+                expected["ROI"][lineup] += payouts[place : place + counts[lineup]].mean()
+                expected["Wins"][lineup] += rank == 0
+                expected["Cashes"][lineup] += rank < len(sim.payout_structure)
+                expected["Top1Percent"][lineup] += rank < num_top1pct
+                place += counts[lineup]
+        return expected
+
+    def assertMatchesFullSort(self, payout_structure, block_size):
+        sim = self.simulator(payout_structure, block_size)
+        results = sim.accumulate_tournament(self.player_samples, np.float32)
+        expected = self.full_sort_results(sim)
+        for name in ("Wins", "Top1Percent", "Cashes"):
+            np.testing.assert_array_equal(results[name], expected[name], err_msg=name)
+        np.testing.assert_allclose(results["ROI"], expected["ROI"], rtol=1e-9, atol=1e-6)
+        self.assertEqual(results["TieRate"], 0)
+
+    def test_partial_rank_matches_full_sort(self):
+        payouts = {0: 500.0, 1: 200.0, 2: 100.0, 3: 50.0, 4: 25.0, 5: 10.0, 6: 5.0}
+        for block_size in (1, 7, self.num_iterations):
+            with self.subTest(block_size=block_size):
+                self.assertMatchesFullSort(payouts, block_size)
+
+    def test_payouts_deeper_than_the_field(self):
+        # every lineup is ranked when more places pay than there are lineups
+        payouts = {place: 400.0 / (place + 1) for place in range(200)}
+        self.assertMatchesFullSort(payouts, 16)
+
+
+class DrawPlayerTests(SimpleTestCase):
+    """draw_player rejects binary search draws that don't fit and falls back to an exact
+    linear draw over the players that do
+    """
+
+    weights = np.array([1.0, 4.0, 2.0, 8.0, 5.0, 3.0, 6.0, 1.0])
+    salaries = np.array([3000, 4000, 5000, 6000, 7000, 8000, 9000, 9500])
+
+    def setUp(self):
+        self.candidates = np.arange(len(self.weights))
+        self.cum_weights = np.cumsum(self.weights[self.candidates])
+        self.in_lineup = np.zeros(len(self.weights), dtype=np.bool_)
+        self.group = np.zeros(len(self.weights), dtype=np.int64)
+
+    def draws(self, count, seed=17, min_salary=0, max_salary=NO_SALARY_LIMIT,
+              group=None, group_code=0, in_lineup=None):
+        seed_numba(seed)
+        return [
+            draw_player(
+                self.candidates,
+                self.cum_weights,
+                self.weights,
+                self.in_lineup if in_lineup is None else in_lineup,
+                self.salaries,
+                min_salary,
+                max_salary,
+                self.group if group is None else group,
+                group_code,
+                True,
+            )
+            for _ in range(count)
+        ]
+
+    def assertProportional(self, draws, fitting):
+        counts = np.bincount(draws, minlength=len(self.weights))
+        self.assertEqual(set(np.nonzero(counts)[0].tolist()), set(fitting))
+        expected = self.weights[fitting] / self.weights[fitting].sum()
+        np.testing.assert_allclose(counts[fitting] / len(draws), expected, atol=0.02)
+
+    def test_fixed_seed_baseline(self):
+        self.assertEqual(self.draws(12), [3, 4, 2, 1, 6, 4, 4, 4, 1, 3, 6, 1])
+        in_lineup = self.in_lineup.copy()
+        in_lineup[3] = True
+        self.assertEqual(
+            self.draws(12, min_salary=4000, max_salary=8000, in_lineup=in_lineup),
+            [4, 2, 1, 4, 4, 4, 1, 1, 1, 4, 4, 4],
+        )
+
+    def test_fallback_baseline(self):
+        # two of the eight players carry 2/30 of the weight, so most draws fall back
+        group = np.array([1, 0, 0, 0, 0, 0, 0, 1])
+        self.assertEqual(
+            self.draws(12, group=group, group_code=1),
+            [0, 7, 0, 0, 7, 0, 7, 0, 0, 0, 7, 0],
+        )
+
+    def test_draws_are_weighted_among_fitting_players(self):
+        self.assertProportional(self.draws(20000), list(range(8)))
+        self.assertProportional(self.draws(20000, max_salary=6000), [0, 1, 2, 3])
+
+    def test_fallback_draws_are_weighted(self):
+        group = np.array([1, 1, 0, 0, 0, 0, 0, 1])
+        self.assertProportional(self.draws(20000, group=group, group_code=1), [0, 1, 7])
+
+    def test_nothing_fits(self):
+        self.assertEqual(self.draws(3, min_salary=9600), [-1, -1, -1])
+        self.candidates = self.candidates[:0]
+        self.cum_weights = self.cum_weights[:0]
+        self.assertEqual(self.draws(1), [-1])
+
+
+def make_result(use_contest_data=True):
+    # Two lineups sharing all but one player, every column filled in by hand
+    players = {
+        "ID": np.array([str(100 + i) for i in range(10)]),
+        "Name": np.array(
+            [
+                "buf dst", "josh allen", "james cook", "ty johnson", "stefon diggs",
+                "khalil shakir", "gabe davis", "dalton kincaid", "amon-ra st. brown",
+                "a.j. brown #2",
+            ]
+        ),
+        "Position": np.array(["DST", "QB", "RB", "RB", "WR", "WR", "WR", "TE", "WR", "WR"]),
+        "Team": np.array(["BUF"] * 8 + ["DET", "PHI"]),
+    }
+    lineup_players = np.array(
+        [[0, 1, 2, 3, 4, 5, 6, 7, 8], [0, 1, 2, 3, 4, 5, 9, 7, 8]], dtype=np.int32
+    )
+    lineups = {
+        "Fpts": np.array([120.5, 118.25]),
+        "FieldFpts": np.array([110.0, 109.75]),
+        "Ceiling": np.array([180.0, 175.5]),
+        "Salary": np.array([49800, 50000]),
+        "Own%": np.array([1.5e-08, 2.25e-09]),
+        "Stack1 Type": np.array(["BUF 7", "BUF 6"]),
+        "Stack2 Type": np.array(["No Stack", "No Stack"]),
+        "Players vs DST": np.array([0, 0]),
+        "Type": np.array(["generated", "input"]),
+        "Wins": np.array([3, 0]),
+        "Top1Percent": np.array([12, 5]),
+        "Cashes": np.array([40, 22]),
+        "ROI": np.array([150.0, -80.5]),
+        "Count": np.array([2, 1]),
+    }
+    exposures = {
+        "Wins": np.array([3] * 9 + [0]),
+        "Top1Percent": np.array([17] * 9 + [5]),
+        "In": np.array([3] * 9 + [1]),
+        "ROI": np.array([69.5] * 9 + [-80.5]),
+        "Proj. Own%": np.array([10.0, 25.5, 30.0, 5.0, 22.0, 12.5, 8.0, 15.0, 20.0, 18.5]),
+    }
+    return SimulationResult(
+        "dk", 100, 200, use_contest_data, 5.0, players, lineup_players, lineups, exposures,
+        timestamp="2026-01-02_03-04-05",
+    )
+
+
+class SimulationResultTests(SimpleTestCase):
+    def test_save_load_round_trip(self):
+        result = make_result()
+        with tempfile.TemporaryDirectory() as out_dir:
+            path = result.save(out_dir)
+            self.assertEqual(os.listdir(out_dir), [result.result_filename])
+            loaded = SimulationResult.load(path)
+
+        for name in ("site", "field_size", "num_iterations", "use_contest_data", "entry_fee",
+                     "timestamp"):
+            self.assertEqual(getattr(loaded, name), getattr(result, name), name)
+        np.testing.assert_array_equal(loaded.lineup_players, result.lineup_players)
+        self.assertEqual(loaded.lineup_players.dtype, result.lineup_players.dtype)
+        for section in ("players", "lineups", "exposures"):
+            columns = getattr(result, section)
+            self.assertEqual(set(getattr(loaded, section)), set(columns), section)
+            for name, column in getattr(loaded, section).items():
+                np.testing.assert_array_equal(column, columns[name], err_msg=name)
+                self.assertEqual(column.dtype, columns[name].dtype, name)
+        self.assertEqual(list(loaded.lineup_rows()), list(result.lineup_rows()))
+        self.assertEqual(list(loaded.exposure_rows()), list(result.exposure_rows()))
+
+    def test_lineups_csv(self):
+        rows = list(make_result().lineup_rows())
+        self.assertEqual(
+            rows[1:],
+            [
+                "josh allen (101),james cook (102),ty johnson (103),stefon diggs (104),"
+                "khalil shakir (105),gabe davis (106),dalton kincaid (107),"
+                "amon-ra st. brown (108),buf dst (100),120.5,110.0,180.0,49800,1.5,$6.0,"
+                "15.0%,1.5e-08%,0.38%,BUF 7,No Stack,0,generated,2\n",
+                "josh allen (101),james cook (102),ty johnson (103),stefon diggs (104),"
+                "khalil shakir (105),a.j. brown -2 (109),dalton kincaid (107),"
+                "amon-ra st. brown (108),buf dst (100),118.25,109.75,175.5,50000,0.0,$2.5,"
+                "-8.05%,2.25e-09%,-0.4%,BUF 6,No Stack,0,input,1\n",
+            ],
+        )
+        rows = list(make_result(use_contest_data=False).lineup_rows())
+        self.assertEqual(
+            rows[2],
+            "josh allen (101),james cook (102),ty johnson (103),stefon diggs (104),"
+            "khalil shakir (105),a.j. brown -2 (109),dalton kincaid (107),"
+            "amon-ra st. brown (108),buf dst (100),118.25,109.75,175.5,50000,0.0%,2.5%,"
+            "2.25e-09%,BUF 6,No Stack,0,input,1\n",
+        )
+        self.assertNotIn("ROI%", rows[0])
+
+    def test_exposures_csv(self):
+        rows = list(make_result().exposure_rows())
+        self.assertEqual(
+            rows[0], "Player,Position,Team,Win%,Top1%,Sim. Own%,Proj. Own%,Avg. Return\n"
+        )
+        self.assertEqual(rows[1], "buf dst,DST,BUF,1.5%,8.5%,3.0%,10.0%,$0.12\n")
+        self.assertEqual(rows[-1], "a.j. brown -2,WR,PHI,0.0%,2.5%,1.0%,18.5%,$-0.4\n")
+
+    def test_stream_csv(self):
+        result = make_result()
+        with tempfile.TemporaryDirectory() as out_dir:
+            self.assertIsNone(stream_csv(result.lineups_filename, out_dir))
+            result.save(out_dir)
+            self.assertEqual(
+                "".join(stream_csv(result.lineups_filename, out_dir)),
+                "".join(result.lineup_rows()),
+            )
+            self.assertEqual(
+                "".join(stream_csv(result.exposures_filename, out_dir)),
+                "".join(result.exposure_rows()),
+            )
+            self.assertIsNone(stream_csv(result.result_filename, out_dir))
+        self.assertEqual(list(iter_chunks(["a\n", "b\n", "c\n"], 2)), ["a\nb\n", "c\n"])
+
+
+def counter_stacks(table, rows):
+    # Stack labels and players facing a DST the way the old per-lineup loop found them
+    teams = [table.team_labels[table.team[row]] for row in rows]
+    opps = [table.team_labels[table.opp[row]] for row in rows]
+    is_dst = ["DST" in table.position_lists[row] for row in rows]
+    qb_tm = ""
+    def_opps = []
+    for team, opp, dst, row in zip(teams, opps, is_dst, rows):
+        if dst:
+            def_opps.append(opp)
+        if "QB" in table.position_lists[row]:
+            qb_tm = team
+    lu_teams = [team for team, dst in zip(teams, is_dst) if not dst]
+    players_vs_def = sum(team in def_opps for team in lu_teams)
+
+    stacks = collections.Counter(lu_teams).most_common()
+    primary_stack = "No Stack"
+    secondary_stack = "No Stack"
+    for s in stacks:
+        if s[0] == qb_tm:
+            primary_stack = str(qb_tm) + " " + str(s[1])
+            stacks.remove(s)
+            break
+        if stacks:
+            secondary_stack = str(stacks[0][0]) + " " + str(stacks[0][1])
+    return primary_stack, secondary_stack, players_vs_def
+
+
+class LineupMetricsTests(SimpleTestCase):
+    """Stack columns of lineup_metrics against the Counter based loop they replaced"""
+
+    def setUp(self):
+        self.table = make_table()
+        self.sim = make_simulator(self.table)
+        self.rows = {name: row for row, name in enumerate(self.table.names)}
+
+    def lineup(self, *names):
+        return [self.rows[name] for name in names]
+
+    def stacks(self, lineup_rows):
+        metrics = self.sim.lineup_metrics(np.array(lineup_rows, dtype=np.int64))
+        return list(
+            zip(
+                metrics["Stack1 Type"].tolist(),
+                metrics["Stack2 Type"].tolist(),
+                metrics["Players vs DST"].tolist(),
+            )
+        )
+
+    def test_stack_labels(self):
+        lineups = [
+            # the QB's team is the biggest, which leaves no secondary stack
+            self.lineup("KC DST0", "DAL QB0", "DAL WR0", "DAL WR1", "DAL WR2", "DAL TE0",
+                        "PHI RB0", "PHI RB1", "PHI WR0"),
+            # no QB, a tie for the biggest team goes to the one listed first
+            self.lineup("DAL DST0", "PHI RB0", "KC WR0", "PHI RB1", "KC WR1", "PHI WR0",
+                        "KC WR2", "PHI WR1", "KC TE0"),
+            # the QB's team is smaller than two others
+            self.lineup("BUF DST0", "KC QB0", "BUF RB0", "BUF RB1", "DAL WR0", "KC WR0",
+                        "BUF WR0", "DAL WR1", "DAL TE0"),
+            # a QB without teammates still counts as a stack of one
+            self.lineup("DAL DST0", "KC QB0", "PHI RB0", "PHI RB1", "PHI WR0", "BUF WR0",
+                        "BUF WR1", "BUF TE0", "PHI TE0"),
+        ]
+        self.assertEqual(
+            self.stacks(lineups),
+            [
+                ("DAL 5", "No Stack", 0),
+                ("No Stack", "PHI 4", 4),
+                ("KC 2", "BUF 3", 2),
+                ("KC 1", "PHI 4", 4),
+            ],
+        )
+
+    def test_random_lineups_match_counter_loop(self):
+        # any nine players, so lineups with several QBs and DSTs are covered too
+        rng = np.random.default_rng(25)
+        lineup_rows = [
+            rng.choice(len(self.table), 9, replace=False).tolist() for _ in range(3000)
+        ]
+        self.assertEqual(
+            self.stacks(lineup_rows),
+            [counter_stacks(self.table, rows) for rows in lineup_rows],
+        )
+
+
+def iterrows_lineups(sim, path):
+    # The per-row loader load_lineups_from_file replaced, as (lineup, count) pairs
+    table = sim.player_table
+    players_by_id = dict(zip(table.ids, table.position_lists))
+    field_lineups = {}
+    for i, row in pd.read_csv(path).iterrows():
+        if i == sim.field_size:
+            break
+        lineup = [sim.extract_id(str(row.iloc[j])) for j in range(9)]
+        if any(l not in players_by_id for l in lineup):
+            continue
+        temp_roster_construction = ["DST", "QB", "RB", "RB", "WR", "WR", "WR", "TE", "FLEX"]
+        shuffled_lu = []
+        lineup_copy = lineup.copy()
+        position_counts = {"DST": 0, "QB": 0, "RB": 0, "WR": 0, "TE": 0, "FLEX": 0}
+        z = 0
+        while z < 9:
+            for t in temp_roster_construction:
+                if position_counts[t] < temp_roster_construction.count(t):
+                    for l in lineup_copy:
+                        if t in players_by_id[l]:
+                            shuffled_lu.append(l)
+                            lineup_copy.remove(l)
+                            position_counts[t] += 1
+                            z += 1
+                            if z == 9:
+                                break
+                if z == 9:
+                    break
+        key = frozenset(shuffled_lu)
+        if key in field_lineups:
+            field_lineups[key][1] += 1
+        else:
+            field_lineups[key] = [shuffled_lu, 1]
+    return [tuple(x) for x in field_lineups.values()]
+
+
+class LoadLineupsTests(SimpleTestCase):
+    """load_lineups_from_file reads tournament_lineups.csv in bulk and slots each lineup
+    DST first, falling back to a search for lineups only multi position players fit
+    """
+
+    def setUp(self):
+        players = make_players()
+        # a receiver who can also line up at running back
+        players.append(make_player("1100", "PHI WR/RB", ["WR", "RB"], "PHI", "DAL", 3))
+        self.table = make_table(players)
+        self.out_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.out_dir.cleanup)
+
+    def simulator(self, field_size):
+        return make_simulator(
+            self.table,
+            site="dk",
+            field_size=field_size,
+            field_lineups={},
+            lineup_index={},
+            id_name_dict={"9999": "Cut Player"},
+        )
+
+    def write_csv(self, lineups):
+        # DK order QB, RB, RB, WR, WR, WR, TE, FLEX, DST
+        path = os.path.join(self.out_dir.name, "tournament_lineups.csv")
+        pd.DataFrame(lineups, columns=ROSTER_CONSTRUCTION).to_csv(path, index=False)
+        return path
+
+    def load(self, sim, path):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            sim.load_lineups_from_file(path)
+        lineups = [(x["Lineup"], x["Count"]) for x in sim.field_lineups.values()]
+        return lineups, output.getvalue()
+
+    def test_matches_iterrows_loader(self):
+        path = self.write_csv(
+            [
+                # every cell format the file can hold: "Name (ID)", "Name:ID" and "ID"
+                ["DAL QB0 (1000)", "DAL RB0 (1001)", "DAL RB1 (1002)", "DAL WR0 (1003)",
+                 "DAL WR1 (1004)", "DAL WR2 (1005)", "DAL TE0 (1006)", "PHI RB0 (1009)",
+                 "PHI DST0 (1015)"],
+                ["DAL QB0:1000", "DAL RB1:1002", "PHI RB0:1009", "DAL WR2:1005",
+                 "DAL WR0:1003", "DAL WR1:1004", "DAL TE0:1006", "DAL RB0:1001",
+                 "PHI DST0:1015"],
+                ["1016", "1017", "1018", "1019", "1020", "1021", "1022", "1027", "1007"],
+                # an unknown player
+                ["1016", "1017", "1018", "1019", "1020", "9999", "1022", "1027", "1007"],
+                ["1024", "1025", "1017", "1027", "1028", "1029", "1030", "1026", "1023"],
+                ["1016", "1017", "1018", "1019", "1020", "1021", "1022", "1027", "1007"],
+                # past field_size
+                ["1024", "1025", "1026", "1027", "1028", "1029", "1030", "1019", "1023"],
+            ]
+        )
+        sim = self.simulator(field_size=6)
+        lineups, output = self.load(sim, path)
+        # the old loop skipped players as it removed them, so the RB or WR it moved to
+        # FLEX depended on file order. The same players and counts come out
+        self.assertEqual(
+            [(set(lineup), count) for lineup, count in lineups],
+            [(set(lineup), count) for lineup, count in iterrows_lineups(sim, path)],
+        )
+        self.assertEqual([count for _, count in lineups], [2, 2, 1])
+        self.assertEqual(
+            lineups[0][0], ["1015", "1000", "1001", "1002", "1003", "1004", "1005", "1006", "1009"]
+        )
+        eligibility = self.table.eligibility(
+            ["DST", "QB", "RB", "RB", "WR", "WR", "WR", "TE", "FLEX"]
+        )
+        for lineup, _ in lineups:
+            rows = [self.table.rows[player] for player in lineup]
+            self.assertTrue(eligibility[np.arange(9), rows].all(), lineup)
+        self.assertIn("1 lineups are missing players and were skipped: 9999 (Cut Player)", output)
+
+    def test_multi_position_and_unfittable_lineups(self):
+        path = self.write_csv(
+            [
+                # one RB, the second RB slot only fits the WR/RB
+                ["1000", "1001", "1100", "1003", "1004", "1005", "1006", "1011", "1015"],
+                # two QBs and no TE fit no slots
+                ["1000", "1001", "1002", "1003", "1004", "1005", "1008", "1009", "1015"],
+            ]
+        )
+        lineups, output = self.load(self.simulator(field_size=10), path)
+        self.assertEqual(
+            lineups,
+            [(["1015", "1000", "1001", "1100", "1003", "1004", "1005", "1006", "1011"], 1)],
+        )
+        self.assertIn("1 lineups do not fit the roster construction and were skipped", output)
+        self.assertIn("loaded 1 lineups", output)
+
+
+def frozenset_merge(field_lineups, output, first_key):
+    # The field scan update_field_lineups replaced, every generated lineup is compared
+    # with each lineup already in the field
+    nk = first_key
+    for o in output:
+        lineup = next(iter(o.values()))
+        lineup_set = frozenset(lineup["Lineup"])
+        for existing in field_lineups.values():
+            if frozenset(existing["Lineup"]) == lineup_set:
+                existing["Count"] += 1
+                break
+        else:
+            field_lineups[nk] = dict(lineup, Count=1)
+            nk += 1
+    return field_lineups
+
+
+class FieldLineupIndexTests(SimpleTestCase):
+    """update_field_lineups finds duplicates through lineup_index instead of scanning the
+    field, it must count the same duplicates as the frozenset scan
+    """
+
+    def setUp(self):
+        self.table = make_table()
+        self.out_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.out_dir.cleanup)
+
+    def test_matches_frozenset_scan(self):
+        input_lineup = ["1000", "1001", "1002", "1003", "1004", "1005", "1006", "1009", "1015"]
+        custom_lineup = ["1016", "1017", "1018", "1019", "1020", "1021", "1022", "1027", "1007"]
+        new_lineup = ["1024", "1025", "1026", "1027", "1028", "1029", "1030", "1019", "1023"]
+        other_lineup = ["1008", "1009", "1010", "1011", "1012", "1013", "1014", "1001", "1007"]
+        path = os.path.join(self.out_dir.name, "tournament_lineups.csv")
+        pd.DataFrame([input_lineup], columns=ROSTER_CONSTRUCTION).to_csv(path, index=False)
+
+        sim = make_simulator(
+            self.table, site="dk", field_size=10, field_lineups={}, lineup_index={}
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            sim.load_lineups_from_file(path)
+        # a custom lineup the view writes straight into the field, after the input lineups
+        sim.field_lineups[1] = {"Lineup": list(custom_lineup), "Type": "custom", "Count": 1}
+        # "fd" leaves new lineups in their generated order, no start times needed
+        sim.site = "fd"
+
+        generated = [
+            # the input lineup and the custom lineup with their players in other slots
+            list(reversed(input_lineup)),
+            custom_lineup[4:] + custom_lineup[:4],
+            new_lineup,
+            other_lineup,
+            list(reversed(new_lineup)),
+            list(input_lineup),
+        ]
+        output = [
+            {lu_num: {"Lineup": lineup, "Type": "generated", "Count": 0}}
+            for lu_num, lineup in enumerate(generated)
+        ]
+        expected = frozenset_merge(copy.deepcopy(sim.field_lineups), copy.deepcopy(output), 2)
+        sim.update_field_lineups(output, len(output))
+
+        self.assertEqual(
+            {k: (frozenset(v["Lineup"]), v["Count"]) for k, v in sim.field_lineups.items()},
+            {k: (frozenset(v["Lineup"]), v["Count"]) for k, v in expected.items()},
+        )
+        self.assertEqual([v["Count"] for v in sim.field_lineups.values()], [3, 2, 2, 1])
+        # the same players in a different slot order share a key
+        self.assertEqual(sim.lineup_key(input_lineup), sim.lineup_key(generated[0]))
+        self.assertNotEqual(sim.lineup_key(input_lineup), sim.lineup_key(other_lineup))
+        self.assertEqual(len(sim.lineup_index), len(sim.field_lineups))
+
+
+FIELD_SLOTS = ["DST", "QB", "RB", "RB", "WR", "WR", "WR", "TE", "FLEX"]
+
+
+class BuildLineupBatchTests(SimpleTestCase):
+    """Field lineups from the compiled generator keep to every rule build_lineup checks"""
+
+    salary_floor = 45000
+    salary_ceiling = 50000
+    reasonable_projection = 45.0
+    reasonable_stack_projection = 40.0
+    overlap_limit = 1
+    max_players_per_team = 5
+
+    def setUp(self):
+        self.table = make_table()
+        self.eligibility = self.table.eligibility(FIELD_SLOTS)
+        self.projections = self.table.field_fpts
+        self.kc = self.table.team_codes["KC"]
+        self.dal = self.table.team_codes["DAL"]
+
+    def build(self, seed, stack_teams, stack_lens):
+        table = self.table
+        return build_lineup_batch(
+            seed,
+            np.array(stack_teams, dtype=np.int64),
+            np.array(stack_lens, dtype=np.int64),
+            self.eligibility,
+            np.flatnonzero(self.eligibility[4:8].any(axis=0)),
+            table.ownership,
+            table.ownership * salary_boost(table.salary, self.salary_ceiling),
+            table.salary,
+            self.projections,
+            table.team,
+            table.opp,
+            table.game,
+            self.salary_floor,
+            self.salary_ceiling,
+            self.reasonable_projection,
+            self.reasonable_stack_projection,
+            float(self.overlap_limit),
+            self.max_players_per_team,
+            1000,
+        )
+
+    def test_lineups_keep_the_rules(self):
+        stack_teams = [-1, self.kc, self.dal] * 100
+        stack_lens = [1] * 150 + [2] * 150
+        lineups = self.build(3, stack_teams, stack_lens)
+        built = lineups[:, 0] >= 0
+        self.assertGreater(built.mean(), 0.95)
+
+        table = self.table
+        receivers = self.eligibility[4:8].any(axis=0)
+        for lineup, stack_team, stack_len in zip(
+            lineups[built], np.array(stack_teams)[built], np.array(stack_lens)[built]
+        ):
+            self.assertEqual(len(set(lineup.tolist())), 9)
+            self.assertTrue(self.eligibility[np.arange(9), lineup].all())
+            salary = table.salary[lineup].sum()
+            self.assertGreaterEqual(salary, self.salary_floor)
+            self.assertLessEqual(salary, self.salary_ceiling)
+            self.assertLessEqual(np.bincount(table.team[lineup]).max(), self.max_players_per_team)
+            self.assertGreater(len(set(table.game[lineup].tolist())), 1)
+
+            def_opp = table.opp[lineup[0]]
+            self.assertLessEqual((table.team[lineup[1:]] == def_opp).sum(), self.overlap_limit)
+            if stack_team < 0:
+                self.assertGreaterEqual(self.projections[lineup].sum(), self.reasonable_projection)
+                continue
+            self.assertGreaterEqual(
+                self.projections[lineup].sum(), self.reasonable_stack_projection
+            )
+            # the stacked team's QB with stack_len of its WR/TE, and a DST not facing them
+            self.assertEqual(table.team[lineup[1]], stack_team)
+            stacked = (table.team[lineup] == stack_team) & receivers[lineup]
+            self.assertGreaterEqual(stacked.sum(), stack_len)
+            self.assertNotEqual(def_opp, stack_team)
+
+    def test_fixed_seed_is_reproducible(self):
+        stack_teams = [-1, self.kc] * 20
+        stack_lens = [1, 2] * 20
+        lineups = self.build(11, stack_teams, stack_lens)
+        np.testing.assert_array_equal(self.build(11, stack_teams, stack_lens), lineups)
+        self.assertFalse(np.array_equal(self.build(12, stack_teams, stack_lens), lineups))
+
+    def test_field_is_reproducible_from_seed(self):
+        def field(seed):
+            sim = make_simulator(
+                self.table,
+                site="fd",
+                seed=seed,
+                field_size=60,
+                field_lineups={},
+                lineup_index={},
+                salary=self.salary_ceiling,
+                min_lineup_salary=self.salary_floor,
+                projection_minimum=0,
+                optimal_score=60.0,
+                max_pct_off_optimal=0.3,
+                stacks_dict={"KC": 0.6, "DAL": 0.4},
+                pct_field_using_stacks=0.5,
+                pct_field_double_stacks=0.4,
+                overlap_limit=1.0,
+                lineup_batch_size=16,
+            )
+            with contextlib.redirect_stdout(io.StringIO()):
+                sim.generate_field_lineups()
+            return [(x["Lineup"], x["Count"]) for x in sim.field_lineups.values()]
+
+        lineups = field(5)
+        self.assertEqual(sum(count for _, count in lineups), 60)
+        self.assertEqual(field(5), lineups)
+        self.assertNotEqual(field(6), lineups)
+
+
+def loop_correlation(player1, player2):
+    # Correlation of two players the way the per-cell get_corr_value lookup found it
+    if player2["Name"] in player1.get("Player Correlations", {}):
+        return player1["Player Correlations"][player2["Name"]]
+    if player1["Team"] == player2["Team"] and player1["Position"][0] == player2["Position"][0]:
+        return NFL_GPP_Simulator.position_correlations[player1["Position"][0]]
+    if player1["Team"] != player2["Team"]:
+        player_2_pos = "Opp " + str(player2["Position"][0])
+    else:
+        player_2_pos = player2["Position"][0]
+    return player1["Correlations"].get(player_2_pos, 0)
+
+
+class CovarianceMatrixTests(SimpleTestCase):
+    def make_game(self, roster):
+        # One game, DAL against PHI, with random correlations at every position
+        rng = np.random.default_rng(1)
+        keys = ["QB", "RB", "WR", "TE", "K", "DST"]
+        players = []
+        for team, opp in (("DAL", "PHI"), ("PHI", "DAL")):
+            for position, count in roster:
+                for n in range(count):
+                    player = make_player(str(1000 + len(players)), f"{team} {position}{n}",
+                                         [position], team, opp, len(players))
+                    player["StdDev"] = float(rng.uniform(2, 9))
+                    player["Correlations"] = {
+                        prefix + key: round(float(rng.uniform(-0.4, 0.6)), 2)
+                        for key in keys
+                        for prefix in ("", "Opp ")
+                        if rng.random() < 0.8
+                    }
+                    players.append(player)
+        players[0]["Player Correlations"] = {"PHI WR1": 0.55, "DAL TE0": -0.15}
+        players[9]["Player Correlations"] = {"DAL QB0": 0.35}
+        return players
+
+    def test_matches_cell_by_cell_lookup(self):
+        players = self.make_game(ROSTER + (("K", 1),))
+        covariance, correlation = NFL_GPP_Simulator.build_covariance_matrix(
+            PlayerTable(players, MATCHUPS)
+        )
+        expected_correlation = np.array(
+            [
+                [1 if i == j else loop_correlation(p1, p2) for j, p2 in enumerate(players)]
+                for i, p1 in enumerate(players)
+            ]
+        )
+        std_devs = np.array([p["StdDev"] for p in players])
+        expected_covariance = expected_correlation * std_devs[:, None] * std_devs[None, :]
+        np.testing.assert_allclose(correlation, expected_correlation, rtol=0, atol=1e-12)
+        np.testing.assert_allclose(covariance, expected_covariance, rtol=1e-12)
+        # the custom pair correlation wins over the position one
+        rows = {p["Name"]: i for i, p in enumerate(players)}
+        self.assertEqual(correlation[rows["DAL QB0"], rows["PHI WR1"]], 0.55)
+
+    def test_position_without_a_fixed_correlation(self):
+        # teammates at a position position_correlations doesn't list are uncorrelated
+        players = self.make_game(ROSTER + (("FB", 2),))
+        _, correlation = NFL_GPP_Simulator.build_covariance_matrix(
+            PlayerTable(players, MATCHUPS)
+        )
+        fullbacks = [i for i, p in enumerate(players) if p["Name"].startswith("DAL FB")]
+        self.assertEqual(correlation[fullbacks[0], fullbacks[1]], 0)
+        self.assertEqual(correlation[fullbacks[1], fullbacks[0]], 0)
+
+
+class SampleGameTests(SimpleTestCase):
+    """sample_game factorizes with Cholesky and falls back to clipped eigenvectors when the
+    covariance matrix is not positive definite
+    """
+
+    means = np.array([20.0, 15.0, 10.0])
+    num_iterations = 200000
+
+    def sample(self, covariance, seed=4):
+        out = np.empty((len(covariance), self.num_iterations), dtype=np.float32)
+        with mock.patch("numpy.linalg.eigh", wraps=np.linalg.eigh) as eigh:
+            NFL_GPP_Simulator.sample_game(
+                self.means, covariance, self.num_iterations, seed, out, block_size=30000
+            )
+        return out, eigh.called
+
+    def assertSampled(self, samples, covariance):
+        np.testing.assert_allclose(samples.mean(axis=1), self.means, atol=0.05)
+        np.testing.assert_allclose(np.cov(samples), covariance, atol=0.15)
+
+    def test_positive_definite_covariance(self):
+        std_devs = np.array([6.0, 4.0, 3.0])
+        correlation = np.array([[1.0, 0.4, -0.2], [0.4, 1.0, 0.3], [-0.2, 0.3, 1.0]])
+        covariance = correlation * std_devs[:, None] * std_devs[None, :]
+        samples, used_eigh = self.sample(covariance)
+        self.assertFalse(used_eigh)
+        self.assertSampled(samples, covariance)
+        np.testing.assert_array_equal(self.sample(covariance)[0], samples)
+
+    def test_indefinite_covariance_falls_back(self):
+        # pairwise correlations no three players can have at once
+        std_devs = np.array([5.0, 5.0, 5.0])
+        correlation = np.array([[1.0, 0.9, -0.9], [0.9, 1.0, 0.9], [-0.9, 0.9, 1.0]])
+        covariance = correlation * std_devs[:, None] * std_devs[None, :]
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        self.assertLess(eigenvalues.min(), 0)
+        repaired = eigenvectors @ np.diag(np.clip(eigenvalues, 0, None)) @ eigenvectors.T
+
+        samples, used_eigh = self.sample(covariance)
+        self.assertTrue(used_eigh)
+        self.assertSampled(samples, repaired)
+
+
+class SlateCacheTests(SimpleTestCase):
+    """slate_cache keys slates on file contents and config, hands out private copies and
+    keeps only the newest SLATE_CACHE_SIZE files per namespace on disk
+    """
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, SLATE_CACHE_SIZE=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        slate_cache.clear()
+        self.addCleanup(slate_cache.clear)
+
+    def write(self, name, text):
+        path = os.path.join(self.media_root, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_key_changes_with_contents_and_config(self):
+        players = self.write("players.csv", "name,fpts\nA,10\n")
+        contest = self.write("contest.csv", "place,payout\n1,100\n")
+        paths = [players, contest]
+        key = slate_cache.slate_key("simulator", paths, {"site": "dk"})
+        self.assertEqual(key, slate_cache.slate_key("simulator", paths, {"site": "dk"}))
+        self.assertNotEqual(key, slate_cache.slate_key("optimizer", paths, {"site": "dk"}))
+        self.assertNotEqual(key, slate_cache.slate_key("simulator", paths, {"site": "fd"}))
+        self.assertNotEqual(key, slate_cache.slate_key("simulator", paths[::-1], {"site": "dk"}))
+
+        self.write("players.csv", "name,fpts\nA,11\n")
+        self.assertNotEqual(key, slate_cache.slate_key("simulator", paths, {"site": "dk"}))
+
+    def test_copies_are_isolated(self):
+        slate = {"players": [{"Name": "A", "Fpts": 10.0}]}
+        slate_cache.put("simulator", "key", slate)
+        slate["players"][0]["Fpts"] = 0.0
+
+        cached = slate_cache.get("simulator", "key")
+        self.assertEqual(cached, {"players": [{"Name": "A", "Fpts": 10.0}]})
+        cached["players"].append({"Name": "B"})
+        self.assertEqual(slate_cache.get("simulator", "key"), {"players": [{"Name": "A", "Fpts": 10.0}]})
+
+        # a fresh process reads the pickle back from disk
+        slate_cache.clear()
+        self.assertEqual(slate_cache.get("simulator", "key"), {"players": [{"Name": "A", "Fpts": 10.0}]})
+        self.assertIsNone(slate_cache.get("simulator", "missing"))
+
+    def test_memory_keeps_most_recently_used(self):
+        for key in ("a", "b"):
+            slate_cache.put("simulator", key, key)
+        slate_cache.get("simulator", "a")
+        slate_cache.put("simulator", "c", "c")
+        self.assertEqual(list(slate_cache._slates["simulator"]), ["a", "c"])
+
+    def test_prune_disk_keeps_newest_files(self):
+        # put prunes as it writes, so write the files with room for all of them
+        with override_settings(SLATE_CACHE_SIZE=3):
+            for key in ("a", "b", "c"):
+                slate_cache.put("simulator", key, key)
+            slate_cache.put("optimizer", "a", "a")
+        cache_dir = slate_cache.get_cache_dir()
+        for age, key in enumerate(("c", "a", "b")):
+            mtime = 1700000000 - age * 60
+            os.utime(os.path.join(cache_dir, f"simulator_{key}.pkl"), (mtime, mtime))
+
+        slate_cache._prune_disk("simulator")
+        self.assertEqual(
+            sorted(os.listdir(cache_dir)),
+            ["optimizer_a.pkl", "simulator_a.pkl", "simulator_c.pkl"],
+        )
+
+    def test_disabled_cache(self):
+        with override_settings(SLATE_CACHE_SIZE=0):
+            slate_cache.put("simulator", "key", "slate")
+            self.assertIsNone(slate_cache.get("simulator", "key"))
+        self.assertFalse(os.path.exists(slate_cache.get_cache_dir()))
+
+
+def eval_optimal_score(players, salary, column):
+    # The baseline LP get_optimal solved in place, its score read back by substituting the
+    # variable values into the objective's string and evaluating it
+    problem = plp.LpProblem("NFL", plp.LpMaximize)
+    lp_variables = {p["ID"]: plp.LpVariable(str(p["ID"]), cat="Binary") for p in players}
+    problem += (plp.lpSum(p[column] * lp_variables[p["ID"]] for p in players), "Objective")
+    problem += plp.lpSum(p["Salary"] * lp_variables[p["ID"]] for p in players) <= salary
+    for pos, at_least, at_most in (
+        ("QB", 1, 1), ("RB", 2, 3), ("WR", 3, 4), ("TE", 1, 2), ("DST", 1, 1)
+    ):
+        in_position = [lp_variables[p["ID"]] for p in players if pos in p["Position"]]
+        problem += plp.lpSum(in_position) >= at_least
+        problem += plp.lpSum(in_position) <= at_most
+    problem += plp.lpSum(lp_variables.values()) == 9
+    problem.solve(plp.PULP_CBC_CMD(msg=0))
+
+    score = str(problem.objective)
+    for v in problem.variables():
+        score = score.replace(v.name, str(v.varValue) if v.varValue is not None else "0")
+    return float(eval(score))
+
+
+class OptimalBaselineTests(SimpleTestCase):
+    """optimal_baseline solves the best lineup once per slate and reads the objective value
+    directly instead of evaluating its string
+    """
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, SLATE_CACHE_SIZE=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        slate_cache.clear()
+        self.addCleanup(slate_cache.clear)
+        self.players = make_players()
+
+    def write_slate(self, players):
+        path = os.path.join(self.media_root, "projections.csv")
+        pd.DataFrame(players)[["Name", "Salary", "fieldFpts"]].to_csv(path, index=False)
+        return [path]
+
+    def test_matches_evaluated_objective(self):
+        # the same slate priced so the salary cap binds
+        expensive = [dict(player, Salary=player["Salary"] + 1500) for player in self.players]
+        for players in (self.players, expensive):
+            for site, salary in optimal_baseline.salary_caps.items():
+                for column in ("fieldFpts", "Fpts"):
+                    self.assertAlmostEqual(
+                        optimal_baseline.solve_optimal_score(players, site, column),
+                        eval_optimal_score(players, salary, column),
+                    )
+        self.assertLess(
+            optimal_baseline.solve_optimal_score(expensive, "dk", "Fpts"),
+            optimal_baseline.solve_optimal_score(self.players, "dk", "Fpts"),
+        )
+
+    def test_memoized_per_slate(self):
+        paths = self.write_slate(self.players)
+        expected = eval_optimal_score(self.players, 50000, "fieldFpts")
+        with mock.patch.object(
+            optimal_baseline, "solve_optimal_score", wraps=optimal_baseline.solve_optimal_score
+        ) as solve:
+            score = optimal_baseline.get_optimal_score(paths, "dk", "fieldFpts", self.players)
+            self.assertAlmostEqual(score, expected)
+            # players are only read on a miss
+            self.assertEqual(optimal_baseline.get_optimal_score(paths, "dk", "fieldFpts", []), score)
+            self.assertEqual(solve.call_count, 1)
+
+            # a changed projection is a new slate
+            self.players[0]["fieldFpts"] += 20
+            paths = self.write_slate(self.players)
+            changed = optimal_baseline.get_optimal_score(paths, "dk", "fieldFpts", self.players)
+            self.assertEqual(solve.call_count, 2)
+            self.assertAlmostEqual(changed, eval_optimal_score(self.players, 50000, "fieldFpts"))
+            self.assertGreater(changed, score)
+
+            optimal_baseline.get_optimal_score(paths, "fd", "fieldFpts", self.players)
+            self.assertEqual(solve.call_count, 3)
+
+
+def write_optimizer_slate(directory, players, **config):
+    # DraftKings projection and player ID files for the players, plus a config using them
+    projection_path = os.path.join(directory, "projections.csv")
+    pd.DataFrame(
+        {
+            "Name": [p["Name"] for p in players],
+            "Position": [p["Position"][0] for p in players],
+            "Team": [p["Team"] for p in players],
+            "Salary": [p["Salary"] for p in players],
+            "Fpts": [p["Fpts"] for p in players],
+            "Own%": [p["Ownership"] for p in players],
+            "StdDev": [p["StdDev"] for p in players],
+        }
+    ).to_csv(projection_path, index=False)
+    player_path = os.path.join(directory, "player_ids.csv")
+    pd.DataFrame(
+        {
+            "Name": [p["Name"] for p in players],
+            "Roster Position": ["/".join(p["Position"]) for p in players],
+            "TeamAbbrev": [p["Team"] for p in players],
+            "Game Info": [
+                f"{p['Matchup'][0]}@{p['Matchup'][1]} 09/08/2024 01:00PM ET" for p in players
+            ],
+            "ID": [p["ID"] for p in players],
+        }
+    ).to_csv(player_path, index=False)
+    config_path = os.path.join(directory, "config.json")
+    with open(config_path, "w") as f:
+        json.dump(
+            {
+                "projection_path": projection_path,
+                "player_path": player_path,
+                "at_most": {},
+                "at_least": {},
+                "team_limits": {},
+                "global_team_limit": 5,
+                "projection_minimum": 0,
+                "randomness": 0,
+                "use_double_te": True,
+                "stack_rules": {},
+                "matchup_at_least": {},
+                "matchup_limits": {},
+                "allow_qb_vs_dst": False,
+                **config,
+            },
+            f,
+        )
+    return config_path
+
+
+class OptimizeParallelTests(SimpleTestCase):
+    """optimize_parallel runs randomized streams in the pool, only keeping lineups at least
+    num_uniques players apart from every lineup kept before them
+    """
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, SLATE_CACHE_SIZE=0, OPTIMIZER_WORKERS=3
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.config_path = write_optimizer_slate(self.media_root, make_players(), randomness=40)
+
+    def optimize(self, seed, num_lineups=24, num_uniques=3):
+        np.random.seed(seed)
+        optimizer = NFL_Optimizer("dk", num_lineups, num_uniques, self.config_path)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            optimizer.optimize()
+        # lineups the streams found at the same time can clash, the serial solve fills in
+        self.assertIn("lineups from 3 parallel workers", output.getvalue())
+        return [
+            frozenset(optimizer.player_dict[player]["ID"] for player in players)
+            for players, _ in optimizer.lineups
+        ]
+
+    def test_honours_num_uniques(self):
+        for num_uniques in (1, 3):
+            lineups = self.optimize(seed=5, num_uniques=num_uniques)
+            self.assertEqual(len(lineups), 24)
+            for first, second in itertools.combinations(lineups, 2):
+                self.assertLessEqual(len(first & second), 9 - num_uniques)
+
+    def test_seeded_runs_are_reproducible(self):
+        lineups = self.optimize(seed=11)
+        self.assertEqual(self.optimize(seed=11), lineups)
+        self.assertNotEqual(self.optimize(seed=12), lineups)
+
+
+def per_rule_constraints(optimizer):
+    # The group, matchup and stack rules as optimize() built them one rule at a time before
+    # RuleCompiler, matching players through player_dict scans
+    lp_variables = optimizer.lp_variables
+    player_dict = optimizer.player_dict
+    players_by_team = optimizer.players_by_team
+    problem = plp.LpProblem("NFL", plp.LpMaximize)
+
+    def variables(keys):
+        return [lp_variables[player_dict[key]["ID"]] for key in keys]
+
+    def keys_of(players, skip=()):
+        wanted = [(p["Name"], p["Position"], p["Team"]) for p in players]
+        return [
+            key
+            for key, value in player_dict.items()
+            if (value["Name"], value["Position"], value["Team"]) in wanted
+            and (value["Name"], value["Position"], value["Team"]) not in skip
+        ]
+
+    def stack_players(team, opp_team, positions, stack_type):
+        players = []
+        for pos in positions:
+            if stack_type in ("same-team", "same-game"):
+                players += players_by_team[team][pos]
+            if stack_type in ("opp-team", "same-game"):
+                players += players_by_team[opp_team][pos]
+        return players
+
+    for rules, label, sense in ((optimizer.at_least, "At least", 1), (optimizer.at_most, "At most", -1)):
+        for limit, groups in rules.items():
+            for group in groups:
+                keys = [key for key, value in player_dict.items() if value["Name"] in group]
+                expression = plp.lpSum(variables(keys))
+                constraint = expression >= int(limit) if sense == 1 else expression <= int(limit)
+                problem += (constraint, f"{label} {limit} players {keys}")
+
+    for rules, label, sense in (
+        (optimizer.matchup_limits, "Matchup limit", -1),
+        (optimizer.matchup_at_least, "Matchup at least", 1),
+    ):
+        for matchup, limit in rules.items():
+            keys = [key for key, value in player_dict.items() if value["Matchup"] == matchup]
+            expression = plp.lpSum(variables(keys))
+            constraint = expression >= int(limit) if sense == 1 else expression <= int(limit)
+            problem += (constraint, f"{label} {matchup} {limit}")
+
+    for rule in optimizer.stack_rules.get("pair", []):
+        for team in players_by_team:
+            key_players = players_by_team[team][rule["key"]]
+            if team in rule["exclude_teams"] or len(key_players) == 0:
+                continue
+            opp_team = key_players[0]["Opponent"]
+            for key_player in key_players:
+                key_identity = (key_player["Name"], key_player["Position"], key_player["Team"])
+                (key_tuple,) = keys_of([key_player])
+                stack_keys = keys_of(
+                    stack_players(team, opp_team, rule["positions"], rule["type"]),
+                    skip=[key_identity],
+                )
+                problem += (
+                    plp.lpSum(
+                        variables(stack_keys)
+                        + [-rule["count"] * lp_variables[player_dict[key_tuple]["ID"]]]
+                    )
+                    >= 0,
+                    f"Stack rule {key_tuple} {stack_keys} {rule['count']}",
+                )
+
+    for rule in optimizer.stack_rules.get("limit", []):
+        count = rule["count"]
+        for team in players_by_team:
+            qbs = players_by_team[team]["QB"]
+            if len(qbs) == 0 or team in rule["exclude_teams"]:
+                continue
+            opp_team = qbs[0]["Opponent"]
+            limit_players = stack_players(team, opp_team, rule["positions"], rule["type"])
+            limit_keys = keys_of(limit_players)
+            if "unless_positions" not in rule:
+                problem += (
+                    plp.lpSum(variables(limit_keys)) <= int(count),
+                    f"Limit rule {limit_keys} {count}",
+                )
+                continue
+            unless_keys = keys_of(
+                stack_players(team, opp_team, rule["unless_positions"], rule["unless_type"]),
+                skip=[(p["Name"], p["Position"], p["Team"]) for p in limit_players],
+            )
+            problem += (
+                plp.lpSum(variables(limit_keys)) - int(count) * plp.lpSum(variables(unless_keys))
+                <= int(count),
+                f"Limit rule {limit_keys} unless {unless_keys} {count}",
+            )
+    return problem.constraints
+
+
+def constraint_terms(constraint):
+    return (
+        constraint.sense,
+        constraint.constant,
+        sorted((variable.name, coefficient) for variable, coefficient in constraint.items()),
+    )
+
+
+class RuleCompilerTests(SimpleTestCase):
+    """RuleCompiler resolves each rule's players through indexes, it must build the same
+    constraints under the same names as the per-rule player_dict scans it replaced
+    """
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name, SLATE_CACHE_SIZE=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.config_path = write_optimizer_slate(
+            media_root.name,
+            make_players(),
+            at_least={"1": [["DAL TE0", "PHI TE0"]]},
+            # group names match the projection file exactly, "dal wr0" is nobody
+            at_most={"1": [["KC WR0", "KC WR1", "BUF RB0"], ["dal wr0", "PHI QB0"]]},
+            matchup_limits={"KC@BUF": 4},
+            matchup_at_least={"DAL@PHI": 2},
+            stack_rules={
+                "pair": [
+                    {"key": "QB", "positions": ["WR", "TE"], "count": 1,
+                     "type": "same-team", "exclude_teams": ["BUF"]},
+                    {"key": "QB", "positions": ["WR"], "count": 1,
+                     "type": "opp-team", "exclude_teams": []},
+                    {"key": "RB", "positions": ["DST", "RB"], "count": 1,
+                     "type": "same-game", "exclude_teams": []},
+                ],
+                "limit": [
+                    {"positions": ["RB"], "type": "same-team", "count": 1, "exclude_teams": []},
+                    {"positions": ["WR", "TE"], "type": "same-game", "count": 3,
+                     "exclude_teams": ["DAL"], "unless_positions": ["QB", "WR"],
+                     "unless_type": "same-team"},
+                    {"positions": ["TE"], "type": "opp-team", "count": 1, "exclude_teams": [],
+                     "unless_positions": ["WR"], "unless_type": "opp-team"},
+                ],
+            },
+        )
+
+    def test_matches_per_rule_constraints(self):
+        optimizer = NFL_Optimizer("dk", 0, 1, self.config_path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            optimizer.optimize()
+        expected = per_rule_constraints(optimizer)
+        compiled = {
+            name: constraint
+            for name, constraint in optimizer.problem.constraints.items()
+            if name in expected
+        }
+        self.assertEqual(list(compiled), list(expected))
+        for name, constraint in expected.items():
+            self.assertEqual(constraint_terms(compiled[name]), constraint_terms(constraint), name)
+
+        prefixes = collections.Counter(name.split("_")[0] for name in expected)
+        self.assertEqual(prefixes["At"], 3)
+        self.assertEqual(prefixes["Matchup"], 2)
+        # one per QB outside BUF, per QB and per RB for the pair rules, one per team with a
+        # QB outside the excluded teams for the limit rules
+        self.assertEqual(prefixes["Stack"], 3 + 4 + 8)
+        self.assertEqual(prefixes["Limit"], 4 + 3 + 4)
+
+
+@skipUnless(HighsModel.available(), "highspy is not installed")
+class HighsModelTests(SimpleTestCase):
+    """The HiGHS backend keeps one model loaded and only feeds it each cut and objective,
+    it must find the same lineups as a fresh CBC solve per lineup
+    """
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name, SLATE_CACHE_SIZE=0, OPTIMIZER_WORKERS=1
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.config_path = write_optimizer_slate(
+            media_root.name,
+            make_players(),
+            randomness=25,
+            stack_rules={
+                "pair": [{"key": "QB", "positions": ["WR", "TE"], "count": 1,
+                          "type": "same-team", "exclude_teams": []}],
+            },
+        )
+
+    def optimize(self, solver):
+        np.random.seed(8)
+        optimizer = NFL_Optimizer("dk", 12, 2, self.config_path)
+        with override_settings(OPTIMIZER_SOLVER=solver):
+            with contextlib.redirect_stdout(io.StringIO()):
+                optimizer.optimize()
+        return [(sorted(players), round(fpts, 6)) for players, fpts in optimizer.lineups]
+
+    def test_matches_cbc(self):
+        with mock.patch.object(
+            HighsModel, "solve", autospec=True, side_effect=HighsModel.solve
+        ) as solve:
+            lineups = self.optimize("highs")
+        self.assertEqual(solve.call_count, 12)
+        self.assertEqual(lineups, self.optimize("cbc"))
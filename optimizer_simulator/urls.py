@@ -2,6 +2,7 @@ from django.urls import path
 from .views import (
     upload_file,
     run_optimizer_view,
+    submit_optimizer,
     download_output_view,
     optimizer_view,
     get_players,
@@ -9,7 +10,11 @@ from .views import (
     get_optimizer_stats_data,
     simulator_view,
     run_simulation,
+    submit_simulation,
     simulation_stats_view,
+    job_status_view,
+    job_result_view,
+    job_lineups_view,
 )
 from .views.simulator_views import download_file
 
@@ -17,6 +22,7 @@ urlpatterns = [
     path('', upload_file, name='upload_file'),
     path('upload/', upload_file, name='upload_file'),
     path('run_optimizer/', run_optimizer_view, name='run_optimizer'),
+    path('optimizations/', submit_optimizer, name='submit_optimizer'),
     path('optimizer/download/<path:output_file>/', download_output_view, name='download_output'),
     path('optimizer/', optimizer_view, name='optimizer'),
     path('get_players/', get_players, name='get_players'),
@@ -24,6 +30,10 @@ urlpatterns = [
     path('optimizer_stats/data/', get_optimizer_stats_data, name='optimizer_stats_data'),
     path('simulator/', simulator_view, name='simulator'),
     path('run_simulation/', run_simulation, name='run_simulation'),
+    path('simulations/', submit_simulation, name='submit_simulation'),
+    path('jobs/<uuid:job_id>/', job_status_view, name='job_status'),
+    path('jobs/<uuid:job_id>/result/', job_result_view, name='job_result'),
+    path('jobs/<uuid:job_id>/lineups/', job_lineups_view, name='job_lineups'),
     path('simulation_stats/', simulation_stats_view, name='simulation_stats'),
     path('simulator/download/<str:filename>/', download_file, name='download_file'),
 ]
@@ -0,0 +1,101 @@
+import numpy as np
+import pulp as plp
+
+try:
+    import highspy
+except ImportError:  # the optimizer falls back to a CBC subprocess per solve
+    highspy = None
+
+
+class HighsModel:
+    """A PuLP problem loaded once into an in-process HiGHS model.
+
+    The model stays resident between solves, so each new lineup only costs the changes
+    made since the last one (a cut, new objective costs) instead of writing the whole
+    problem to disk for a fresh CBC process. Solutions are written back to the PuLP
+    variables' varValue so callers read them exactly as after problem.solve().
+    """
+
+    def __init__(self, problem):
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue("output_flag", False)
+        # Prove optimality like CBC does so both backends return the same lineups. The
+        # primal heuristics cost more than they save on a model this small
+        self.highs.setOptionValue("mip_rel_gap", 0.0)
+        self.highs.setOptionValue("mip_heuristic_effort", 0.0)
+        self.highs.setOptionValue("mip_heuristic_run_feasibility_jump", False)
+        self.highs.setOptionValue("mip_heuristic_run_rins", False)
+        self.highs.setOptionValue("mip_heuristic_run_rens", False)
+        self.highs.setOptionValue("mip_allow_restart", False)
+        inf = highspy.kHighsInf
+
+        self.variables = problem.variables()
+        self.columns = {variable.name: col for col, variable in enumerate(self.variables)}
+        num_cols = len(self.variables)
+        lower = np.array(
+            [-inf if v.lowBound is None else v.lowBound for v in self.variables],
+            dtype=np.float64,
+        )
+        upper = np.array(
+            [inf if v.upBound is None else v.upBound for v in self.variables],
+            dtype=np.float64,
+        )
+        self.highs.addVars(num_cols, lower, upper)
+        self.integer = np.array(
+            [v.cat in (plp.LpInteger, plp.LpBinary) for v in self.variables], dtype=np.bool_
+        )
+        integer_cols = np.flatnonzero(self.integer).astype(np.int32)
+        if len(integer_cols):
+            self.highs.changeColsIntegrality(
+                len(integer_cols),
+                integer_cols,
+                np.full(len(integer_cols), highspy.HighsVarType.kInteger),
+            )
+        self.highs.changeObjectiveSense(
+            highspy.ObjSense.kMaximize
+            if problem.sense == plp.LpMaximize
+            else highspy.ObjSense.kMinimize
+        )
+        for constraint in problem.constraints.values():
+            self.add_constraint(constraint)
+        self.set_objective(problem.objective)
+
+    @staticmethod
+    def available():
+        return highspy is not None
+
+    def add_constraint(self, constraint):
+        inf = highspy.kHighsInf
+        rhs = -constraint.constant
+        if constraint.sense == plp.LpConstraintLE:
+            lower, upper = -inf, rhs
+        elif constraint.sense == plp.LpConstraintGE:
+            lower, upper = rhs, inf
+        else:
+            lower, upper = rhs, rhs
+        cols = np.array(
+            [self.columns[variable.name] for variable in constraint.keys()], dtype=np.int32
+        )
+        values = np.array(list(constraint.values()), dtype=np.float64)
+        self.highs.addRow(lower, upper, len(cols), cols, values)
+
+    def set_objective(self, objective):
+        costs = np.zeros(len(self.variables))
+        for variable, coefficient in objective.items():
+            costs[self.columns[variable.name]] = coefficient
+        self.highs.changeColsCost(
+            len(costs), np.arange(len(costs), dtype=np.int32), costs
+        )
+        self.highs.changeObjectiveOffset(objective.constant)
+
+    def solve(self):
+        # No solution hint is passed in: the previous lineup is always cut off by the
+        # time we solve again, and handing it over measured slower than a cold start
+        self.highs.run()
+        if self.highs.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+            return False
+        values = np.array(self.highs.getSolution().col_value)
+        values[self.integer] = np.round(values[self.integer])
+        for variable, value in zip(self.variables, values.tolist()):
+            variable.varValue = value
+        return True
@@ -0,0 +1,253 @@
+import contextlib
+import datetime
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+from optimizer_simulator.utils.numpy_encoder import NumpyEncoder
+
+logger = logging.getLogger(__name__)
+
+# One executor per server process. Job state lives in the database, so any process
+# can answer status and result requests for a job another process is running
+_executor = None
+_executor_lock = threading.Lock()
+
+# Jobs unfinished for this long were left behind by a server process that exited
+ABANDONED_AFTER = datetime.timedelta(hours=6)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            fail_abandoned_jobs()
+            prune_streams()
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, int(getattr(settings, 'JOB_WORKERS', 1) or 1)),
+                thread_name_prefix='job',
+            )
+        return _executor
+
+
+def fail_abandoned_jobs():
+    from optimizer_simulator.models import Job
+
+    try:
+        Job.objects.filter(
+            status__in=[Job.QUEUED, Job.RUNNING],
+            created_at__lt=timezone.now() - ABANDONED_AFTER,
+        ).update(
+            status=Job.FAILED,
+            error='The server stopped before this job finished',
+            finished_at=timezone.now(),
+        )
+    except Exception as e:
+        logger.error(f"Error failing abandoned jobs: {str(e)}")
+
+
+def get_stream_dir():
+    return os.path.join(settings.MEDIA_ROOT, 'job_streams')
+
+
+def get_stream_path(job_id):
+    return os.path.join(get_stream_dir(), f'{job_id}.jsonl')
+
+
+def read_stream(job_id, offset, limit):
+    """Items a job has published so far, from offset up to limit of them"""
+    items = []
+    try:
+        with open(get_stream_path(job_id)) as f:
+            for index, line in enumerate(f):
+                if index < offset:
+                    continue
+                if len(items) == limit:
+                    break
+                # a line the job is still writing has no newline yet
+                if not line.endswith('\n'):
+                    break
+                items.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return items
+
+
+def prune_streams():
+    for path in glob.glob(os.path.join(get_stream_dir(), '*.jsonl')):
+        try:
+            if time.time() - os.path.getmtime(path) > ABANDONED_AFTER.total_seconds():
+                os.remove(path)
+        except OSError:
+            pass
+
+
+class PhaseTimer:
+    """Records how long each phase of a run takes, in the order the phases ran"""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self.start_phase(name)
+        start_time = time.time()
+        yield
+        self.timings[name] = round(time.time() - start_time, 3)
+        self.end_phase(name)
+
+    def start_phase(self, name):
+        pass
+
+    def end_phase(self, name):
+        logger.info(f"{name} took {self.timings[name]} seconds")
+
+    def publish(self, item):
+        # results only stream out of background jobs
+        pass
+
+
+class JobProgress(PhaseTimer):
+    """A PhaseTimer that saves the current phase and timings on its Job as it goes"""
+
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+        self.stream = None
+
+    def start_phase(self, name):
+        self.job.phase = name
+        self.job.save(update_fields=['phase'])
+
+    def end_phase(self, name):
+        super().end_phase(name)
+        self.job.timings = self.timings
+        self.job.save(update_fields=['timings'])
+
+    def publish(self, item):
+        # One JSON line per item, readable through read_stream while the job runs
+        if self.stream is None:
+            os.makedirs(get_stream_dir(), exist_ok=True)
+            self.stream = open(get_stream_path(self.job.id), 'w')
+        self.stream.write(json.dumps(item, cls=NumpyEncoder) + '\n')
+        self.stream.flush()
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+
+
+def get_output_retention():
+    return datetime.timedelta(days=max(0, int(getattr(settings, 'JOB_OUTPUT_DAYS', 7) or 0)))
+
+
+def referenced_outputs(kind, since, filenames):
+    """Output filenames named by the results of `kind` jobs created since the given time.
+
+    filenames(result) lists the files one job's result points at
+    """
+    from optimizer_simulator.models import Job
+
+    names = set()
+    for result in Job.objects.filter(kind=kind, created_at__gte=since).values_list(
+        'result', flat=True
+    ):
+        if result:
+            names.update(filenames(result))
+    return names
+
+
+def prune_outputs(out_dir, pattern, kind, filenames):
+    """Remove the files matching pattern in out_dir that are older than JOB_OUTPUT_DAYS.
+
+    Files a `kind` job from within that window still points at are kept whatever their
+    age, so no job's download links break before the job itself expires.
+    """
+    retention = get_output_retention()
+    try:
+        keep = referenced_outputs(kind, timezone.now() - retention, filenames)
+    except Exception as e:
+        # without the job table we can't tell which files are still in use
+        logger.warning(f"Skipping {kind} output cleanup: {str(e)}")
+        return
+    cutoff = time.time() - retention.total_seconds()
+    for path in glob.glob(os.path.join(out_dir, pattern)):
+        if os.path.basename(path) in keep:
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+@contextlib.contextmanager
+def run_config_file(run_config):
+    """Writes one run's config to a JSON file of its own and yields its path.
+
+    Simulator and optimizer read their config from disk, runs in other threads and server
+    processes each get their own file so they never see one another's settings. The
+    file is removed when the block exits
+    """
+    upload_dir = os.path.join(settings.MEDIA_ROOT, 'uploads')
+    os.makedirs(upload_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix='config_', suffix='.json', dir=upload_dir)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(run_config, f, indent=4)
+        yield path
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def submit(kind, run, *args):
+    """Queue run(*args, progress) and return its Job straight away.
+
+    run returns the job's JSON result. Any exception it raises fails the job with the
+    exception's message.
+    """
+    from optimizer_simulator.models import Job
+
+    job = Job.objects.create(kind=kind)
+    get_executor().submit(_run_job, job.id, run, args)
+    return job
+
+
+def _run_job(job_id, run, args):
+    from optimizer_simulator.models import Job
+
+    close_old_connections()
+    job = Job.objects.get(id=job_id)
+    try:
+        job.status = Job.RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+
+        progress = JobProgress(job)
+        try:
+            result = run(*args, progress)
+        finally:
+            progress.close()
+
+        job.status = Job.SUCCEEDED
+        job.result = result
+        job.phase = ''
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'result', 'phase', 'finished_at'])
+    except Exception as e:
+        logger.error(f"Error running {job.kind} job {job.id}: {str(e)}", exc_info=True)
+        job.status = Job.FAILED
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+    finally:
+        # executor threads outlive the job, don't leave its connection open between jobs
+        connection.close()
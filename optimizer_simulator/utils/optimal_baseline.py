@@ -0,0 +1,113 @@
+import logging
+import os
+import threading
+import pulp as plp
+from django.conf import settings
+from optimizer_simulator.utils import slate_cache
+
+logger = logging.getLogger(__name__)
+
+salary_caps = {"dk": 50000, "fd": 60000}
+# (at least, at most) players of each position, the same on both sites
+position_limits = {
+    "QB": (1, 1),
+    "RB": (2, 3),
+    "WR": (3, 4),
+    "TE": (1, 2),
+    "DST": (1, 1),
+}
+
+
+def get_optimal_score(paths, site, column, players):
+    """Best lineup projection on a slate, memoized per (slate files, site, column).
+
+    players is only read on a miss, an iterable of player records with ID, Salary,
+    Position and the projection column.
+    """
+    key = slate_cache.slate_key("optimal", paths, {"site": site, "column": column})
+    score = slate_cache.get("optimal", key)
+    if score is None:
+        score = solve_optimal_score(players, site, column)
+        slate_cache.put("optimal", key, score)
+    return score
+
+
+def solve_optimal_score(players, site, column):
+    players = list(players)
+    problem = plp.LpProblem("NFL", plp.LpMaximize)
+    lp_variables = {
+        player["ID"]: plp.LpVariable(str(player["ID"]), cat="Binary") for player in players
+    }
+
+    # set the objective - maximize the projection column
+    problem += (
+        plp.lpSum(player[column] * lp_variables[player["ID"]] for player in players),
+        "Objective",
+    )
+
+    # Set the salary constraints
+    problem += (
+        plp.lpSum(player["Salary"] * lp_variables[player["ID"]] for player in players)
+        <= salary_caps[site]
+    )
+
+    # Roster construction, the FLEX is the one RB, WR or TE above the minimums
+    for pos, (at_least, at_most) in position_limits.items():
+        in_position = plp.lpSum(
+            lp_variables[player["ID"]] for player in players if pos in player["Position"]
+        )
+        if at_least == at_most:
+            problem += in_position == at_least
+        else:
+            problem += in_position >= at_least
+            problem += in_position <= at_most
+    # Can only roster 9 total players
+    problem += plp.lpSum(lp_variables[player["ID"]] for player in players) == 9
+
+    try:
+        if settings.ON_RAILWAY:
+            problem.solve(plp.PULP_CBC_CMD(path='/root/.nix-profile/bin/cbc', msg=0))
+        else:
+            problem.solve(plp.PULP_CBC_CMD(msg=0))
+    except plp.PulpSolverError:
+        print("Infeasibility reached - could not solve for the optimal lineup")
+    except TypeError:
+        for player in players:
+            if player["ID"] in (0, "", None):
+                print(player["Name"] + " name mismatch between projections and player ids")
+
+    # variables the solver never set count as left out of the lineup
+    score = problem.objective.value()
+    if score is None:
+        score = sum(
+            coefficient * (variable.varValue or 0)
+            for variable, coefficient in problem.objective.items()
+        )
+    return float(score)
+
+
+def warm_simulator_baseline(projection_path, player_path, site):
+    """Solve the simulator's field-generation baseline ahead of the first simulation"""
+    from optimizer_simulator.utils.simulator import NFL_GPP_Simulator
+
+    try:
+        players = NFL_GPP_Simulator.load_baseline_players(projection_path, player_path, site)
+        score = get_optimal_score(
+            [projection_path, player_path],
+            site,
+            NFL_GPP_Simulator.baseline_column,
+            players,
+        )
+        logger.info(f"Optimal baseline for {os.path.basename(projection_path)}: {score}")
+    except Exception as e:
+        logger.error(f"Error warming optimal baseline: {str(e)}")
+
+
+def start_warm_simulator_baseline(projection_path, player_path, site):
+    # Solve in the background so the optimizer response is not held up
+    threading.Thread(
+        target=warm_simulator_baseline,
+        args=(projection_path, player_path, site),
+        name='optimal-baseline-warm-up',
+        daemon=True,
+    ).start()
@@ -8,12 +8,28 @@ import numpy as np
 import pulp as plp
 import copy
 import itertools
+import collections
+import pickle
 import re
 from random import shuffle, choice
 from collections import Counter
+from multiprocessing import shared_memory
 from django.conf import settings
+from optimizer_simulator.utils import slate_cache
+from optimizer_simulator.utils.highs_model import HighsModel
+from optimizer_simulator.utils.optimizer_rules import RuleCompiler
+from optimizer_simulator.utils.worker_pool import get_pool, get_worker_count
+
+# Pool workers keep the base optimizers they have unpickled, keyed by shared block name
+_stream_optimizers = collections.OrderedDict()
+_stream_optimizers_size = 2
 
 class NFL_Optimizer:
+    # player state that load_slate builds or restores from the slate cache
+    slate_attributes = ["player_dict", "team_list", "players_by_team"]
+    # Lineups a parallel stream solves before handing them back to be kept and published
+    stream_chunk = 10
+
     def __init__(self, site=None, num_lineups=0, num_uniques=1, config_path=None):
         self.site = site
         self.num_lineups = int(num_lineups)
@@ -22,6 +38,8 @@ class NFL_Optimizer:
         self.team_list = []
         self.players_by_team = {}
         self.lineups = []
+        # Called with each lineup's output entry as soon as it is solved
+        self.lineup_callback = None
         self.player_dict = {}
         self.team_rename_dict = {"LA": "LAR"}
 
@@ -33,9 +51,42 @@ class NFL_Optimizer:
         self.problem = plp.LpProblem("NFL", plp.LpMaximize)
 
         # Load projections and player IDs
+        self.load_slate()
+
+    def __getstate__(self):
+        # pool workers get a copy of the optimizer, the callback stays in this process
+        state = self.__dict__.copy()
+        state["lineup_callback"] = None
+        return state
+
+    def load_slate(self):
+        # The parsed players only depend on the two files and the config fields below, so
+        # repeated runs on the same slate restore them from the cache
+        key = slate_cache.slate_key(
+            "optimizer",
+            [self.config["projection_path"], self.config["player_path"]],
+            {
+                "site": self.site,
+                "projection_minimum": self.projection_minimum,
+                "default_qb_var": self.default_qb_var,
+                "default_skillpos_var": self.default_skillpos_var,
+                "default_def_var": self.default_def_var,
+            },
+        )
+        slate = slate_cache.get("optimizer", key)
+        if slate is not None:
+            for attribute, value in slate.items():
+                setattr(self, attribute, value)
+            return
+
         self.load_projections(self.config["projection_path"])
         self.load_player_ids(self.config["player_path"])
         self.assertPlayerDict()
+        slate_cache.put(
+            "optimizer",
+            key,
+            {attribute: getattr(self, attribute) for attribute in self.slate_attributes},
+        )
 
     def flatten(self, list):
         return [item for sublist in list for item in sublist]
@@ -221,557 +272,196 @@ class NFL_Optimizer:
             )
             for (player, pos_str, team) in self.player_dict
         }
+        self.lp_variables = lp_variables
 
         # set the objective - maximize fpts & set randomness amount from config
-        if self.randomness_amount != 0:
-            self.problem += (
-                plp.lpSum(
-                    np.random.normal(
-                        self.player_dict[(player, pos_str, team)]["Fpts"],
-                        (
-                            self.player_dict[(player, pos_str, team)]["StdDev"]
-                            * self.randomness_amount
-                            / 100
-                        ),
-                    )
-                    * lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                ),
-                "Objective",
-            )
-        else:
-            self.problem += (
-                plp.lpSum(
-                    self.player_dict[(player, pos_str, team)]["Fpts"]
-                    * lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                ),
-                "Objective",
-            )
+        self.set_objective(lp_variables)
+
+        # Every rule below resolves its players through the compiler's indexes once
+        rules = RuleCompiler(self.player_dict, lp_variables, self.team_list)
 
         # Set the salary constraints
         max_salary = 50000 if self.site == "dk" else 60000
         min_salary = 45000 if self.site == "dk" else 55000
-        self.problem += (
-            plp.lpSum(
-                self.player_dict[(player, pos_str, team)]["Salary"]
-                * lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                for (player, pos_str, team) in self.player_dict
-            )
-            <= max_salary,
-            "Max Salary",
-        )
-        self.problem += (
-            plp.lpSum(
-                self.player_dict[(player, pos_str, team)]["Salary"]
-                * lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                for (player, pos_str, team) in self.player_dict
-            )
-            >= min_salary,
-            "Min Salary",
-        )
+        constraints = rules.salary(max_salary, min_salary)
 
         # Address limit rules if any
-        for limit, groups in self.at_least.items():
-            for group in groups:
-                tuple_name_list = []
-                for key, value in self.player_dict.items():
-                    if value["Name"] in group:
-                        tuple_name_list.append(key)
-
-                self.problem += (
-                    plp.lpSum(
-                        lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                        for (player, pos_str, team) in tuple_name_list
-                    )
-                    >= int(limit),
-                    f"At least {limit} players {tuple_name_list}",
-                )
-
-        for limit, groups in self.at_most.items():
-            for group in groups:
-                tuple_name_list = []
-                for key, value in self.player_dict.items():
-                    if value["Name"] in group:
-                        tuple_name_list.append(key)
-
-                self.problem += (
-                    plp.lpSum(
-                        lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                        for (player, pos_str, team) in tuple_name_list
-                    )
-                    <= int(limit),
-                    f"At most {limit} players {tuple_name_list}",
-                )
+        constraints += rules.player_groups(self.at_least, self.at_most)
 
         # Address team limits
-        for teamIdent, limit in self.team_limits.items():
-            self.problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if self.player_dict[(player, pos_str, team)]["Team"] == teamIdent
-                )
-                <= int(limit),
-                f"Team limit {teamIdent} {limit}",
-            )
-
         if self.global_team_limit is not None:
             team_limit = int(self.global_team_limit)
         else:
             team_limit = 5 if self.site == "dk" else 4
-
-        for limit_team in self.team_list:
-            self.problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if self.player_dict[(player, pos_str, team)]["Team"] == limit_team
-                )
-                <= team_limit,
-                f"Global team limit {limit_team} {team_limit}",
-            )
+        constraints += rules.team_limits(self.team_limits, team_limit)
 
         # Address matchup limits
-        if self.matchup_limits is not None:
-            for matchup, limit in self.matchup_limits.items():
-                players_in_game = []
-                for key, value in self.player_dict.items():
-                    if value["Matchup"] == matchup:
-                        players_in_game.append(key)
-                self.problem += (
-                    plp.lpSum(
-                        lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                        for (player, pos_str, team) in players_in_game
-                    )
-                    <= int(limit),
-                    f"Matchup limit {matchup} {limit}",
-                )
-
-        if self.matchup_at_least is not None:
-            for matchup, limit in self.matchup_at_least.items():
-                players_in_game = []
-                for key, value in self.player_dict.items():
-                    if value["Matchup"] == matchup:
-                        players_in_game.append(key)
-
-                self.problem += (
-                    plp.lpSum(
-                        lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                        for (player, pos_str, team) in players_in_game
-                    )
-                    >= int(limit),
-                    f"Matchup at least {matchup} {limit}",
-                )
+        constraints += rules.matchup_limits(self.matchup_limits, self.matchup_at_least)
 
         # Address player vs dst (only applies to QB vs DST)
         if not self.allow_qb_vs_dst:
-            for team, players in self.players_by_team.items():
-                for qb in players.get("QB", []):
-                    opponent = qb["Opponent"]
-                    opposing_dsts = self.players_by_team.get(opponent, {}).get(
-                        "DST", []
-                    )
-                    for dst in opposing_dsts:
-                        self.problem += (
-                            plp.lpSum(lp_variables[qb["ID"]] + lp_variables[dst["ID"]])
-                            <= 1,
-                            f"No QB vs DST {qb['Name']} vs {dst['Name']}",
-                        )
-
-                # self.problem += (
-                #     plp.lpSum(
-                #         lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                #         for (player, pos_str, team) in players_in_game
-                #     )
-                #     >= int(limit),
-                #     f"Matchup at least {matchup} {limit}",
-                # )
+            constraints += rules.no_qb_vs_dst()
 
         # Address stack rules
-        for rule_type in self.stack_rules:
-            for rule in self.stack_rules[rule_type]:
-                if rule_type == "pair":
-                    pos_key = rule["key"]
-                    stack_positions = rule["positions"]
-                    count = rule["count"]
-                    stack_type = rule["type"]
-                    excluded_teams = rule["exclude_teams"]
-
-                    # Iterate each team, less excluded teams, and apply the rule for each key player pos
-                    for team in self.players_by_team:
-                        if team in excluded_teams:
-                            continue
-
-                        pos_key_players = self.players_by_team[team][pos_key]
-                        if len(pos_key_players) == 0:
-                            continue
-
-                        opp_team = pos_key_players[0]["Opponent"]
-
-                        for pos_key_player in pos_key_players:
-                            stack_players = []
-                            if stack_type == "same-team":
-                                for pos in stack_positions:
-                                    stack_players.append(
-                                        self.players_by_team[team][pos]
-                                    )
-
-                            elif stack_type == "opp-team":
-                                for pos in stack_positions:
-                                    stack_players.append(
-                                        self.players_by_team[opp_team][pos]
-                                    )
-
-                            elif stack_type == "same-game":
-                                for pos in stack_positions:
-                                    stack_players.append(
-                                        self.players_by_team[team][pos]
-                                    )
-                                    stack_players.append(
-                                        self.players_by_team[opp_team][pos]
-                                    )
-
-                            stack_players = self.flatten(stack_players)
-                            # player cannot exist as both pos_key_player and be present in the stack_players
-                            stack_players = [
-                                p
-                                for p in stack_players
-                                if not (
-                                    p["Name"] == pos_key_player["Name"]
-                                    and p["Position"] == pos_key_player["Position"]
-                                    and p["Team"] == pos_key_player["Team"]
-                                )
-                            ]
-                            pos_key_player_tuple = None
-                            stack_players_tuples = []
-                            for key, value in self.player_dict.items():
-                                if (
-                                    value["Name"] == pos_key_player["Name"]
-                                    and value["Position"] == pos_key_player["Position"]
-                                    and value["Team"] == pos_key_player["Team"]
-                                ):
-                                    pos_key_player_tuple = key
-                                elif (
-                                    value["Name"],
-                                    value["Position"],
-                                    value["Team"],
-                                ) in [
-                                    (player["Name"], player["Position"], player["Team"])
-                                    for player in stack_players
-                                ]:
-                                    stack_players_tuples.append(key)
-
-                            # [sum of stackable players] + -n*[stack_player] >= 0
-                            self.problem += (
-                                plp.lpSum(
-                                    [
-                                        lp_variables[
-                                            self.player_dict[(player, pos_str, team)][
-                                                "ID"
-                                            ]
-                                        ]
-                                        for (
-                                            player,
-                                            pos_str,
-                                            team,
-                                        ) in stack_players_tuples
-                                    ]
-                                    + [
-                                        -count
-                                        * lp_variables[
-                                            self.player_dict[pos_key_player_tuple]["ID"]
-                                        ]
-                                    ]
-                                )
-                                >= 0,
-                                f"Stack rule {pos_key_player_tuple} {stack_players_tuples} {count}",
-                            )
-
-                elif rule_type == "limit":
-                    limit_positions = rule["positions"]  # ["RB"]
-                    stack_type = rule["type"]
-                    count = rule["count"]
-                    excluded_teams = rule["exclude_teams"]
-                    if "unless_positions" in rule or "unless_type" in rule:
-                        unless_positions = rule["unless_positions"]
-                        unless_type = rule["unless_type"]
-                    else:
-                        unless_positions = None
-                        unless_type = None
-
-                    # Iterate each team, less excluded teams, and apply the rule for each key player pos
-                    for team in self.players_by_team:
-                        opp_team = self.players_by_team[team]["QB"]
-
-                        if len(opp_team) == 0:
-                            continue
-
-                        opp_team = opp_team[0]["Opponent"]
-                        if team in excluded_teams:
-                            continue
-                        limit_players = []
-                        if stack_type == "same-team":
-                            for pos in limit_positions:
-                                limit_players.append(self.players_by_team[team][pos])
-
-                        elif stack_type == "opp-team":
-                            for pos in limit_positions:
-                                limit_players.append(
-                                    self.players_by_team[opp_team][pos]
-                                )
-
-                        elif stack_type == "same-game":
-                            for pos in limit_positions:
-                                limit_players.append(self.players_by_team[team][pos])
-                                limit_players.append(
-                                    self.players_by_team[opp_team][pos]
-                                )
-
-                        limit_players = self.flatten(limit_players)
-                        if unless_positions is None or unless_type is None:
-                            # [sum of limit players] + <= n
-                            limit_players_tuples = []
-                            for key, value in self.player_dict.items():
-                                if (
-                                    value["Name"],
-                                    value["Position"],
-                                    value["Team"],
-                                ) in [
-                                    (player["Name"], player["Position"], player["Team"])
-                                    for player in limit_players
-                                ]:
-                                    limit_players_tuples.append(key)
-
-                            self.problem += (
-                                plp.lpSum(
-                                    [
-                                        lp_variables[
-                                            self.player_dict[(player, pos_str, team)][
-                                                "ID"
-                                            ]
-                                        ]
-                                        for (
-                                            player,
-                                            pos_str,
-                                            team,
-                                        ) in limit_players_tuples
-                                    ]
-                                )
-                                <= int(count),
-                                f"Limit rule {limit_players_tuples} {count}",
-                            )
-                        else:
-                            unless_players = []
-                            if unless_type == "same-team":
-                                for pos in unless_positions:
-                                    unless_players.append(
-                                        self.players_by_team[team][pos]
-                                    )
-                            elif unless_type == "opp-team":
-                                for pos in unless_positions:
-                                    unless_players.append(
-                                        self.players_by_team[opp_team][pos]
-                                    )
-                            elif unless_type == "same-game":
-                                for pos in unless_positions:
-                                    unless_players.append(
-                                        self.players_by_team[team][pos]
-                                    )
-                                    unless_players.append(
-                                        self.players_by_team[opp_team][pos]
-                                    )
-
-                            unless_players = self.flatten(unless_players)
-
-                            # player cannot exist as both limit_players and unless_players
-                            unless_players = [
-                                p
-                                for p in unless_players
-                                if not any(
-                                    p["Name"] == key_player["Name"]
-                                    and p["Position"] == key_player["Position"]
-                                    and p["Team"] == key_player["Team"]
-                                    for key_player in limit_players
-                                )
-                            ]
-
-                            limit_players_tuples = []
-                            unless_players_tuples = []
-                            for key, value in self.player_dict.items():
-                                if (
-                                    value["Name"],
-                                    value["Position"],
-                                    value["Team"],
-                                ) in [
-                                    (player["Name"], player["Position"], player["Team"])
-                                    for player in limit_players
-                                ]:
-                                    limit_players_tuples.append(key)
-                                elif (
-                                    value["Name"],
-                                    value["Position"],
-                                    value["Team"],
-                                ) in [
-                                    (player["Name"], player["Position"], player["Team"])
-                                    for player in unless_players
-                                ]:
-                                    unless_players_tuples.append(key)
-
-                            self.problem += (
-                                plp.lpSum(
-                                    [
-                                        lp_variables[
-                                            self.player_dict[(player, pos_str, team)][
-                                                "ID"
-                                            ]
-                                        ]
-                                        for (
-                                            player,
-                                            pos_str,
-                                            team,
-                                        ) in limit_players_tuples
-                                    ]
-                                    - int(count)
-                                    * plp.lpSum(
-                                        [
-                                            lp_variables[
-                                                self.player_dict[
-                                                    (player, pos_str, team)
-                                                ]["ID"]
-                                            ]
-                                            for (
-                                                player,
-                                                pos_str,
-                                                team,
-                                            ) in unless_players_tuples
-                                        ]
-                                    )
-                                )
-                                <= int(count),
-                                f"Limit rule {limit_players_tuples} unless {unless_players_tuples} {count}",
-                            )
-
-        # Need exactly 1 QB
-        self.problem += (
-            plp.lpSum(
-                lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                for (player, pos_str, team) in self.player_dict
-                if "QB" == self.player_dict[(player, pos_str, team)]["Position"]
-            )
-            == 1,
-            f"QB limit 1",
-        )
+        constraints += rules.stack_rules(self.stack_rules)
 
-        # Need at least 2 RB, up to 3 if using FLEX
-        self.problem += (
-            plp.lpSum(
-                lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                for (player, pos_str, team) in self.player_dict
-                if "RB" == self.player_dict[(player, pos_str, team)]["Position"]
-            )
-            >= 2,
-            f"RB >= 2",
-        )
-        self.problem += (
-            plp.lpSum(
-                lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                for (player, pos_str, team) in self.player_dict
-                if "RB" == self.player_dict[(player, pos_str, team)]["Position"]
-            )
-            <= 3,
-            f"RB <= 3",
-        )
+        # Roster construction: 1 QB, 2-3 RB, 3-4 WR, 1-2 TE (1 without double TE), 1 DST
+        constraints += rules.roster(self.use_double_te)
 
-        # Need at least 3 WR, up to 4 if using FLEX
-        self.problem += (
-            plp.lpSum(
-                lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                for (player, pos_str, team) in self.player_dict
-                if "WR" == self.player_dict[(player, pos_str, team)]["Position"]
-            )
-            >= 3,
-            f"WR >= 3",
-        )
-        self.problem += (
-            plp.lpSum(
-                lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                for (player, pos_str, team) in self.player_dict
-                if "WR" == self.player_dict[(player, pos_str, team)]["Position"]
-            )
-            <= 4,
-            f"WR <= 4",
-        )
+        for constraint, name in constraints:
+            self.problem += (constraint, name)
 
-        # Need at least 1 TE, up to 2 if using FLEX
-        if self.use_double_te:
-            self.problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "TE" == self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                >= 1,
-                f"TE >= 1",
-            )
+        # Crunch! Independent randomized streams first when there are cores to spare, then
+        # whatever they could not supply one lineup at a time
+        num_workers = self.get_num_workers()
+        if num_workers > 1:
+            self.optimize_parallel(num_workers)
+        self.generate_lineups(self.num_lineups - len(self.lineups))
+
+    def set_objective(self, lp_variables):
+        if self.randomness_amount != 0:
             self.problem += (
                 plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
+                    np.random.normal(
+                        self.player_dict[(player, pos_str, team)]["Fpts"],
+                        (
+                            self.player_dict[(player, pos_str, team)]["StdDev"]
+                            * self.randomness_amount
+                            / 100
+                        ),
+                    )
+                    * lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
                     for (player, pos_str, team) in self.player_dict
-                    if "TE" == self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                <= 2,
-                f"TE <= 2",
+                ),
+                "Objective",
             )
         else:
             self.problem += (
                 plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
+                    self.player_dict[(player, pos_str, team)]["Fpts"]
+                    * lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
                     for (player, pos_str, team) in self.player_dict
-                    if "TE" == self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                == 1,
-                f"TE == 1",
+                ),
+                "Objective",
             )
 
-        # Need exactly 1 DST
-        self.problem += (
-            plp.lpSum(
-                lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                for (player, pos_str, team) in self.player_dict
-                if "DST" == self.player_dict[(player, pos_str, team)]["Position"]
+    def get_num_workers(self):
+        # Streams only differ through their random objectives, without randomness every
+        # worker would find the same lineups
+        if self.randomness_amount == 0 or self.num_lineups < 2:
+            return 1
+        workers = int(getattr(settings, 'OPTIMIZER_WORKERS', 0) or 0)
+        if workers <= 0:
+            workers = get_worker_count()
+        return min(workers, self.num_lineups)
+
+    def optimize_parallel(self, num_workers):
+        # One randomized stream per worker with an even share of the lineups. The optimizer,
+        # problem and all, is pickled once into shared memory and each worker unpickles it
+        # once; a chunk then only carries its seed and the lineups kept so far, which the
+        # worker cuts from its copy of the problem. Chunks are taken in the order they were
+        # handed out and each chunk's lineups are kept (and reach lineup_callback) straight
+        # away, so with seeds from np.random a seeded run is reproducible
+        share = -(-self.num_lineups // num_workers)
+        max_overlap = 9 - self.num_uniques
+        registry = []
+        pool = get_pool()
+        pending = collections.deque()
+        base = pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+        shm = shared_memory.SharedMemory(create=True, size=len(base))
+
+        def run_chunk(remaining):
+            chunk = min(self.stream_chunk, remaining)
+            seed = int(np.random.randint(2**31 - 1))
+            task = pool.apply_async(
+                NFL_Optimizer.generate_lineup_stream,
+                ((shm.name, len(base), list(self.lineups), chunk, seed),),
             )
-            == 1,
-            f"DST == 1",
-        )
-
-        # Can only roster 9 total players
-        self.problem += (
-            plp.lpSum(
-                lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                for (player, pos_str, team) in self.player_dict
-            )
-            == 9,
-            f"Total Players == 9",
-        )
-
-        # Crunch!
-        for i in range(self.num_lineups):
+            pending.append((chunk, remaining - chunk, task))
+
+        try:
+            shm.buf[: len(base)] = base
+            for _ in range(num_workers):
+                run_chunk(share)
+            while pending:
+                chunk, remaining, task = pending.popleft()
+                stream = task.get()
+                self.keep_stream_lineups(stream, registry, max_overlap)
+                # a short chunk means the stream ran out of feasible lineups
+                if remaining > 0 and len(stream) == chunk and len(self.lineups) < self.num_lineups:
+                    run_chunk(remaining)
+        finally:
+            shm.close()
+            shm.unlink()
+        print(f"Kept {len(self.lineups)} lineups from {num_workers} parallel workers")
+
+    def keep_stream_lineups(self, stream, registry, max_overlap):
+        # Streams only keep their own lineups apart, so drop any lineup too close to one
+        # already kept
+        kept = 0
+        for players, fpts_used in stream:
+            if len(self.lineups) == self.num_lineups:
+                break
+            player_ids = {self.player_dict[player]["ID"] for player in players}
+            if all(len(player_ids & other) <= max_overlap for other in registry):
+                registry.append(player_ids)
+                self.add_lineup(players, fpts_used)
+                self.add_lineup_cut(players, len(self.lineups) - 1)
+                kept += 1
+        return kept
+
+    @staticmethod
+    def stream_optimizer(name, size):
+        # The base optimizer optimize_parallel shared, unpickled once per worker
+        optimizer = _stream_optimizers.get(name)
+        if optimizer is None:
+            shm = shared_memory.SharedMemory(name=name)
             try:
-                if settings.ON_RAILWAY:
-                    print("RAILWAY_ENVIRONMENT:", os.getenv('RAILWAY_ENVIRONMENT'))
-                    print("Solving on Railway")
-                    self.problem.solve(plp.COIN_CMD(path='/root/.nix-profile/bin/cbc', msg=0))
-                else:
-                    # Use default CBC solver for local environment
-                    print("Solving on local")
-                    self.problem.solve(plp.PULP_CBC_CMD(msg=0))
-            except plp.PulpSolverError:
-                print(
-                    "Infeasibility reached - only generated {} lineups out of {}. Continuing with export.".format(
-                        len(self.lineups), self.num_lineups
+                optimizer = pickle.loads(bytes(shm.buf[:size]))
+            finally:
+                shm.close()
+            _stream_optimizers[name] = optimizer
+            while len(_stream_optimizers) > _stream_optimizers_size:
+                _stream_optimizers.popitem(last=False)
+        return optimizer
+
+    @staticmethod
+    def generate_lineup_stream(task):
+        # Runs in a pool worker on a copy of the base optimizer whose problem shares the
+        # base constraints, cuts the lineups already kept and returns the new ones
+        name, size, kept, num_lineups, seed = task
+        base = NFL_Optimizer.stream_optimizer(name, size)
+        optimizer = copy.copy(base)
+        optimizer.problem = base.problem.copy()
+        optimizer.lineups = list(kept)
+        for index, (players, _) in enumerate(kept):
+            optimizer.add_lineup_cut(players, index)
+        np.random.seed(seed)
+        optimizer.set_objective(optimizer.lp_variables)
+        optimizer.generate_lineups(num_lineups)
+        return optimizer.lineups[len(kept):]
+
+    def generate_lineups(self, num_lineups):
+        # With the HiGHS backend the model stays loaded in-process and only receives each
+        # new cut and objective, otherwise every lineup is a fresh CBC solve
+        lp_variables = self.lp_variables
+        model = None
+        if num_lineups > 0 and settings.OPTIMIZER_SOLVER == 'highs':
+            if HighsModel.available():
+                model = HighsModel(self.problem)
+            else:
+                print("highspy is not installed, solving with CBC")
+        for i in range(num_lineups):
+            if model is not None:
+                if not model.solve():
+                    print(
+                        "Infeasibility reached - only generated {} lineups out of {}. Continuing with export.".format(
+                            len(self.lineups), self.num_lineups
+                        )
                     )
-                )
+                    break
+            else:
+                self.solve_with_cbc()
 
             # Get the lineup and add it to our list
             player_ids = [
@@ -783,37 +473,53 @@ class NFL_Optimizer:
                     players.append(key)
 
             fpts_used = self.problem.objective.value()
-            self.lineups.append((players, fpts_used))
+            self.add_lineup(players, fpts_used)
 
             if i % 100 == 0:
                 print(i)
 
             # Ensure this lineup isn't picked again
-            self.problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[player]["ID"]] for player in players
-                )
-                <= len(players) - self.num_uniques,
-                f"Lineup {i}",
-            )
+            lineup_cut = self.add_lineup_cut(players, len(self.lineups) - 1)
+            if model is not None:
+                model.add_constraint(lineup_cut)
 
             # Set a new random fpts projection within their distribution
             if self.randomness_amount != 0:
-                self.problem += (
-                    plp.lpSum(
-                        np.random.normal(
-                            self.player_dict[(player, pos_str, team)]["Fpts"],
-                            (
-                                self.player_dict[(player, pos_str, team)]["StdDev"]
-                                * self.randomness_amount
-                                / 100
-                            ),
-                        )
-                        * lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                        for (player, pos_str, team) in self.player_dict
-                    ),
-                    "Objective",
+                self.set_objective(lp_variables)
+                if model is not None:
+                    model.set_objective(self.problem.objective)
+
+    def add_lineup(self, players, fpts_used):
+        self.lineups.append((players, fpts_used))
+        if self.lineup_callback is not None:
+            self.lineup_callback(self.lineup_entry(self.sort_lineup(players), fpts_used))
+
+    def add_lineup_cut(self, players, index):
+        lineup_cut = (
+            plp.lpSum(
+                self.lp_variables[self.player_dict[player]["ID"]] for player in players
+            )
+            <= len(players) - self.num_uniques
+        )
+        self.problem += (lineup_cut, f"Lineup {index}")
+        return lineup_cut
+
+    def solve_with_cbc(self):
+        try:
+            if settings.ON_RAILWAY:
+                print("RAILWAY_ENVIRONMENT:", os.getenv('RAILWAY_ENVIRONMENT'))
+                print("Solving on Railway")
+                self.problem.solve(plp.COIN_CMD(path='/root/.nix-profile/bin/cbc', msg=0))
+            else:
+                # Use default CBC solver for local environment
+                print("Solving on local")
+                self.problem.solve(plp.PULP_CBC_CMD(msg=0))
+        except plp.PulpSolverError:
+            print(
+                "Infeasibility reached - only generated {} lineups out of {}. Continuing with export.".format(
+                    len(self.lineups), self.num_lineups
                 )
+            )
 
     def output(self):
         print("Lineups done generating. Outputting.")
@@ -838,65 +544,9 @@ class NFL_Optimizer:
             )
             for x, fpts_used in sorted_lineups:
                 stack_str = self.construct_stack_string(x)
+                salary, fpts_p, own_s, own_p, ceil, stddev = self.lineup_stats(x)
+                lineup_data.append(self.lineup_entry(x, fpts_used))
 
-                salary = sum(self.player_dict[player]["Salary"] for player in x)
-                fpts_p = sum(self.player_dict[player]["Fpts"] for player in x)
-                own_s = sum(self.player_dict[player]["Ownership"] for player in x)
-                own_p = np.prod(
-                    [self.player_dict[player]["Ownership"] / 100 for player in x]
-                )
-                ceil = sum([self.player_dict[player]["Ceiling"] for player in x])
-                stddev = sum([self.player_dict[player]["StdDev"] for player in x])
-                
-                # Prepare data for each lineup
-                lineup_players = []
-                positions = ["QB", "RB", "RB", "WR", "WR", "WR", "TE", "FLEX", "DST"]
-                for idx, player in enumerate(x):
-                    player_info = self.player_dict[player].copy()  # Make a copy of the player dictionary
-                    player_info["LineupPosition"] = positions[idx]
-
-                    # Remove periods and apostrophes, keep dashes
-                    cleaned_name = re.sub(r'[.\']', '', player_info["Name"]).lower()
-                    
-                    # Split into first name and last name
-                    name_parts = cleaned_name.split()
-                    first_name = name_parts[0] if len(name_parts) > 0 else 'Unknown'
-                    last_name = '_'.join(name_parts[1:]) if len(name_parts) > 1 else ''
-                    
-                    # Define suffixes to remove (case-insensitive)
-                    SUFFIXES = ['jr', 'sr', 'ii', 'iii', 'iv', 'v']
-
-                    # Remove suffixes from last_name if present
-                    if last_name:
-                        last_name_parts = last_name.split('_')
-                    if last_name_parts[-1].lower() in SUFFIXES:
-                        # Remove the suffix
-                        last_name_parts = last_name_parts[:-1]
-                        last_name = '_'.join(last_name_parts)
-
-                    player_info["first_name"] = first_name
-                    player_info["last_name"] = last_name
-
-                    player_info.setdefault("Opponent", "N/A")
-                    player_info.setdefault("Ownership", 0)
-                    player_info.setdefault("Fpts", 0)
-                    player_info.setdefault("Salary", 0)
-
-                    lineup_players.append(player_info)
-
-                lineup_entry = {
-                    "players": lineup_players,
-                    "salary": float(salary),
-                    "fpts_proj": round(float(fpts_p), 2),
-                    "fpts_used": round(float(fpts_used if fpts_used is not None else fpts_p), 2),
-                    "ceiling": float(ceil),
-                    "ownership_sum": float(own_s),
-                    "ownership_product": float(own_p),
-                    "stddev": float(stddev),
-                    "stack": stack_str,
-                }
-                lineup_data.append(lineup_entry)
-                
                 if self.site == "dk":
                     lineup_str = "{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{},{},{},{},{},{},{},{}".format(
                         self.player_dict[x[0]]["Name"],
@@ -961,6 +611,72 @@ class NFL_Optimizer:
 
         return os.path.join("optimizer_output", filename_out), lineup_data
 
+    def lineup_stats(self, x):
+        # salary, projection, ownership sum and product, ceiling and stddev of a lineup
+        salary = sum(self.player_dict[player]["Salary"] for player in x)
+        fpts_p = sum(self.player_dict[player]["Fpts"] for player in x)
+        own_s = sum(self.player_dict[player]["Ownership"] for player in x)
+        own_p = np.prod(
+            [self.player_dict[player]["Ownership"] / 100 for player in x]
+        )
+        ceil = sum([self.player_dict[player]["Ceiling"] for player in x])
+        stddev = sum([self.player_dict[player]["StdDev"] for player in x])
+        return salary, fpts_p, own_s, own_p, ceil, stddev
+
+    def lineup_entry(self, x, fpts_used):
+        # The JSON the UI renders for a sorted lineup
+        stack_str = self.construct_stack_string(x)
+        salary, fpts_p, own_s, own_p, ceil, stddev = self.lineup_stats(x)
+
+        # Prepare data for each lineup
+        lineup_players = []
+        positions = ["QB", "RB", "RB", "WR", "WR", "WR", "TE", "FLEX", "DST"]
+        for idx, player in enumerate(x):
+            player_info = self.player_dict[player].copy()  # Make a copy of the player dictionary
+            player_info["LineupPosition"] = positions[idx]
+
+            # Remove periods and apostrophes, keep dashes
+            cleaned_name = re.sub(r'[.\']', '', player_info["Name"]).lower()
+
+            # Split into first name and last name
+            name_parts = cleaned_name.split()
+            first_name = name_parts[0] if len(name_parts) > 0 else 'Unknown'
+            last_name = '_'.join(name_parts[1:]) if len(name_parts) > 1 else ''
+
+            # Define suffixes to remove (case-insensitive)
+            SUFFIXES = ['jr', 'sr', 'ii', 'iii', 'iv', 'v']
+
+            # Remove suffixes from last_name if present
+            if last_name:
+                last_name_parts = last_name.split('_')
+            if last_name_parts[-1].lower() in SUFFIXES:
+                # Remove the suffix
+                last_name_parts = last_name_parts[:-1]
+                last_name = '_'.join(last_name_parts)
+
+            player_info["first_name"] = first_name
+            player_info["last_name"] = last_name
+
+            player_info.setdefault("Opponent", "N/A")
+            player_info.setdefault("Ownership", 0)
+            player_info.setdefault("Fpts", 0)
+            player_info.setdefault("Salary", 0)
+
+            lineup_players.append(player_info)
+
+        lineup_entry = {
+            "players": lineup_players,
+            "salary": float(salary),
+            "fpts_proj": round(float(fpts_p), 2),
+            "fpts_used": round(float(fpts_used if fpts_used is not None else fpts_p), 2),
+            "ceiling": float(ceil),
+            "ownership_sum": float(own_s),
+            "ownership_product": float(own_p),
+            "stddev": float(stddev),
+            "stack": stack_str,
+        }
+        return lineup_entry
+
     def sort_lineup(self, lineup):
         copy_lineup = copy.deepcopy(lineup)
         positional_order = ["QB", "RB", "RB", "WR", "WR", "WR", "TE", "FLEX", "DST"]
@@ -0,0 +1,263 @@
+import collections
+import pulp as plp
+
+
+class RuleCompiler:
+    """Indexes over the optimizer's players so each rule resolves to row sets once.
+
+    Rows follow player_dict order. Every method returns (constraint, name) pairs
+    for optimize() to add to the problem, named exactly as the rule always was.
+    """
+
+    def __init__(self, player_dict, lp_variables, team_list):
+        self.keys = list(player_dict)
+        self.players = [player_dict[key] for key in self.keys]
+        self.variables = [lp_variables[player["ID"]] for player in self.players]
+        self.team_list = team_list
+
+        self.by_team = collections.defaultdict(list)
+        self.by_position = collections.defaultdict(list)
+        self.by_team_position = collections.defaultdict(list)
+        self.by_matchup = collections.defaultdict(list)
+        self.by_name = collections.defaultdict(list)
+        for row, (key, player) in enumerate(zip(self.keys, self.players)):
+            self.by_team[player["Team"]].append(row)
+            self.by_position[player["Position"]].append(row)
+            self.by_team_position[(player["Team"], player["Position"])].append(row)
+            self.by_matchup[player["Matchup"]].append(row)
+            self.by_name[player["Name"]].append(row)
+
+    def expression(self, rows, coefficient=1):
+        return plp.LpAffineExpression(
+            [(self.variables[row], coefficient) for row in rows]
+        )
+
+    def constraint(self, expression, sense, rhs, name):
+        return plp.LpConstraint(expression, sense, rhs=rhs), name
+
+    def stack_rows(self, team, opp_team, positions, stack_type):
+        # Rows of the given positions on the team, its opponent or both
+        if stack_type == "same-team":
+            teams = [team]
+        elif stack_type == "opp-team":
+            teams = [opp_team]
+        elif stack_type == "same-game":
+            teams = [team, opp_team]
+        else:
+            teams = []
+        return {
+            row
+            for stack_team in teams
+            for pos in positions
+            for row in self.by_team_position.get((stack_team, pos), ())
+        }
+
+    def salary(self, max_salary, min_salary):
+        salaries = plp.LpAffineExpression(
+            [(variable, player["Salary"]) for variable, player in zip(self.variables, self.players)]
+        )
+        return [
+            self.constraint(salaries, plp.LpConstraintLE, max_salary, "Max Salary"),
+            self.constraint(salaries.copy(), plp.LpConstraintGE, min_salary, "Min Salary"),
+        ]
+
+    def player_groups(self, at_least, at_most):
+        constraints = []
+        for rules, sense, label in (
+            (at_least, plp.LpConstraintGE, "At least"),
+            (at_most, plp.LpConstraintLE, "At most"),
+        ):
+            for limit, groups in rules.items():
+                for group in groups:
+                    # groups list players by their projection file name, exactly as written
+                    rows = sorted(
+                        {row for name in group for row in self.by_name.get(name, ())}
+                    )
+                    constraints.append(
+                        self.constraint(
+                            self.expression(rows),
+                            sense,
+                            int(limit),
+                            f"{label} {limit} players {[self.keys[row] for row in rows]}",
+                        )
+                    )
+        return constraints
+
+    def team_limits(self, team_limits, team_limit):
+        constraints = [
+            self.constraint(
+                self.expression(self.by_team.get(team, ())),
+                plp.LpConstraintLE,
+                int(limit),
+                f"Team limit {team} {limit}",
+            )
+            for team, limit in team_limits.items()
+        ]
+        constraints += [
+            self.constraint(
+                self.expression(self.by_team.get(team, ())),
+                plp.LpConstraintLE,
+                team_limit,
+                f"Global team limit {team} {team_limit}",
+            )
+            for team in self.team_list
+        ]
+        return constraints
+
+    def matchup_limits(self, matchup_limits, matchup_at_least):
+        constraints = []
+        for rules, sense, label in (
+            (matchup_limits, plp.LpConstraintLE, "Matchup limit"),
+            (matchup_at_least, plp.LpConstraintGE, "Matchup at least"),
+        ):
+            if rules is None:
+                continue
+            for matchup, limit in rules.items():
+                constraints.append(
+                    self.constraint(
+                        self.expression(self.by_matchup.get(matchup, ())),
+                        sense,
+                        int(limit),
+                        f"{label} {matchup} {limit}",
+                    )
+                )
+        return constraints
+
+    def no_qb_vs_dst(self):
+        constraints = []
+        for team in self.team_list:
+            for qb in self.by_team_position.get((team, "QB"), ()):
+                opponent = self.players[qb]["Opponent"]
+                for dst in self.by_team_position.get((opponent, "DST"), ()):
+                    constraints.append(
+                        self.constraint(
+                            self.expression([qb, dst]),
+                            plp.LpConstraintLE,
+                            1,
+                            f"No QB vs DST {self.players[qb]['Name']} vs {self.players[dst]['Name']}",
+                        )
+                    )
+        return constraints
+
+    def stack_rules(self, stack_rules):
+        constraints = []
+        for rule_type in stack_rules:
+            for rule in stack_rules[rule_type]:
+                if rule_type == "pair":
+                    constraints += self.pair_rule(rule)
+                elif rule_type == "limit":
+                    constraints += self.limit_rule(rule)
+        return constraints
+
+    def pair_rule(self, rule):
+        # [sum of stackable players] + -n*[stack_player] >= 0, for each key player
+        count = rule["count"]
+        constraints = []
+        for team in self.team_list:
+            if team in rule["exclude_teams"]:
+                continue
+            key_rows = self.by_team_position.get((team, rule["key"]), ())
+            if len(key_rows) == 0:
+                continue
+            opp_team = self.players[key_rows[0]]["Opponent"]
+            candidates = self.stack_rows(team, opp_team, rule["positions"], rule["type"])
+            for key_row in key_rows:
+                # player cannot exist as both pos_key_player and be present in the stack_players
+                rows = sorted(candidates - {key_row})
+                expression = self.expression(rows)
+                expression.addInPlace(self.expression([key_row], -count))
+                constraints.append(
+                    self.constraint(
+                        expression,
+                        plp.LpConstraintGE,
+                        0,
+                        f"Stack rule {self.keys[key_row]} {[self.keys[row] for row in rows]} {count}",
+                    )
+                )
+        return constraints
+
+    def limit_rule(self, rule):
+        count = rule["count"]
+        if "unless_positions" in rule or "unless_type" in rule:
+            unless_positions = rule["unless_positions"]
+            unless_type = rule["unless_type"]
+        else:
+            unless_positions = None
+            unless_type = None
+
+        constraints = []
+        for team in self.team_list:
+            # the opponent comes from the team's QB, teams without one are skipped
+            qb_rows = self.by_team_position.get((team, "QB"), ())
+            if len(qb_rows) == 0:
+                continue
+            if team in rule["exclude_teams"]:
+                continue
+            opp_team = self.players[qb_rows[0]]["Opponent"]
+            limit_rows = sorted(
+                self.stack_rows(team, opp_team, rule["positions"], rule["type"])
+            )
+            limit_keys = [self.keys[row] for row in limit_rows]
+            if unless_positions is None or unless_type is None:
+                # [sum of limit players] + <= n
+                constraints.append(
+                    self.constraint(
+                        self.expression(limit_rows),
+                        plp.LpConstraintLE,
+                        int(count),
+                        f"Limit rule {limit_keys} {count}",
+                    )
+                )
+                continue
+
+            # player cannot exist as both limit_players and unless_players
+            unless_rows = sorted(
+                self.stack_rows(team, opp_team, unless_positions, unless_type)
+                - set(limit_rows)
+            )
+            expression = self.expression(limit_rows)
+            expression.addInPlace(self.expression(unless_rows, -int(count)))
+            constraints.append(
+                self.constraint(
+                    expression,
+                    plp.LpConstraintLE,
+                    int(count),
+                    f"Limit rule {limit_keys} unless {[self.keys[row] for row in unless_rows]} {count}",
+                )
+            )
+        return constraints
+
+    def roster(self, use_double_te):
+        # (position, sense, count, name), FLEX is the one RB, WR or TE above the minimums
+        limits = [
+            ("QB", plp.LpConstraintEQ, 1, "QB limit 1"),
+            ("RB", plp.LpConstraintGE, 2, "RB >= 2"),
+            ("RB", plp.LpConstraintLE, 3, "RB <= 3"),
+            ("WR", plp.LpConstraintGE, 3, "WR >= 3"),
+            ("WR", plp.LpConstraintLE, 4, "WR <= 4"),
+        ]
+        if use_double_te:
+            limits += [
+                ("TE", plp.LpConstraintGE, 1, "TE >= 1"),
+                ("TE", plp.LpConstraintLE, 2, "TE <= 2"),
+            ]
+        else:
+            limits.append(("TE", plp.LpConstraintEQ, 1, "TE == 1"))
+        limits.append(("DST", plp.LpConstraintEQ, 1, "DST == 1"))
+
+        constraints = [
+            self.constraint(
+                self.expression(self.by_position.get(pos, ())), sense, count, name
+            )
+            for pos, sense, count, name in limits
+        ]
+        # Can only roster 9 total players
+        constraints.append(
+            self.constraint(
+                self.expression(range(len(self.players))),
+                plp.LpConstraintEQ,
+                9,
+                "Total Players == 9",
+            )
+        )
+        return constraints
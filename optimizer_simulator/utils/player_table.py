@@ -0,0 +1,126 @@
+import collections
+import numpy as np
+
+
+class PlayerTable:
+    """Columnar copy of the slate, one row per player in simulation row order.
+
+    Numeric fields are NumPy arrays, team, opponent, game and primary position are
+    integer codes into the matching *_labels list and eligibility is a bitmask over
+    `positions`. Each game's players occupy a contiguous block of rows.
+    """
+
+    positions = ["QB", "RB", "WR", "TE", "DST", "FLEX"]
+
+    def __init__(self, players, matchups):
+        game_players = collections.defaultdict(list)
+        for player in players:
+            game_players[player["Matchup"]].append(player)
+        records = []
+        self.game_labels = sorted(matchups)
+        self.game_rows = {}
+        for matchup in self.game_labels:
+            first_row = len(records)
+            records.extend(game_players[matchup])
+            self.game_rows[matchup] = (first_row, len(records))
+
+        self.ids = [player["ID"] for player in records]
+        self.names = [player["Name"] for player in records]
+        self.position_lists = [player["Position"] for player in records]
+        self.rows = {player_id: row for row, player_id in enumerate(self.ids)}
+
+        self.salary = np.array([p["Salary"] for p in records], dtype=np.int64)
+        self.fpts = np.array([p["Fpts"] for p in records], dtype=np.float64)
+        self.field_fpts = np.array([p["fieldFpts"] for p in records], dtype=np.float64)
+        self.ceiling = np.array([p["Ceiling"] for p in records], dtype=np.float64)
+        self.std_dev = np.array([p["StdDev"] for p in records], dtype=np.float64)
+        self.ownership = np.array([p["Ownership"] for p in records], dtype=np.float64)
+
+        self.team_labels = sorted({p["Team"] for p in records} | {p["Opp"] for p in records})
+        self.team_codes = {team: code for code, team in enumerate(self.team_labels)}
+        self.team = np.array([self.team_codes[p["Team"]] for p in records], dtype=np.int64)
+        self.opp = np.array([self.team_codes[p["Opp"]] for p in records], dtype=np.int64)
+        game_codes = {matchup: code for code, matchup in enumerate(self.game_labels)}
+        self.game = np.array([game_codes[p["Matchup"]] for p in records], dtype=np.int64)
+
+        self.position_mask = np.zeros(len(records), dtype=np.uint8)
+        for bit, pos in enumerate(self.positions):
+            self.position_mask |= np.array(
+                [pos in p["Position"] for p in records], dtype=np.uint8
+            ) << np.uint8(bit)
+
+        # Primary position codes and, for each player, their correlation with a teammate at
+        # every primary position followed by their correlation with an opponent there
+        self.position_labels = sorted({p["Position"][0] for p in records})
+        position_codes = {pos: code for code, pos in enumerate(self.position_labels)}
+        self.primary_position = np.array(
+            [position_codes[p["Position"][0]] for p in records], dtype=np.int64
+        )
+        corr_keys = self.position_labels + ["Opp " + pos for pos in self.position_labels]
+        self.correlations = np.array(
+            [[p["Correlations"].get(key, 0) for key in corr_keys] for p in records],
+            dtype=np.float64,
+        ).reshape(len(records), len(corr_keys))
+
+        # Custom player-to-player correlations as (row, row, value) triples
+        name_rows = collections.defaultdict(list)
+        for row, name in enumerate(self.names):
+            name_rows[name].append(row)
+        pairs = [
+            (i, j, corr_value)
+            for i, player in enumerate(records)
+            for name, corr_value in player.get("Player Correlations", {}).items()
+            for j in name_rows.get(name, ())
+        ]
+        self.pair_rows = np.array([pair[0] for pair in pairs], dtype=np.int64)
+        self.pair_cols = np.array([pair[1] for pair in pairs], dtype=np.int64)
+        self.pair_values = np.array([pair[2] for pair in pairs], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def eligibility(self, slots):
+        # (len(slots), players) boolean matrix of which players can fill each roster slot
+        bits = np.array(
+            [1 << self.positions.index(pos) for pos in slots], dtype=np.uint8
+        )
+        return (self.position_mask[None, :] & bits[:, None]) != 0
+
+    def has_position(self, pos):
+        return (self.position_mask & np.uint8(1 << self.positions.index(pos))) != 0
+
+    def slice(self, first_row, last_row):
+        # The rows of one game as a table of their own, small enough to hand to a worker.
+        # Labels are shared with the full table so codes keep their meaning
+        part = PlayerTable.__new__(PlayerTable)
+        part.__dict__.update(self.__dict__)
+        part.ids = self.ids[first_row:last_row]
+        part.names = self.names[first_row:last_row]
+        part.position_lists = self.position_lists[first_row:last_row]
+        part.rows = {player_id: row for row, player_id in enumerate(part.ids)}
+        for column in (
+            "salary",
+            "fpts",
+            "field_fpts",
+            "ceiling",
+            "std_dev",
+            "ownership",
+            "team",
+            "opp",
+            "game",
+            "position_mask",
+            "primary_position",
+            "correlations",
+        ):
+            setattr(part, column, getattr(self, column)[first_row:last_row])
+        inside = (
+            (self.pair_rows >= first_row)
+            & (self.pair_rows < last_row)
+            & (self.pair_cols >= first_row)
+            & (self.pair_cols < last_row)
+        )
+        part.pair_rows = self.pair_rows[inside] - first_row
+        part.pair_cols = self.pair_cols[inside] - first_row
+        part.pair_values = self.pair_values[inside]
+        part.game_rows = {}
+        return part
@@ -0,0 +1,319 @@
+import datetime
+import glob
+import json
+import os
+import numpy as np
+from django.conf import settings
+from optimizer_simulator.utils import jobs
+
+LINEUPS_HEADER = {
+    ("dk", True): "QB,RB,RB,WR,WR,WR,TE,FLEX,DST,Fpts Proj,Field Fpts Proj,Ceiling,Salary,Win %,Top 10%,ROI%,Proj. Own. Product,Avg. Return,Stack1 Type,Stack2 Type,Players vs DST,Lineup Type, Sim Dupes\n",
+    ("dk", False): "QB,RB,RB,WR,WR,WR,TE,FLEX,DST,Fpts Proj,Field Fpts Proj,Ceiling,Salary,Win %,Top 10%, Proj. Own. Product,Stack1 Type,Stack2 Type,Players vs DST,Lineup Type, Sim Dupes\n",
+    ("fd", True): "QB,RB,RB,WR,WR,WR,TE,FLEX,DST,Fpts Proj,Field Fpts Proj,Ceiling,Salary,Win %,Top 10%,ROI%,Proj. Own. Product,Avg. Return,Stack1 Type,Stack2 Type,Players vs DST,Lineup Type, Sim Dupes\n",
+    ("fd", False): "QB,RB,RB,WR,WR,WR,TE,FLEX,DST,Fpts Proj,Field Fpts Proj,Ceiling,Salary,Win %,Top 10%,Proj. Own. Product,Stack1 Type,Stack2 Type,Players vs DST,Lineup Type, Sim Dupes\n",
+}
+
+# Player columns come first in each row, lineup slots 1-8 then slot 0 (the DST)
+LINEUPS_ROW = {
+    ("dk", True): "{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{},{},{},{},{},${},{}%,{}%,{}%,{},{},{},{},{}",
+    ("dk", False): "{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{},{},{},{},{}%,{}%,{}%,{},{},{},{},{}",
+    ("fd", True): "{}:{},{}:{},{}:{},{}:{},{}:{},{}:{},{},{},{},{},{}%,{}%,{}%,{},${},{},{},{},{},{},{},{},{},{},{},{}",
+    ("fd", False): "{}:{},{}:{},{}:{},{}:{},{}:{},{}:{},{},{},{},{},{}%,{}%,{},{},{},{},{},{},{},{},{},{},{},{},{},{}",
+}
+
+EXPOSURES_HEADER = "Player,Position,Team,Win%,Top1%,Sim. Own%,Proj. Own%,Avg. Return\n"
+
+SLOT_ORDER = [1, 2, 3, 4, 5, 6, 7, 8, 0]
+
+# Rows per chunk when streaming a CSV out of a saved result
+CSV_CHUNK_ROWS = 2000
+
+# Which column group each key of a saved result belongs to, by prefix
+SECTIONS = ("players", "lineups", "exposures")
+
+
+class SimulationResult:
+    """Columnar results of a tournament simulation.
+
+    `players` lists every player used in the field, in order of first appearance, and
+    `lineup_players` is the (lineups, 9) matrix of indexes into it, one row per lineup
+    in simulator slot order. `lineups` holds one column per lineup metric and
+    `exposures` one column per player, aligned with `players`. Counts are kept raw
+    (wins, ROI, ...) and turned into percentages only when rendered.
+
+    Results are saved as a single .npz of these arrays. The CSV downloads are streamed
+    from it on demand.
+    """
+
+    def __init__(self, site, field_size, num_iterations, use_contest_data, entry_fee,
+                 players, lineup_players, lineups, exposures, timestamp=None):
+        self.site = site
+        self.field_size = field_size
+        self.num_iterations = num_iterations
+        self.use_contest_data = use_contest_data
+        self.entry_fee = entry_fee
+        self.players = players
+        self.lineup_players = lineup_players
+        self.lineups = lineups
+        self.exposures = exposures
+        self.timestamp = timestamp or datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+
+    def __len__(self):
+        return len(self.lineup_players)
+
+    def filename(self, kind, extension):
+        return f"{self.site}_gpp_sim_{kind}_{self.field_size}_{self.num_iterations}_{self.timestamp}.{extension}"
+
+    @property
+    def lineups_filename(self):
+        return self.filename("lineups", "csv")
+
+    @property
+    def exposures_filename(self):
+        return self.filename("player_exposure", "csv")
+
+    @property
+    def result_filename(self):
+        return self.filename("result", "npz")
+
+    def lineup_ids(self):
+        return self.players["ID"][self.lineup_players]
+
+    def to_json(self):
+        """Lineups keyed by position in the field, as the simulator page reads them"""
+        names = [
+            "Wins", "Top1Percent", "ROI", "Cashes", "Type", "Count", "Salary", "Fpts",
+            "FieldFpts", "Ceiling", "Own%", "Stack1 Type", "Stack2 Type", "Players vs DST",
+        ]
+        columns = {name: self.lineups[name].tolist() for name in names}
+        columns["Lineup"] = self.lineup_ids().tolist()
+        return {
+            index: {name: column[index] for name, column in columns.items()}
+            for index in range(len(self))
+        }
+
+    def stats(self, top=10):
+        """Headline numbers, the best lineups by wins and player exposures for the stats page"""
+        columns = self.lineups
+        iterations = self.num_iterations
+        names = np.char.replace(self.players["Name"], "#", "-")
+        lineup_names = names[self.lineup_players[:, SLOT_ORDER]].tolist()
+        best = np.argsort(-columns["Wins"], kind="stable")[:top].tolist()
+        exposures = self.exposures
+        by_exposure = np.argsort(-exposures["In"], kind="stable").tolist()
+        return {
+            "num_lineups": len(self),
+            "num_iterations": iterations,
+            "field_size": self.field_size,
+            "timestamp": self.timestamp,
+            "lineups_filename": self.lineups_filename,
+            "exposures_filename": self.exposures_filename,
+            "result_filename": self.result_filename,
+            "top_lineups": [
+                {
+                    "players": lineup_names[index],
+                    "fpts": round(float(columns["Fpts"][index]), 2),
+                    "win_pct": round(int(columns["Wins"][index]) / iterations * 100, 2),
+                    "top1_pct": round(int(columns["Top1Percent"][index]) / iterations * 100, 2),
+                    "stack1": str(columns["Stack1 Type"][index]),
+                    "stack2": str(columns["Stack2 Type"][index]),
+                    "count": int(columns["Count"][index]),
+                }
+                for index in best
+            ],
+            "exposures": [
+                {
+                    "name": str(names[index]),
+                    "position": str(self.players["Position"][index]),
+                    "team": str(self.players["Team"][index]),
+                    "win_pct": round(int(exposures["Wins"][index]) / iterations * 100, 2),
+                    "sim_own_pct": round(int(exposures["In"][index]) / self.field_size * 100, 2),
+                    "proj_own_pct": float(exposures["Proj. Own%"][index]),
+                }
+                for index in by_exposure
+            ],
+        }
+
+    def lineup_rows(self):
+        """Lines of the lineups CSV, header first"""
+        columns = self.lineups
+        row_format = LINEUPS_ROW[(self.site, self.use_contest_data)]
+        yield LINEUPS_HEADER[(self.site, self.use_contest_data)]
+        lineup_ids = self.lineup_ids().tolist()
+        lineup_names = np.char.replace(self.players["Name"], "#", "-")[self.lineup_players].tolist()
+        # Plain Python values format the same as the NumPy ones and much faster
+        text = {
+            name: columns[name].tolist()
+            for name in (
+                "Fpts", "FieldFpts", "Ceiling", "Salary", "Own%", "Stack1 Type",
+                "Stack2 Type", "Players vs DST", "Type",
+            )
+        }
+        wins = columns["Wins"].tolist()
+        top1 = columns["Top1Percent"].tolist()
+        counts = columns["Count"].tolist()
+        if self.use_contest_data:
+            # ROI accumulates as np.float64, so it has always been rounded the NumPy way
+            roi = columns["ROI"]
+            if self.site == "dk":
+                roi_p = np.round(roi / self.entry_fee / self.num_iterations * 100, 2).tolist()
+            else:
+                roi_p = np.round(
+                    roi / columns["Count"] / self.entry_fee / self.num_iterations * 100, 2
+                ).tolist()
+            roi_round = np.round(roi / columns["Count"] / self.num_iterations, 2).tolist()
+        for index in range(len(self)):
+            ids = lineup_ids[index]
+            names = lineup_names[index]
+            if self.site == "dk":
+                players = [value for slot in SLOT_ORDER for value in (names[slot], ids[slot])]
+            else:
+                players = [value for slot in SLOT_ORDER for value in (ids[slot], names[slot])]
+            win_p = round(wins[index] / self.num_iterations * 100, 2)
+            top10_p = round(top1[index] / self.num_iterations * 100, 2)
+            metrics = [
+                text["Fpts"][index],
+                text["FieldFpts"][index],
+                text["Ceiling"][index],
+                text["Salary"][index],
+                win_p,
+                top10_p,
+            ]
+            if self.use_contest_data:
+                metrics += [roi_p[index], text["Own%"][index], roi_round[index]]
+            else:
+                metrics.append(text["Own%"][index])
+            metrics += [
+                text["Stack1 Type"][index],
+                text["Stack2 Type"][index],
+                text["Players vs DST"][index],
+                text["Type"][index],
+                counts[index],
+            ]
+            yield row_format.format(*players, *metrics) + "\n"
+
+    def exposure_rows(self):
+        """Lines of the player exposure CSV, header first"""
+        columns = self.exposures
+        yield EXPOSURES_HEADER
+        top1_percent_count = (0.01) * self.field_size
+        wins = columns["Wins"].tolist()
+        top1 = columns["Top1Percent"].tolist()
+        counts = columns["In"].tolist()
+        names = np.char.replace(self.players["Name"], "#", "-")
+        for index in range(len(counts)):
+            field_p = round(counts[index] / self.field_size * 100, 2)
+            win_p = round(wins[index] / self.num_iterations * 100, 2)
+            top10_p = round(top1[index] / top1_percent_count / self.num_iterations * 100, 2)
+            roi_p = round(columns["ROI"][index] / counts[index] / self.num_iterations, 2)
+            yield "{},{},{},{}%,{}%,{}%,{}%,${}\n".format(
+                names[index],
+                self.players["Position"][index],
+                self.players["Team"][index],
+                win_p,
+                top10_p,
+                field_p,
+                columns["Proj. Own%"][index],
+                roi_p,
+            )
+
+    def save(self, out_dir=None):
+        """Write the result's arrays to one .npz, keyed '<section>/<column>'"""
+        out_dir = out_dir or get_output_dir()
+        os.makedirs(out_dir, exist_ok=True)
+        meta = {
+            "site": self.site,
+            "field_size": self.field_size,
+            "num_iterations": self.num_iterations,
+            "use_contest_data": self.use_contest_data,
+            "entry_fee": self.entry_fee,
+            "timestamp": self.timestamp,
+        }
+        arrays = {"meta": np.array(json.dumps(meta)), "lineup_players": self.lineup_players}
+        for section in SECTIONS:
+            for name, column in getattr(self, section).items():
+                arrays[f"{section}/{name}"] = np.asarray(column)
+        path = os.path.join(out_dir, self.result_filename)
+        # write then rename so a concurrent download never reads half a file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(data["meta"].item())
+            sections = {section: {} for section in SECTIONS}
+            for key in data.files:
+                section, _, name = key.partition("/")
+                if section in sections:
+                    sections[section][name] = data[key]
+            lineup_players = data["lineup_players"]
+        return cls(
+            meta["site"],
+            meta["field_size"],
+            meta["num_iterations"],
+            meta["use_contest_data"],
+            meta["entry_fee"],
+            sections["players"],
+            lineup_players,
+            sections["lineups"],
+            sections["exposures"],
+            timestamp=meta["timestamp"],
+        )
+
+
+def get_output_dir():
+    return os.path.join(settings.MEDIA_ROOT, "simulator_output")
+
+
+def latest_result_path(out_dir=None):
+    """Path of the most recently saved result, None when there are none"""
+    paths = glob.glob(os.path.join(out_dir or get_output_dir(), "*_gpp_sim_result_*.npz"))
+    if not paths:
+        return None
+    return max(paths, key=os.path.getmtime)
+
+
+def result_files(result):
+    # Files a simulation job's result points at
+    return [
+        result.get(key) for key in ("lineups_filename", "exposures_filename", "result_filename")
+    ]
+
+
+def prune_results(out_dir=None):
+    """Remove saved simulation output older than JOB_OUTPUT_DAYS that no simulation job
+    from within that window still points at
+    """
+    jobs.prune_outputs(out_dir or get_output_dir(), "*_gpp_sim_*", "simulation", result_files)
+
+
+def iter_chunks(rows, chunk_rows=CSV_CHUNK_ROWS):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_rows:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def stream_csv(filename, out_dir=None):
+    """Chunks of a lineups or exposure CSV, converted from its saved result as they are
+    read. None if there is no result for the filename.
+    """
+    out_dir = out_dir or get_output_dir()
+    for kind, rows in (("_lineups_", SimulationResult.lineup_rows),
+                       ("_player_exposure_", SimulationResult.exposure_rows)):
+        if kind in filename and filename.endswith(".csv"):
+            result_path = os.path.join(
+                out_dir, filename.replace(kind, "_result_", 1)[: -len(".csv")] + ".npz"
+            )
+            if not os.path.exists(result_path):
+                return None
+            return iter_chunks(rows(SimulationResult.load(result_path)))
+    return None
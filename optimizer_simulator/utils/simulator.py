@@ -3,6 +3,7 @@ import json
 import math
 import os
 import random
+import threading
 import time
 import numpy as np
 import pulp as plp
@@ -16,18 +17,32 @@ from django.conf import settings
 import itertools
 import collections
 import re
-from scipy.stats import norm, kendalltau, multivariate_normal, gamma
+from scipy.stats import norm, kendalltau, gamma
 import matplotlib.pyplot as plt
 import seaborn as sns
 from collections import Counter
-from numba import jit
+import numba
+from numba import jit, prange, get_num_threads
 import datetime
 import traceback
+import contextlib
+from multiprocessing import shared_memory
+from optimizer_simulator.utils.player_table import PlayerTable
+from optimizer_simulator.utils.simulation_result import SimulationResult
+from optimizer_simulator.utils import optimal_baseline, slate_cache
+from optimizer_simulator.utils.worker_pool import get_pool, get_worker_count
 
 # plp.pulpTestAll()
 
 logger = logging.getLogger(__name__)
 
+# calculate_payouts is the only parallel numba kernel and only ever runs in this process,
+# never in the pool workers. Background jobs and the pool warm-up can reach it from
+# different threads, and the workqueue threading layer (settings.NUMBA_THREADING_LAYER)
+# must not be entered by two threads at once, so every call holds this lock. The kernel
+# already uses every numba thread, so a second call running alongside it would gain nothing
+_parallel_kernel_lock = threading.Lock()
+
 @jit(nopython=True)
 def salary_boost(salary, max_salary):
     return (salary / max_salary) ** 2
@@ -41,6 +56,378 @@ def salary_boost(salary, max_salary):
     return (salary / max_salary) ** 2
 
 
+# Salary bound for draws that are not limited by salary
+NO_SALARY_LIMIT = 1 << 62
+# Binary search draws a slot gets before falling back to an exact linear draw
+MAX_REJECTIONS = 8
+
+
+@jit(nopython=True)
+def pick_player(
+    candidates,
+    weights,
+    in_lineup,
+    salaries,
+    min_salary,
+    max_salary,
+    group,
+    group_code,
+    in_group,
+):
+    # Exact weighted draw over the candidates that fit: not already picked, inside the
+    # salary bounds and (group == group_code) == in_group. -1 when nobody does
+    total = 0.0
+    for k in range(len(candidates)):
+        i = candidates[k]
+        if (
+            not in_lineup[i]
+            and salaries[i] >= min_salary
+            and salaries[i] <= max_salary
+            and (group[i] == group_code) == in_group
+        ):
+            total += weights[i]
+    if total <= 0:
+        return -1
+    target = np.random.random() * total
+    choice = -1
+    for k in range(len(candidates)):
+        i = candidates[k]
+        if (
+            not in_lineup[i]
+            and salaries[i] >= min_salary
+            and salaries[i] <= max_salary
+            and (group[i] == group_code) == in_group
+        ):
+            choice = i
+            target -= weights[i]
+            if target < 0:
+                break
+    return choice
+
+
+@jit(nopython=True)
+def draw_player(
+    candidates,
+    cum_weights,
+    weights,
+    in_lineup,
+    salaries,
+    min_salary,
+    max_salary,
+    group,
+    group_code,
+    in_group,
+):
+    # Weighted draw for a slot from its precomputed cumulative weights. A binary search
+    # picks from every candidate and players that do not fit are rejected, which leaves
+    # the draw proportional to weight among the ones that do
+    if len(candidates) == 0:
+        return -1
+    total = cum_weights[-1]
+    for attempt in range(MAX_REJECTIONS):
+        k = np.searchsorted(cum_weights, np.random.random() * total, side="right")
+        if k >= len(candidates):
+            continue
+        i = candidates[k]
+        if (
+            not in_lineup[i]
+            and salaries[i] >= min_salary
+            and salaries[i] <= max_salary
+            and (group[i] == group_code) == in_group
+        ):
+            return i
+    # most of the slot does not fit, draw over the ones that do
+    return pick_player(
+        candidates,
+        weights,
+        in_lineup,
+        salaries,
+        min_salary,
+        max_salary,
+        group,
+        group_code,
+        in_group,
+    )
+
+
+@jit(nopython=True)
+def build_lineup(
+    lineup,
+    in_lineup,
+    team_counts,
+    team_stack,
+    stack_len,
+    slot_eligibility,
+    slot_offsets,
+    slot_players,
+    slot_cum_ownership,
+    slot_cum_boosted,
+    stack_players,
+    ownership,
+    boosted_ownership,
+    salaries,
+    projections,
+    teams,
+    opponents,
+    matchups,
+    salary_floor,
+    salary_ceiling,
+    reasonable_projection,
+    reasonable_stack_projection,
+    overlap_limit,
+    max_players_per_team,
+):
+    # One attempt at a field lineup, player indices in DST,QB,RB,RB,WR,WR,WR,TE,FLEX slot
+    # order. Returns False when the attempt breaks a rule and has to be thrown away
+    num_slots = slot_eligibility.shape[0]
+    lineup[:] = -1
+    in_lineup[:] = False
+    team_counts[:] = 0
+    salary = 0
+    proj = 0.0
+    team_stack_len = 0
+
+    if team_stack >= 0:
+        # the team's first listed QB anchors the stack
+        qb = -1
+        for i in range(len(teams)):
+            if teams[i] == team_stack and slot_eligibility[1, i]:
+                qb = i
+                break
+        if qb < 0:
+            return False
+        lineup[1] = qb
+        in_lineup[qb] = True
+        team_counts[teams[qb]] += 1
+        salary += salaries[qb]
+        proj += projections[qb]
+        team_stack_len += 1
+
+        # stack_len of the QB's WR/TE teammates without replacement, if the team has enough
+        stack = np.empty(stack_len, dtype=np.int64)
+        num_stacked = 0
+        for s in range(stack_len):
+            choice = pick_player(
+                stack_players,
+                ownership,
+                in_lineup,
+                salaries,
+                -1,
+                NO_SALARY_LIMIT,
+                teams,
+                team_stack,
+                True,
+            )
+            if choice < 0:
+                break
+            in_lineup[choice] = True
+            stack[num_stacked] = choice
+            num_stacked += 1
+        if num_stacked < stack_len:
+            for s in range(num_stacked):
+                in_lineup[stack[s]] = False
+        else:
+            # each goes in the first open slot it is eligible for
+            for p in np.sort(stack):
+                placed = False
+                for ix in range(num_slots):
+                    if slot_eligibility[ix, p] and lineup[ix] < 0:
+                        lineup[ix] = p
+                        placed = True
+                        break
+                if not placed:
+                    return False
+                team_counts[teams[p]] += 1
+                salary += salaries[p]
+                proj += projections[p]
+            team_stack_len += stack_len
+
+    # Fill the open slots in order. The DST goes first and never faces the stacked team,
+    # then at most overlap_limit players may face the DST
+    def_opp = -1
+    players_opposing_def = 0
+    for ix in range(num_slots):
+        if lineup[ix] >= 0:
+            continue
+        candidates = slot_players[slot_offsets[ix] : slot_offsets[ix + 1]]
+        cum_ownership = slot_cum_ownership[slot_offsets[ix] : slot_offsets[ix + 1]]
+        cum_boosted = slot_cum_boosted[slot_offsets[ix] : slot_offsets[ix + 1]]
+        if ix == 0:
+            choice = draw_player(
+                candidates,
+                cum_ownership,
+                ownership,
+                in_lineup,
+                salaries,
+                -1,
+                NO_SALARY_LIMIT,
+                opponents,
+                team_stack,
+                False,
+            )
+        else:
+            # the last slot has to get the lineup over the salary floor and leans towards
+            # expensive players
+            last_slot = ix == num_slots - 1
+            min_salary = salary_floor - salary if last_slot else -1
+            if players_opposing_def < overlap_limit:
+                choice = draw_player(
+                    candidates,
+                    cum_boosted if last_slot else cum_ownership,
+                    boosted_ownership if last_slot else ownership,
+                    in_lineup,
+                    salaries,
+                    min_salary,
+                    salary_ceiling - salary,
+                    teams,
+                    -1,
+                    False,
+                )
+            else:
+                choice = draw_player(
+                    candidates,
+                    cum_boosted,
+                    boosted_ownership,
+                    in_lineup,
+                    salaries,
+                    min_salary,
+                    salary_ceiling - salary,
+                    teams,
+                    def_opp,
+                    False,
+                )
+        if choice < 0:
+            return False
+        lineup[ix] = choice
+        in_lineup[choice] = True
+        salary += salaries[choice]
+        proj += projections[choice]
+        team_counts[teams[choice]] += 1
+        if team_counts[teams[choice]] > max_players_per_team:
+            return False
+        if ix == 0:
+            def_opp = opponents[choice]
+        else:
+            if teams[choice] == def_opp:
+                players_opposing_def += 1
+            if teams[choice] == team_stack:
+                team_stack_len += 1
+
+    if team_stack >= 0 and team_stack_len < stack_len:
+        return False
+    if salary < salary_floor or salary > salary_ceiling:
+        return False
+    # Must have a reasonable projection, loosened for team stacks
+    if proj < (reasonable_stack_projection if team_stack >= 0 else reasonable_projection):
+        return False
+    # players from more than one game
+    for ix in range(1, num_slots):
+        if matchups[lineup[ix]] != matchups[lineup[0]]:
+            return True
+    return False
+
+
+@jit(nopython=True)
+def build_lineup_batch(
+    seed,
+    stack_teams,
+    stack_lens,
+    slot_eligibility,
+    stack_players,
+    ownership,
+    boosted_ownership,
+    salaries,
+    projections,
+    teams,
+    opponents,
+    matchups,
+    salary_floor,
+    salary_ceiling,
+    reasonable_projection,
+    reasonable_stack_projection,
+    overlap_limit,
+    max_players_per_team,
+    max_attempts,
+):
+    # Rejection sample one lineup per entry of stack_teams (-1 for no stack). Rows of
+    # lineups that could not be built within max_attempts are left at -1
+    np.random.seed(seed)
+    num_slots, num_players = slot_eligibility.shape
+
+    # Every slot's eligible players with their cumulative ownership and boosted ownership,
+    # laid end to end: slot ix owns slot_offsets[ix]:slot_offsets[ix + 1]
+    slot_offsets = np.zeros(num_slots + 1, dtype=np.int64)
+    for ix in range(num_slots):
+        slot_offsets[ix + 1] = slot_offsets[ix] + slot_eligibility[ix].sum()
+    slot_players = np.empty(slot_offsets[-1], dtype=np.int64)
+    slot_cum_ownership = np.empty(slot_offsets[-1])
+    slot_cum_boosted = np.empty(slot_offsets[-1])
+    for ix in range(num_slots):
+        k = slot_offsets[ix]
+        cum_ownership = 0.0
+        cum_boosted = 0.0
+        for i in range(num_players):
+            if slot_eligibility[ix, i]:
+                cum_ownership += ownership[i]
+                cum_boosted += boosted_ownership[i]
+                slot_players[k] = i
+                slot_cum_ownership[k] = cum_ownership
+                slot_cum_boosted[k] = cum_boosted
+                k += 1
+
+    lineups = np.full((len(stack_teams), num_slots), -1, dtype=np.int64)
+    in_lineup = np.zeros(num_players, dtype=np.bool_)
+    team_counts = np.zeros(max(teams.max(), opponents.max()) + 2, dtype=np.int64)
+    for n in range(len(stack_teams)):
+        for attempt in range(max_attempts):
+            if build_lineup(
+                lineups[n],
+                in_lineup,
+                team_counts,
+                stack_teams[n],
+                stack_lens[n],
+                slot_eligibility,
+                slot_offsets,
+                slot_players,
+                slot_cum_ownership,
+                slot_cum_boosted,
+                stack_players,
+                ownership,
+                boosted_ownership,
+                salaries,
+                projections,
+                teams,
+                opponents,
+                matchups,
+                salary_floor,
+                salary_ceiling,
+                reasonable_projection,
+                reasonable_stack_projection,
+                overlap_limit,
+                max_players_per_team,
+            ):
+                break
+            lineups[n, :] = -1
+    return lineups
+
+
+@contextlib.contextmanager
+def shared_ndarray(shape, dtype):
+    # Allocate an array in shared memory so pool workers can attach to it by name and
+    # write their results in place instead of pickling them back to the parent
+    nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+    shm = shared_memory.SharedMemory(create=True, size=nbytes)
+    try:
+        yield shm.name, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            # views of the block are still alive, the mapping goes away with them
+            pass
+        shm.unlink()
+
+
 class NFL_GPP_Simulator:
     config = None
     player_dict = {}
@@ -67,8 +454,7 @@ class NFL_GPP_Simulator:
     max_pct_off_optimal = 0.4
     teams_dict = collections.defaultdict(list)  # Initialize teams_dict
     correlation_rules = {}
-    seen_lineups = {}
-    seen_lineups_ix = {}
+    lineup_index = {}
     position_map = {
         0: ["QB"],        # QB first
         1: ["RB"],        # Then RB
@@ -80,6 +466,31 @@ class NFL_GPP_Simulator:
         7: ["RB", "WR", "TE"],  # FLEX
         8: ["DST"],      # DST last
     }
+    # attempts the generator gets per field lineup before giving up on it
+    max_lineup_attempts = 100000
+    # projection the optimal baseline maximizes
+    baseline_column = "fieldFpts"
+    # player state that load_slate builds or restores from the slate cache
+    slate_attributes = [
+        "player_dict",
+        "teams_dict",
+        "matchups",
+        "game_info",
+        "id_name_dict",
+        "stacks_dict",
+        "player_table",
+        "players_by_id",
+        "optimal_score",
+    ]
+    # correlation between teammates who share a primary position
+    position_correlations = {
+        "QB": -0.5,
+        "RB": -0.2,
+        "WR": 0.1,
+        "TE": -0.2,
+        "K": -0.5,
+        "DST": -0.5,
+    }
 
     def __init__(
         self,
@@ -92,6 +503,15 @@ class NFL_GPP_Simulator:
     ):
         # Initialize field_lineups as an empty dict at the start
         self.field_lineups = {}
+        # Per-run player state, the class level containers would be shared between runs
+        self.player_dict = {}
+        self.teams_dict = collections.defaultdict(list)
+        self.matchups = set()
+        self.game_info = {}
+        self.id_name_dict = {}
+        self.stacks_dict = {}
+        # canonical lineup key -> field_lineups key, see lineup_key
+        self.lineup_index = {}
         
         self.site = site
         self.use_lineup_input = use_lineup_input
@@ -105,17 +525,11 @@ class NFL_GPP_Simulator:
         #     os.path.dirname(__file__),
         #     "../{}_data/{}".format(site, self.config["projection_path"]),
         # )
-        self.load_projections(self.config["projection_path"])
-        logger.debug(f"Projection data loaded")
 
         # player_path = os.path.join(
         #     os.path.dirname(__file__),
         #     "../{}_data/{}".format(site, self.config["player_path"]),
         # )
-        self.load_player_ids(self.config["player_path"])
-        logger.debug(f"Player IDs loaded")
-        self.load_team_stacks()
-        logger.debug(f"Team stacks loaded")
 
         # ownership_path = os.path.join(
         #    os.path.dirname(__file__),
@@ -174,9 +588,8 @@ class NFL_GPP_Simulator:
             self.entry_fee = 0
 
         # self.adjust_default_stdev()
-        self.assertPlayerDict()
         self.num_iterations = int(num_iterations)
-        self.get_optimal()
+        self.load_slate()
         if self.use_lineup_input:
             try:
                 self.load_lineups_from_file()
@@ -185,7 +598,45 @@ class NFL_GPP_Simulator:
                 self.field_lineups = {}
         # if self.match_lineup_input_to_field_size or len(self.field_lineups) == 0:
         # self.generate_field_lineups()
+
+    def load_slate(self):
+        # Parsing the projections and player IDs and solving for the optimal lineup only
+        # depend on the two files and the config fields below, so repeated runs on the same
+        # slate restore all of it from the cache
+        key = slate_cache.slate_key(
+            "simulator",
+            [self.config["projection_path"], self.config["player_path"]],
+            {
+                "site": self.site,
+                "default_qb_var": self.default_qb_var,
+                "default_skillpos_var": self.default_skillpos_var,
+                "default_def_var": self.default_def_var,
+                "custom_correlations": self.correlation_rules,
+            },
+        )
+        slate = slate_cache.get("simulator", key)
+        if slate is not None:
+            for attribute, value in slate.items():
+                setattr(self, attribute, value)
+            logger.debug(f"Slate loaded from cache")
+            return
+
+        self.load_projections(self.config["projection_path"])
+        logger.debug(f"Projection data loaded")
+        self.load_player_ids(self.config["player_path"])
+        logger.debug(f"Player IDs loaded")
+        self.load_team_stacks()
+        logger.debug(f"Team stacks loaded")
+        self.assertPlayerDict()
+        # custom correlations go in before the player table captures them
         self.load_correlation_rules()
+        self.index_players()
+        self.get_optimal()
+        slate_cache.put(
+            "simulator",
+            key,
+            {attribute: getattr(self, attribute) for attribute in self.slate_attributes},
+        )
 
     # make column lookups on datafiles case insensitive
     def lower_first(self, iterator):
@@ -203,6 +654,25 @@ class NFL_GPP_Simulator:
         self.overlap_limit = float(self.config["num_players_vs_def"])
         self.pct_field_double_stacks = float(self.config["pct_field_double_stacks"])
         self.correlation_rules = self.config["custom_correlations"]
+        # optional seed for the simulation random streams, None draws fresh entropy
+        self.seed = self.config.get("seed")
+        # iterations per tournament block, 0 sizes blocks to fit sim_memory_mb
+        self.sim_block_size = int(self.config.get("sim_block_size", 0))
+        self.sim_memory_mb = float(self.config.get("sim_memory_mb", 512))
+        # field lineups per generator task
+        self.lineup_batch_size = max(1, int(self.config.get("lineup_batch_size", 250)))
+        # precision lineup scores are ranked in, float16 halves the ranking memory but
+        # collapses near ties between lineups
+        self.score_dtype = self.config.get("score_dtype", "float32")
+        if self.score_dtype not in ("float32", "float16"):
+            raise ValueError(
+                f"score_dtype must be float32 or float16, got {self.score_dtype}"
+            )
+
+    def seed_sequence(self, stream):
+        # Root of the random streams for one phase of the run (0 game sampling, 1 field
+        # generation), so a fixed seed never hands two phases the same numbers
+        return np.random.SeedSequence(self.seed, spawn_key=(stream,))
 
     def assertPlayerDict(self):
         for p, s in list(self.player_dict.items()):
@@ -213,289 +683,46 @@ class NFL_GPP_Simulator:
                 )
                 self.player_dict.pop(p)
 
+    def index_players(self):
+        # Give every player a stable row in the simulation matrices. The columnar table is
+        # built once here and shared by field generation, game sampling, scoring and output
+        self.player_table = PlayerTable(self.player_dict.values(), self.matchups)
+        # ID -> player record, the first record wins like the old scans over player_dict
+        self.players_by_id = {}
+        for player in self.player_dict.values():
+            self.players_by_id.setdefault(player["ID"], player)
+
     # In order to make reasonable tournament lineups, we want to be close enough to the optimal that
     # a person could realistically land on this lineup. Skeleton here is taken from base `mlb_optimizer.py`
     def get_optimal(self):
-        # print(s['Name'],s['ID'])
-        # print(self.player_dict)
-        problem = plp.LpProblem("NFL", plp.LpMaximize)
-        lp_variables = {
-            self.player_dict[(player, pos_str, team)]["ID"]: plp.LpVariable(
-                str(self.player_dict[(player, pos_str, team)]["ID"]), cat="Binary"
-            )
-            for (player, pos_str, team) in self.player_dict
-        }
-
-        # set the objective - maximize fpts
-        problem += (
-            plp.lpSum(
-                self.player_dict[(player, pos_str, team)]["fieldFpts"]
-                * lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                for (player, pos_str, team) in self.player_dict
-            ),
-            "Objective",
+        # The baseline is memoized per slate, so a sim on a slate the optimizer (or an earlier
+        # sim) already solved skips the LP
+        self.optimal_score = optimal_baseline.get_optimal_score(
+            [self.config["projection_path"], self.config["player_path"]],
+            self.site,
+            self.baseline_column,
+            self.player_dict.values(),
         )
 
-        # Set the salary constraints
-        problem += (
-            plp.lpSum(
-                self.player_dict[(player, pos_str, team)]["Salary"]
-                * lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                for (player, pos_str, team) in self.player_dict
-            )
-            <= self.salary
-        )
-
-        if self.site == "dk":
-            # Need 1 quarterback
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "QB" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                == 1
-            )
-            # Need at least 2 RBs can have up to 3 with FLEX slot
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "RB" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                >= 2
-            )
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "RB" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                <= 3
-            )
-            # Need at least 3 WRs can have up to 4 with FLEX slot
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "WR" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                >= 3
-            )
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "WR" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                <= 4
-            )
-            # Need at least 1 TE
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "TE" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                >= 1
-            )
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "TE" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                <= 2
-            )
-            # Need 1 DEF
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "DST" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                == 1
-            )
-            # Can only roster 9 total players
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                )
-                == 9
-            )
-            # Max 8 per team in case of weird issues with stacking on short slates
-            for team in self.team_list:
-                problem += (
-                    plp.lpSum(
-                        lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                        for (player, pos_str, team) in self.player_dict
-                        if self.player_dict[(player, pos_str, team)]["Team"] == team
-                    )
-                    <= 8
-                )
-
-        elif self.site == "fd":
-            # Need at least 1 point guard, can have up to 3 if utilizing G and UTIL slots
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "QB" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                == 1
-            )
-            # Need at least 2 RBs can have up to 3 with FLEX slot
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "RB" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                >= 2
-            )
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "RB" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                <= 3
-            )
-            # Need at least 3 WRs can have up to 4 with FLEX slot
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "WR" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                >= 3
-            )
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "WR" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                <= 4
-            )
-            # Need at least 1 TE
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "TE" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                >= 1
-            )
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "TE" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                <= 2
-            )
-            # Need 1 DEF
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                    if "DST" in self.player_dict[(player, pos_str, team)]["Position"]
-                )
-                == 1
-            )
-            # Can only roster 9 total players
-            problem += (
-                plp.lpSum(
-                    lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                    for (player, pos_str, team) in self.player_dict
-                )
-                == 9
-            )
-            # Max 4 per team
-            for team in self.team_list:
-                problem += (
-                    plp.lpSum(
-                        lp_variables[self.player_dict[(player, pos_str, team)]["ID"]]
-                        for (player, pos_str, team) in self.player_dict
-                        if self.player_dict[(player, pos_str, team)]["Team"] == team
-                    )
-                    <= 4
-                )
-
-        # print(f"Problem Name: {problem.name}")
-        # print(f"Sense: {problem.sense}")
-
-        # # Print the objective
-        # print("\nObjective:")
-        # try:
-        #     for v, coef in problem.objective.items():
-        #         print(f"{coef}*{v.name}", end=' + ')
-        # except Exception as e:
-        #     print(f"Error while printing objective: {e}")
-
-        # # Print the constraints
-        # print("\nConstraints:")
-        # for constraint in problem.constraints.values():
-        #     try:
-        #         # Extract the left-hand side, right-hand side, and the operator
-        #         lhs = "".join(f"{coef}*{var.name}" for var, coef in constraint.items())
-        #         rhs = constraint.constant
-        #         if constraint.sense == 1:
-        #             op = ">="
-        #         elif constraint.sense == -1:
-        #             op = "<="
-        #         else:
-        #             op = "="
-        #         print(f"{lhs} {op} {rhs}")
-        #     except Exception as e:
-        #         print(f"Error while printing constraint: {e}")
-
-        # # Print the variables
-        # print("\nVariables:")
-        # try:
-        #     for v in problem.variables():
-        #         print(f"{v.name}: LowBound={v.lowBound}, UpBound={v.upBound}, Cat={v.cat}")
-        # except Exception as e:
-        #     print(f"Error while printing variable: {e}")
-        # Crunch!
-        try:
-            if settings.ON_RAILWAY:
-                print("Solving on Railway")
-                problem.solve(plp.PULP_CBC_CMD(path='/root/.nix-profile/bin/cbc', msg=0))
-            else:
-                print("Solving on local")
-                print("RAILWAY_ENVIRONMENT:", os.getenv('RAILWAY_ENVIRONMENT'))
-                problem.solve(plp.PULP_CBC_CMD(msg=0))
-        except plp.PulpSolverError:
-            print(
-                "Infeasibility reached - only generated {} lineups out of {}. Continuing with export.".format(
-                    self.num_lineups, self.field_size
-                )
-            )
-        except TypeError:
-            for p, s in self.player_dict.items():
-                if s["ID"] == 0:
-                    print(
-                        s["Name"] + " name mismatch between projections and player ids"
-                    )
-                if s["ID"] == "":
-                    print(
-                        s["Name"] + " name mismatch between projections and player ids"
-                    )
-                if s["ID"] is None:
-                    print(s["Name"])
-
-        # Get the objective value
-        score = str(problem.objective)
-        for v in problem.variables():
-            if v.varValue is not None:  # Add None check
-                score = score.replace(v.name, str(v.varValue))
-            else:
-                score = score.replace(v.name, "0")  # Replace None with 0
-
-        self.optimal_score = float(eval(score))
+    @classmethod
+    def load_baseline_players(cls, projection_path, player_path, site):
+        # Parse a slate the way __init__ does without the rest of the simulator, so the
+        # baseline can be warmed from outside a simulation. The variance settings only
+        # change StdDev and Ceiling, which the baseline never reads
+        simulator = cls.__new__(cls)
+        simulator.site = site
+        simulator.default_qb_var = 0
+        simulator.default_skillpos_var = 0
+        simulator.default_def_var = 0
+        simulator.player_dict = {}
+        simulator.teams_dict = collections.defaultdict(list)
+        simulator.matchups = set()
+        simulator.game_info = {}
+        simulator.id_name_dict = {}
+        simulator.load_projections(projection_path)
+        simulator.load_player_ids(player_path)
+        simulator.assertPlayerDict()
+        return list(simulator.player_dict.values())
 
     @staticmethod
     def extract_matchup_time(game_string):
@@ -844,796 +1071,156 @@ class NFL_GPP_Simulator:
         else:
             return cell_value
 
-    def load_lineups_from_file(self):
+    def load_lineups_from_file(self, path=None):
         print("loading lineups")
-        i = 0
-        path = os.path.join(
-            os.path.dirname(__file__),
-            "../{}_data/{}".format(self.site, "tournament_lineups.csv"),
+        if path is None:
+            path = os.path.join(
+                os.path.dirname(__file__),
+                "../{}_data/{}".format(self.site, "tournament_lineups.csv"),
+            )
+        table = self.player_table
+        # only the first field_size lineups are used
+        reader = pd.read_csv(path, nrows=self.field_size)
+        if reader.shape[1] < 9:
+            raise ValueError(
+                "tournament_lineups.csv needs 9 player columns, found {}".format(
+                    reader.shape[1]
+                )
+            )
+        # Pull the IDs out of every cell at once, cells look like "Name (ID)", "ID:Name" or "ID"
+        cells = reader.iloc[:, :9].astype(str).to_numpy().ravel()
+        cells = pd.Series(cells)
+        lineup_ids = cells.where(
+            ~cells.str.contains(":", regex=False), cells.str.split(":").str[1]
         )
-        with open(path) as file:
-            reader = pd.read_csv(file)
-            lineup = []
-            j = 0
-            for i, row in reader.iterrows():
-                # print(row)
-                if i == self.field_size:
-                    break
-                lineup = [self.extract_id(str(row[j])) for j in range(9)]
-                # storing if this lineup was made by an optimizer or with the generation process in this script
-                error = False
-                for l in lineup:
-                    ids = [self.player_dict[k]["ID"] for k in self.player_dict]
-                    if l not in ids:
-                        print("lineup {} is missing players {}".format(i, l))
-                        if l in self.id_name_dict:
-                            print(self.id_name_dict[l])
-                        error = True
-                if len(lineup) < 9:
-                    print("lineup {} is missing players".format(i))
-                    continue
-                # storing if this lineup was made by an optimizer or with the generation process in this script
-                error = False
-                for l in lineup:
-                    ids = [self.player_dict[k]["ID"] for k in self.player_dict]
-                    if l not in ids:
-                        print("lineup {} is missing players {}".format(i, l))
-                        if l in self.id_name_dict:
-                            print(self.id_name_dict[l])
-                        error = True
-                if len(lineup) < 9:
-                    print("lineup {} is missing players".format(i))
-                    continue
-                if not error:
-                    # reshuffle lineup to match temp_roster_construction
-                    temp_roster_construction = [
-                        "DST",
-                        "QB",
-                        "RB",
-                        "RB",
-                        "WR",
-                        "WR",
-                        "WR",
-                        "TE",
-                        "FLEX",
-                    ]
-                    shuffled_lu = []
+        has_parens = cells.str.contains("(", regex=False) & cells.str.contains(
+            ")", regex=False
+        )
+        # fillna keeps the split strings when no cell has parens at all
+        lineup_ids = lineup_ids.where(
+            ~has_parens,
+            cells.str.split("(").str[1].fillna("").str.replace(")", "", regex=False),
+        )
+        rows = lineup_ids.map(table.rows).to_numpy(dtype=np.float64).reshape(-1, 9)
 
-                    id_to_player_dict = {
-                        v["ID"]: v for k, v in self.player_dict.items()
-                    }
-                    lineup_copy = lineup.copy()
-                    position_counts = {
-                        "DST": 0,
-                        "QB": 0,
-                        "RB": 0,
-                        "WR": 0,
-                        "TE": 0,
-                        "FLEX": 0,
-                    }
-                    z = 0
-
-                    while z < 9:
-                        for t in temp_roster_construction:
-                            if position_counts[t] < temp_roster_construction.count(t):
-                                for l in lineup_copy:
-                                    player_info = id_to_player_dict.get(l)
-                                    if player_info and t in player_info["Position"]:
-                                        shuffled_lu.append(l)
-                                        lineup_copy.remove(l)
-                                        position_counts[t] += 1
-                                        z += 1
-                                        if z == 9:
-                                            break
-                            if z == 9:
-                                break
-                    lineup_list = sorted(shuffled_lu)           
-                    lineup_set = frozenset(lineup_list)
-
-                    # Keeping track of lineup duplication counts
-                    if lineup_set in self.seen_lineups:
-                        self.seen_lineups[lineup_set] += 1
-                    else:
-                        # Add to seen_lineups and seen_lineups_ix
-                        self.seen_lineups[lineup_set] = 1
-                        self.seen_lineups_ix[lineup_set] = j
-                        self.field_lineups[j] = {
-                            "Lineup": shuffled_lu,
-                            "Wins": 0,
-                            "Top1Percent": 0,
-                            "ROI": 0,
-                            "Cashes": 0,
-                            "Type": "opto",
-                            "Count" : 1
-                        }
-                        j += 1
+        # Report every lineup with unknown players in one go and skip them
+        unknown = np.isnan(rows)
+        if unknown.any():
+            missing = sorted(set(lineup_ids.to_numpy()[unknown.ravel()]))
+            print(
+                "{} lineups are missing players and were skipped: {}".format(
+                    int(unknown.any(axis=1).sum()),
+                    ", ".join(
+                        "{} ({})".format(l, self.id_name_dict[l])
+                        if l in self.id_name_dict
+                        else l
+                        for l in missing
+                    ),
+                )
+            )
+        rows = rows[~unknown.any(axis=1)].astype(np.int64)
+
+        # reshuffle lineups to match the DST-first temp_roster_construction
+        rows = self.assign_lineup_slots(rows)
+        unassigned = rows[:, 0] < 0
+        if unassigned.any():
+            print(
+                "{} lineups do not fit the roster construction and were skipped".format(
+                    int(unassigned.sum())
+                )
+            )
+        rows = rows[~unassigned]
+
+        # Keeping track of lineup duplication counts
+        keys = np.sort(rows, axis=1).astype(np.int32)
+        j = 0
+        for lineup_rows, key in zip(rows.tolist(), keys):
+            lineup_key = key.tobytes()
+            if lineup_key in self.lineup_index:
+                self.field_lineups[self.lineup_index[lineup_key]]["Count"] += 1
+            else:
+                self.lineup_index[lineup_key] = j
+                self.field_lineups[j] = {
+                    "Lineup": [table.ids[row] for row in lineup_rows],
+                    "Wins": 0,
+                    "Top1Percent": 0,
+                    "ROI": 0,
+                    "Cashes": 0,
+                    "Type": "opto",
+                    "Count" : 1
+                }
+                j += 1
         print("loaded {} lineups".format(j))
         #print(len(self.field_lineups))
 
-    @staticmethod
-    def generate_lineups(
-        lu_num,
-        ids,
-        in_lineup,
-        pos_matrix,
-        ownership,
-        salary_floor,
-        salary_ceiling,
-        optimal_score,
-        salaries,
-        projections,
-        max_pct_off_optimal,
-        teams,
-        opponents,
-        team_stack,
-        stack_len,
-        overlap_limit,
-        max_stack_len,
-        matchups,
-        num_players_in_roster,
-        site,
-    ):
-        # new random seed for each lineup (without this there is a ton of dupes)
-        rng = np.random.Generator(np.random.PCG64())
-        lus = {}
-        # make sure nobody is already showing up in a lineup
-        if sum(in_lineup) != 0:
-            in_lineup.fill(0)
-        reject = True
-        iteration_count = 0
-        total_players = num_players_in_roster
-        issue = ""
-        complete = ""
-        reasonable_projection = optimal_score - (max_pct_off_optimal * optimal_score)
-        reasonable_stack_projection = optimal_score - (
-            (max_pct_off_optimal * 1.25) * optimal_score
+    def assign_lineup_slots(self, rows):
+        # Order the players of each lineup (lineups x 9 player rows) into the DST-first
+        # slots DST, QB, RB, RB, WR, WR, WR, TE, FLEX. Players are sorted by primary
+        # position, keeping their file order within a position, and the one player beyond
+        # the position minimums moves to FLEX. Lineups that only fit through a multi
+        # position player are solved one at a time, rows that fit no slots come back as -1
+        table = self.player_table
+        slot_positions = ["DST", "QB", "RB", "WR", "TE"]
+        required = np.array([1, 1, 2, 3, 1, 0])
+        label_rank = np.array(
+            [
+                slot_positions.index(pos) if pos in slot_positions else len(slot_positions)
+                for pos in table.position_labels
+            ],
+            dtype=np.int64,
         )
-        max_players_per_team = 4 if site == "fd" else None
-        # reject_counters = {
-        #     "salary_too_low": 0,
-        #     "salary_too_high": 0,
-        #     "projection_too_low": 0,
-        #     "invalid_matchups": 0,
-        #     "stack_length_insufficient": 0,
-        # }
-        # print(lu_num, ' started',  team_stack, max_stack_len)
-        while reject:
-            iteration_count += 1
-            if team_stack == "":
-                salary = 0
-                proj = 0
-                if sum(in_lineup) != 0:
-                    in_lineup.fill(0)
-                lineup = []
-                player_teams = []
-                def_opps = []
-                players_opposing_def = 0
-                lineup_matchups = []
-                k = 0
-                for pos in pos_matrix.T:
-                    if k < 1:
-                        # check for players eligible for the position and make sure they arent in a lineup, returns a list of indices of available player
-                        valid_players = np.nonzero((pos > 0) & (in_lineup == 0))[0]
-                        # grab names of players eligible
-                        plyr_list = ids[valid_players]
-                        # create np array of probability of being seelcted based on ownership and who is eligible at the position
-                        prob_list = ownership[valid_players]
-                        prob_list = prob_list / prob_list.sum()
-                        try:
-                            choice = rng.choice(plyr_list, p=prob_list)
-                        except:
-                            print(plyr_list, prob_list)
-                            print("find failed on nonstack and first player selection")
-                        choice_idx = np.nonzero(ids == choice)[0]
-                        lineup.append(str(choice))
-                        in_lineup[choice_idx] = 1
-                        salary += salaries[choice_idx]
-                        proj += projections[choice_idx]
-                        def_opp = opponents[choice_idx][0]
-                        lineup_matchups.append(matchups[choice_idx[0]])
-                        player_teams.append(teams[choice_idx][0])
-                    if k >= 1:
-                        remaining_salary = salary_ceiling - salary
-                        if players_opposing_def < overlap_limit:
-                            if k == total_players - 1:
-                                valid_players = np.nonzero(
-                                    (pos > 0)
-                                    & (in_lineup == 0)
-                                    & (salaries <= remaining_salary)
-                                    & (salary + salaries >= salary_floor)
-                                )[0]
-                            else:
-                                valid_players = np.nonzero(
-                                    (pos > 0)
-                                    & (in_lineup == 0)
-                                    & (salaries <= remaining_salary)
-                                )[0]
-                            # grab names of players eligible
-                            plyr_list = ids[valid_players]
-                            # create np array of probability of being seelcted based on ownership and who is eligible at the position
-                            prob_list = ownership[valid_players]
-                            prob_list = prob_list / prob_list.sum()
-                            if k == total_players - 1:
-                                boosted_salaries = np.array(
-                                    [
-                                        salary_boost(s, salary_ceiling)
-                                        for s in salaries[valid_players]
-                                    ]
-                                )
-                                boosted_probabilities = prob_list * boosted_salaries
-                                boosted_probabilities /= (
-                                    boosted_probabilities.sum()
-                                )  # normalize to ensure it sums to 1
-                            try:
-                                if k == total_players - 1:
-                                    choice = rng.choice(
-                                        plyr_list, p=boosted_probabilities
-                                    )
-                                else:
-                                    choice = rng.choice(plyr_list, p=prob_list)
-                            except:
-                                # if remaining_salary <= np.min(salaries):
-                                #     reject_counters["salary_too_high"] += 1
-                                # else:
-                                #     reject_counters["salary_too_low"]
-                                salary = 0
-                                proj = 0
-                                if team_stack == "":
-                                    lineup = []
-                                else:
-                                    lineup = np.zeros(shape=pos_matrix.shape[1]).astype(
-                                        str
-                                    )
-                                player_teams = []
-                                def_opps = []
-                                players_opposing_def = 0
-                                lineup_matchups = []
-                                in_lineup.fill(0)  # Reset the in_lineup array
-                                k = 0  # Reset the player index
-                                continue  # Skip to the next iteration of the while loop
-                            choice_idx = np.nonzero(ids == choice)[0]
-                            lineup.append(str(choice))
-                            in_lineup[choice_idx] = 1
-                            salary += salaries[choice_idx]
-                            proj += projections[choice_idx]
-                            player_teams.append(teams[choice_idx][0])
-                            lineup_matchups.append(matchups[choice_idx[0]])
-                            if teams[choice_idx][0] == def_opp:
-                                players_opposing_def += 1
-                            if max_players_per_team is not None:
-                                team_count = Counter(player_teams)
-                                if any(
-                                    count > max_players_per_team
-                                    for count in team_count.values()
-                                ):
-                                    salary = 0
-                                    proj = 0
-                                    if team_stack == "":
-                                        lineup = []
-                                    else:
-                                        lineup = np.zeros(
-                                            shape=pos_matrix.shape[1]
-                                        ).astype(str)
-                                    player_teams = []
-                                    def_opps = []
-                                    players_opposing_def = 0
-                                    lineup_matchups = []
-                                    in_lineup.fill(0)  # Reset the in_lineup array
-                                    k = 0  # Reset the player index
-                                    continue  # Skip to the next iteration of the while loop
-                        else:
-                            if k == total_players - 1:
-                                valid_players = np.nonzero(
-                                    (pos > 0)
-                                    & (in_lineup == 0)
-                                    & (salaries <= remaining_salary)
-                                    & (salary + salaries >= salary_floor)
-                                    & (teams != def_opp)
-                                )[0]
-                            else:
-                                valid_players = np.nonzero(
-                                    (pos > 0)
-                                    & (in_lineup == 0)
-                                    & (salaries <= remaining_salary)
-                                    & (teams != def_opp)
-                                )[0]
-                            # grab names of players eligible
-                            plyr_list = ids[valid_players]
-                            # create np array of probability of being seelcted based on ownership and who is eligible at the position
-                            prob_list = ownership[valid_players]
-                            prob_list = prob_list / prob_list.sum()
-                            boosted_salaries = np.array(
-                                [
-                                    salary_boost(s, salary_ceiling)
-                                    for s in salaries[valid_players]
-                                ]
-                            )
-                            boosted_probabilities = prob_list * boosted_salaries
-                            boosted_probabilities /= (
-                                boosted_probabilities.sum()
-                            )  # normalize to ensure it sums to 1
-                            try:
-                                choice = rng.choice(plyr_list, p=boosted_probabilities)
-                            except:
-                                salary = 0
-                                proj = 0
-                                if team_stack == "":
-                                    lineup = []
-                                else:
-                                    lineup = np.zeros(shape=pos_matrix.shape[1]).astype(
-                                        str
-                                    )
-                                player_teams = []
-                                def_opps = []
-                                players_opposing_def = 0
-                                lineup_matchups = []
-                                in_lineup.fill(0)  # Reset the in_lineup array
-                                k = 0  # Reset the player index
-                                continue  # Skip to the next iteration of the while loop
-                                # if remaining_salary <= np.min(salaries):
-                                #     reject_counters["salary_too_high"] += 1
-                                # else:
-                                #     reject_counters["salary_too_low"]
-                            choice_idx = np.nonzero(ids == choice)[0]
-                            lineup.append(str(choice))
-                            in_lineup[choice_idx] = 1
-                            salary += salaries[choice_idx]
-                            proj += projections[choice_idx]
-                            player_teams.append(teams[choice_idx][0])
-                            lineup_matchups.append(matchups[choice_idx[0]])
-                            if teams[choice_idx][0] == def_opp:
-                                players_opposing_def += 1
-                            if max_players_per_team is not None:
-                                team_count = Counter(player_teams)
-                                if any(
-                                    count > max_players_per_team
-                                    for count in team_count.values()
-                                ):
-                                    salary = 0
-                                    proj = 0
-                                    if team_stack == "":
-                                        lineup = []
-                                    else:
-                                        lineup = np.zeros(
-                                            shape=pos_matrix.shape[1]
-                                        ).astype(str)
-                                    player_teams = []
-                                    def_opps = []
-                                    players_opposing_def = 0
-                                    lineup_matchups = []
-                                    in_lineup.fill(0)  # Reset the in_lineup array
-                                    k = 0  # Reset the player index
-                                    continue  # Skip to the next iteration of the while loop
-                    k += 1
-                # Must have a reasonable salary
-                # if salary > salary_ceiling:
-                #     reject_counters["salary_too_high"] += 1
-                # elif salary < salary_floor:
-                #     reject_counters["salary_too_low"] += 1
-                if salary >= salary_floor and salary <= salary_ceiling:
-                    # Must have a reasonable projection (within 60% of optimal) **people make a lot of bad lineups
-                    if proj >= reasonable_projection:
-                        if len(set(lineup_matchups)) > 1:
-                            if max_players_per_team is not None:
-                                team_count = Counter(player_teams)
-                                if all(
-                                    count <= max_players_per_team
-                                    for count in team_count.values()
-                                ):
-                                    reject = False
-                                    lus[lu_num] = {
-                                        "Lineup": lineup,
-                                        "Wins": 0,
-                                        "Top1Percent": 0,
-                                        "ROI": 0,
-                                        "Cashes": 0,
-                                        "Type": "generated",
-                                        "Count": 0
-                                    }
-                                    if len(set(lineup)) != 9:
-                                        print(
-                                            "non stack lineup dupes",
-                                            lu_num,
-                                            plyr_stack_indices,
-                                            str(lu_num),
-                                            salaries[plyr_stack_indices],
-                                            lineup,
-                                            stack_len,
-                                            team_stack,
-                                            x,
-                                        )
-                            else:
-                                reject = False
-                                lus[lu_num] = {
-                                    "Lineup": lineup,
-                                    "Wins": 0,
-                                    "Top1Percent": 0,
-                                    "ROI": 0,
-                                    "Cashes": 0,
-                                    "Type": "generated",
-                                    "Count": 0
-                                }
-                                if len(set(lineup)) != 9:
-                                    print(
-                                        "stack lineup dupes",
-                                        lu_num,
-                                        plyr_stack_indices,
-                                        str(lu_num),
-                                        salaries[plyr_stack_indices],
-                                        lineup,
-                                        stack_len,
-                                        team_stack,
-                                        x,
-                                    )
-                            # complete = 'completed'
-                            # print(str(lu_num) + ' ' + complete)
-                    #     else:
-                    #         reject_counters["invalid_matchups"] += 1
-                    # else:
-                    #     reject_counters["projection_too_low"] += 1
-            else:
-                salary = 0
-                proj = 0
-                if sum(in_lineup) != 0:
-                    in_lineup.fill(0)
-                player_teams = []
-                def_opps = []
-                lineup_matchups = []
-                filled_pos = np.zeros(shape=pos_matrix.shape[1])
-                team_stack_len = 0
-                k = 0
-                stack = True
-                lineup = np.zeros(shape=pos_matrix.shape[1]).astype(str)
-                valid_team = np.nonzero(teams == team_stack)[0]
-                # select qb
-                qb = np.unique(
-                    valid_team[np.nonzero(pos_matrix[valid_team, 1] > 0)[0]]
-                )[0]
-                salary += salaries[qb]
-                proj += projections[qb]
-                # print(salary)
-                team_stack_len += 1
-                lineup[1] = ids[qb]
-                in_lineup[qb] = 1
-                lineup_matchups.append(matchups[qb])
-                valid_players = np.unique(
-                    valid_team[np.nonzero(pos_matrix[valid_team, 4:8] > 0)[0]]
-                )
-                player_teams.append(teams[qb])
-                players_opposing_def = 0
-                plyr_list = ids[valid_players]
-                prob_list = ownership[valid_players]
-                prob_list = prob_list / prob_list.sum()
-                while stack:
-                    try:
-                        choices = rng.choice(
-                            a=plyr_list, p=prob_list, size=stack_len, replace=False
-                        )
-                        if len(set(choices)) != len(choices):
-                            print(
-                                "choice dupe",
-                                plyr_stack_indices,
-                                str(lu_num),
-                                salaries[plyr_stack_indices],
-                                lineup,
-                                stack_len,
-                                team_stack,
-                                x,
-                            )
-                    except:
-                        stack = False
-                        continue
-                    plyr_stack_indices = np.nonzero(np.in1d(ids, choices))[0]
-                    x = 0
-                    for p in plyr_stack_indices:
-                        player_placed = False
-                        for l in np.nonzero(pos_matrix[p] > 0)[0]:
-                            if lineup[l] == "0.0":
-                                lineup[l] = ids[p]
-                                lineup_matchups.append(matchups[p])
-                                player_teams.append(teams[p])
-                                x += 1
-                                player_placed = True
-                                break
-                            if player_placed:
-                                break
-                    # print(plyr_stack_indices, str(lu_num), salaries[plyr_stack_indices], lineup, stack_len, x)
-                    if x == stack_len:
-                        in_lineup[plyr_stack_indices] = 1
-                        salary += sum(salaries[plyr_stack_indices])
-                        # rint(salary)
-                        proj += sum(projections[plyr_stack_indices])
-                        # print(proj)
-                        team_stack_len += stack_len
-                        x = 0
-                        stack = False
-                    else:
-                        stack = False
-                # print(sum(in_lineup), stack_len)
-                for ix, (l, pos) in enumerate(zip(lineup, pos_matrix.T)):
-                    if l == "0.0":
-                        if k < 1:
-                            valid_players = np.nonzero(
-                                (pos > 0) & (in_lineup == 0) & (opponents != team_stack)
-                            )[0]
-                            # grab names of players eligible
-                            plyr_list = ids[valid_players]
-                            # create np array of probability of being selected based on ownership and who is eligible at the position
-                            prob_list = ownership[valid_players]
-                            prob_list = prob_list / prob_list.sum()
-                            try:
-                                choice = rng.choice(plyr_list, p=prob_list)
-                            except:
-                                print("find failed on stack and first player selection")
-
-                            #    print(k, pos)
-                            choice_idx = np.nonzero(ids == choice)[0]
-                            in_lineup[choice_idx] = 1
-                            try:
-                                lineup[ix] = str(choice)
-                            except IndexError:
-                                print(lineup, choice, ix)
-                            salary += salaries[choice_idx]
-                            proj += projections[choice_idx]
-                            def_opp = opponents[choice_idx][0]
-                            lineup_matchups.append(matchups[choice_idx[0]])
-                            player_teams.append(teams[choice_idx][0])
-                            k += 1
-                        elif k >= 1:
-                            remaining_salary = salary_ceiling - salary
-                            if players_opposing_def < overlap_limit:
-                                if k == total_players - 1:
-                                    valid_players = np.nonzero(
-                                        (pos > 0)
-                                        & (in_lineup == 0)
-                                        & (salaries <= remaining_salary)
-                                        & (salary + salaries >= salary_floor)
-                                    )[0]
-                                else:
-                                    valid_players = np.nonzero(
-                                        (pos > 0)
-                                        & (in_lineup == 0)
-                                        & (salaries <= remaining_salary)
-                                    )[0]
-                                # grab names of players eligible
-                                plyr_list = ids[valid_players]
-                                # create np array of probability of being seelcted based on ownership and who is eligible at the position
-                                prob_list = ownership[valid_players]
-                                prob_list = prob_list / prob_list.sum()
-                                if k == total_players - 1:
-                                    boosted_salaries = np.array(
-                                        [
-                                            salary_boost(s, salary_ceiling)
-                                            for s in salaries[valid_players]
-                                        ]
-                                    )
-                                    boosted_probabilities = prob_list * boosted_salaries
-                                    boosted_probabilities /= (
-                                        boosted_probabilities.sum()
-                                    )  # normalize to ensure it sums to 1
-                                try:
-                                    if k == total_players - 1:
-                                        choice = rng.choice(
-                                            plyr_list, p=boosted_probabilities
-                                        )
-                                    else:
-                                        choice = rng.choice(plyr_list, p=prob_list)
-                                except:
-                                    salary = 0
-                                    proj = 0
-                                    if team_stack == "":
-                                        lineup = []
-                                    else:
-                                        lineup = np.zeros(
-                                            shape=pos_matrix.shape[1]
-                                        ).astype(str)
-                                    player_teams = []
-                                    def_opps = []
-                                    players_opposing_def = 0
-                                    lineup_matchups = []
-                                    in_lineup.fill(0)  # Reset the in_lineup array
-                                    k = 0  # Reset the player index
-                                    continue  # Skip to the next iteration of the while loop
-                                    # if remaining_salary <= np.min(salaries):
-                                    #     reject_counters["salary_too_high"] += 1
-                                    # else:
-                                    #     reject_counters["salary_too_low"]
-                                choice_idx = np.nonzero(ids == choice)[0]
-                                try:
-                                    lineup[ix] = str(choice)
-                                except IndexError:
-                                    print(lineup, choice, ix)
-                                in_lineup[choice_idx] = 1
-                                salary += salaries[choice_idx]
-                                proj += projections[choice_idx]
-                                player_teams.append(teams[choice_idx][0])
-                                lineup_matchups.append(matchups[choice_idx[0]])
-                                if max_players_per_team is not None:
-                                    team_count = Counter(player_teams)
-                                    if any(
-                                        count > max_players_per_team
-                                        for count in team_count.values()
-                                    ):
-                                        salary = 0
-                                        proj = 0
-                                        if team_stack == "":
-                                            lineup = []
-                                        else:
-                                            lineup = np.zeros(
-                                                shape=pos_matrix.shape[1]
-                                            ).astype(str)
-                                        player_teams = []
-                                        def_opps = []
-                                        players_opposing_def = 0
-                                        lineup_matchups = []
-                                        in_lineup.fill(0)  # Reset the in_lineup array
-                                        k = 0  # Reset the player index
-                                        continue  # Skip to the next iteration of the while loop
-                                if teams[choice_idx][0] == def_opp:
-                                    players_opposing_def += 1
-                                if teams[choice_idx][0] == team_stack:
-                                    team_stack_len += 1
-                            else:
-                                if k == total_players - 1:
-                                    valid_players = np.nonzero(
-                                        (pos > 0)
-                                        & (in_lineup == 0)
-                                        & (salaries <= remaining_salary)
-                                        & (salary + salaries >= salary_floor)
-                                        & (teams != def_opp)
-                                    )[0]
-                                else:
-                                    valid_players = np.nonzero(
-                                        (pos > 0)
-                                        & (in_lineup == 0)
-                                        & (salaries <= remaining_salary)
-                                        & (teams != def_opp)
-                                    )[0]
-                                # grab names of players eligible
-                                plyr_list = ids[valid_players]
-                                # create np array of probability of being seelcted based on ownership and who is eligible at the position
-                                prob_list = ownership[valid_players]
-                                prob_list = prob_list / prob_list.sum()
-                                boosted_salaries = np.array(
-                                    [
-                                        salary_boost(s, salary_ceiling)
-                                        for s in salaries[valid_players]
-                                    ]
-                                )
-                                boosted_probabilities = prob_list * boosted_salaries
-                                boosted_probabilities /= (
-                                    boosted_probabilities.sum()
-                                )  # normalize to ensure it sums to 1
-                                try:
-                                    choice = rng.choice(
-                                        plyr_list, p=boosted_probabilities
-                                    )
-                                except:
-                                    salary = 0
-                                    proj = 0
-                                    if team_stack == "":
-                                        lineup = []
-                                    else:
-                                        lineup = np.zeros(
-                                            shape=pos_matrix.shape[1]
-                                        ).astype(str)
-                                    player_teams = []
-                                    def_opps = []
-                                    players_opposing_def = 0
-                                    lineup_matchups = []
-                                    in_lineup.fill(0)  # Reset the in_lineup array
-                                    k = 0  # Reset the player index
-                                    continue  # Skip to the next iteration of the while loop
-                                    # if remaining_salary <= np.min(salaries):
-                                    #     reject_counters["salary_too_high"] += 1
-                                    # else:
-                                    #     reject_counters["salary_too_low"]
-                                choice_idx = np.nonzero(ids == choice)[0]
-                                lineup[ix] = str(choice)
-                                in_lineup[choice_idx] = 1
-                                salary += salaries[choice_idx]
-                                proj += projections[choice_idx]
-                                player_teams.append(teams[choice_idx][0])
-                                lineup_matchups.append(matchups[choice_idx[0]])
-                                if teams[choice_idx][0] == def_opp:
-                                    players_opposing_def += 1
-                                if teams[choice_idx][0] == team_stack:
-                                    team_stack_len += 1
-                                if max_players_per_team is not None:
-                                    team_count = Counter(player_teams)
-                                    if any(
-                                        count > max_players_per_team
-                                        for count in team_count.values()
-                                    ):
-                                        salary = 0
-                                        proj = 0
-                                        if team_stack == "":
-                                            lineup = []
-                                        else:
-                                            lineup = np.zeros(
-                                                shape=pos_matrix.shape[1]
-                                            ).astype(str)
-                                        player_teams = []
-                                        def_opps = []
-                                        players_opposing_def = 0
-                                        lineup_matchups = []
-                                        in_lineup.fill(0)  # Reset the in_lineup array
-                                        k = 0  # Reset the player index
-                                        continue  # Skip to the next iteration of the while loop
-                            k += 1
-                    else:
-                        k += 1
-                # Must have a reasonable salary
-                if team_stack_len >= stack_len:
-                    if salary >= salary_floor and salary <= salary_ceiling:
-                        # loosening reasonable projection constraint for team stacks
-                        if proj >= reasonable_stack_projection:
-                            if len(set(lineup_matchups)) > 1:
-                                if max_players_per_team is not None:
-                                    team_count = Counter(player_teams)
-                                    if all(
-                                        count <= max_players_per_team
-                                        for count in team_count.values()
-                                    ):
-                                        reject = False
-                                        lus[lu_num] = {
-                                            "Lineup": lineup,
-                                            "Wins": 0,
-                                            "Top1Percent": 0,
-                                            "ROI": 0,
-                                            "Cashes": 0,
-                                            "Type": "generated",
-                                            "Count": 0,
-                                        }
-                                        if len(set(lineup)) != 9:
-                                            print(
-                                                "stack lineup dupes",
-                                                lu_num,
-                                                plyr_stack_indices,
-                                                str(lu_num),
-                                                salaries[plyr_stack_indices],
-                                                lineup,
-                                                stack_len,
-                                                team_stack,
-                                                x,
-                                            )
-
-                                else:
-                                    reject = False
-                                    lus[lu_num] = {
-                                        "Lineup": lineup,
-                                        "Wins": 0,
-                                        "Top1Percent": 0,
-                                        "ROI": 0,
-                                        "Cashes": 0,
-                                        "Type": "generated",
-                                        "Count": 0,
-                                    }
-                                    if len(set(lineup)) != 9:
-                                        print(
-                                            "stack lineup dupes",
-                                            lu_num,
-                                            plyr_stack_indices,
-                                            str(lu_num),
-                                            salaries[plyr_stack_indices],
-                                            lineup,
-                                            stack_len,
-                                            team_stack,
-                                            x,
-                                        )
-                #             else:
-                #                 reject_counters["invalid_matchups"] += 1
-                #         else:
-                #             reject_counters["projection_too_low"] += 1
-                #     else:
-                #         if salary > salary_ceiling:
-                #             reject_counters["salary_too_high"] += 1
-                #         elif salary < salary_floor:
-                #             reject_counters["salary_too_low"] += 1
-                # else:
-                #     reject_counters["stack_length_insufficient"] += 1
-        # return lus, reject_counters
-        return lus
+        lineup_rank = label_rank[table.primary_position][rows]
+        counts = (lineup_rank[:, :, None] == np.arange(len(required))).sum(axis=1)
+        fits = (
+            (counts[:, :2] == 1).all(axis=1)
+            & (counts[:, 2:5] >= required[2:5]).all(axis=1)
+            & (counts[:, 5] == 0)
+        )
+
+        order = np.argsort(lineup_rank, axis=1, kind="stable")
+        sorted_rank = np.take_along_axis(lineup_rank, order, axis=1)
+        cols = np.arange(rows.shape[1])
+        new_group = np.ones(sorted_rank.shape, dtype=np.bool_)
+        new_group[:, 1:] = sorted_rank[:, 1:] != sorted_rank[:, :-1]
+        group_start = np.maximum.accumulate(np.where(new_group, cols, 0), axis=1)
+        is_flex = cols - group_start >= required[sorted_rank]
+        slot_order = np.argsort(
+            np.where(is_flex, len(slot_positions), sorted_rank), axis=1, kind="stable"
+        )
+        slotted = np.take_along_axis(rows, np.take_along_axis(order, slot_order, axis=1), axis=1)
+
+        if not fits.all():
+            eligibility = table.eligibility(
+                ["DST", "QB", "RB", "RB", "WR", "WR", "WR", "TE", "FLEX"]
+            )
+            for r in np.flatnonzero(~fits):
+                slotted[r] = self.fill_slots(rows[r], eligibility[:, rows[r]])
+        return slotted
+
+    @staticmethod
+    def fill_slots(lineup_rows, eligible):
+        # Depth first search for players to fill slots in order, eligible[slot, player]
+        picked = []
+
+        def fill(slot, used):
+            if slot == len(eligible):
+                return True
+            for player in range(len(lineup_rows)):
+                if not used & (1 << player) and eligible[slot, player]:
+                    picked.append(lineup_rows[player])
+                    if fill(slot + 1, used | (1 << player)):
+                        return True
+                    picked.pop()
+            return False
+
+        if not fill(0, 0):
+            return np.full(len(lineup_rows), -1)
+        return np.array(picked)
+
+    @staticmethod
+    def generate_lineups(*batch):
+        # Pool task, builds one batch of field lineups with the compiled generator
+        return build_lineup_batch(*batch)
 
     def generate_field_lineups(self):
         diff = self.field_size - len(self.field_lineups)
@@ -1645,14 +1232,7 @@ class NFL_GPP_Simulator:
             )
         else:
             print("Generating " + str(diff) + " lineups.")
-            ids = []
-            ownership = []
-            salaries = []
-            projections = []
-            positions = []
-            teams = []
-            opponents = []
-            matchups = []
+            table = self.player_table
             # put def first to make it easier to avoid overlap
             temp_roster_construction = [
                 "DST",
@@ -1665,119 +1245,123 @@ class NFL_GPP_Simulator:
                 "TE",
                 "FLEX",
             ]
-            for k in self.player_dict.keys():
-                if "Team" not in self.player_dict[k].keys():
-                    print(
-                        self.player_dict[k]["Name"],
-                        " name mismatch between projections and player ids!",
-                    )
-                ids.append(self.player_dict[k]["ID"])
-                ownership.append(self.player_dict[k]["Ownership"])
-                salaries.append(self.player_dict[k]["Salary"])
-                if self.player_dict[k]["fieldFpts"] >= self.projection_minimum:
-                    projections.append(self.player_dict[k]["fieldFpts"])
-                else:
-                    projections.append(0)
-                teams.append(self.player_dict[k]["Team"])
-                opponents.append(self.player_dict[k]["Opp"])
-                matchups.append(self.player_dict[k]["Matchup"])
-                pos_list = []
-                for pos in temp_roster_construction:
-                    if pos in self.player_dict[k]["Position"]:
-                        pos_list.append(1)
-                    else:
-                        pos_list.append(0)
-                positions.append(np.array(pos_list))
-            in_lineup = np.zeros(shape=len(ids))
-            ownership = np.array(ownership)
-            salaries = np.array(salaries)
-            projections = np.array(projections)
-            pos_matrix = np.array(positions)
-            ids = np.array(ids)
+            # The generator works on the player table's coded columns, indexed by player row
+            team_codes = table.team_codes
+            slot_eligibility = table.eligibility(temp_roster_construction)
+            # WR/TE can be stacked with their QB
+            stack_players = np.flatnonzero(slot_eligibility[4:8].any(axis=0))
+            ownership = table.ownership
+            salaries = table.salary
+            # the salary boosted weights of the final slot, computed once for every player
+            boosted_ownership = ownership * salary_boost(salaries, self.salary)
+            projections = np.where(
+                table.field_fpts >= self.projection_minimum, table.field_fpts, 0
+            )
+            teams = table.team
+            opponents = table.opp
+            matchups = table.game
             optimal_score = self.optimal_score
-            salary_floor = self.min_lineup_salary
-            salary_ceiling = self.salary
-            max_pct_off_optimal = self.max_pct_off_optimal
-            stack_usage = self.pct_field_using_stacks
-            teams = np.array(teams)
-            opponents = np.array(opponents)
-            overlap_limit = self.overlap_limit
-            problems = []
-            stacks = np.random.binomial(n=1, p=self.pct_field_using_stacks, size=diff)
-            stack_len = np.random.choice(
-                a=[1, 2],
-                p=[1 - self.pct_field_double_stacks, self.pct_field_double_stacks],
-                size=diff,
+            reasonable_projection = optimal_score - (
+                self.max_pct_off_optimal * optimal_score
             )
-            max_stack_len = 2
-            num_players_in_roster = len(self.roster_construction)
-            a = list(self.stacks_dict.keys())
-            p = np.array(list(self.stacks_dict.values()))
-            probs = p / sum(p)
-            stacks = stacks.astype(str)
-            for i in range(len(stacks)):
-                if stacks[i] == "1":
-                    choice = random.choices(a, weights=probs, k=1)
-                    stacks[i] = choice[0]
-                else:
-                    stacks[i] = ""
-            # creating tuples of the above np arrays plus which lineup number we are going to create
-            for i in range(diff):
-                lu_tuple = (
-                    i,
-                    ids,
-                    in_lineup,
-                    pos_matrix,
-                    ownership,
-                    salary_floor,
-                    salary_ceiling,
-                    optimal_score,
-                    salaries,
-                    projections,
-                    max_pct_off_optimal,
-                    teams,
-                    opponents,
-                    stacks[i],
-                    stack_len[i],
-                    overlap_limit,
-                    max_stack_len,
-                    matchups,
-                    num_players_in_roster,
-                    self.site,
+            reasonable_stack_projection = optimal_score - (
+                (self.max_pct_off_optimal * 1.25) * optimal_score
+            )
+            max_players_per_team = 4 if self.site == "fd" else len(temp_roster_construction)
+
+            # Stack assignments for every lineup up front, then fixed size batches with
+            # their own seeds so a seeded run builds the same field on any number of workers
+            field_seed = self.seed_sequence(1)
+            num_batches = math.ceil(diff / self.lineup_batch_size)
+            stack_seed, *batch_seeds = field_seed.spawn(1 + num_batches)
+            rng = np.random.default_rng(stack_seed)
+            # only teams whose QB made it into the player pool can be stacked
+            stack_team_names = [
+                team
+                for team in self.stacks_dict
+                if team in team_codes
+                and (slot_eligibility[1] & (teams == team_codes[team])).any()
+            ]
+            stack_teams = np.full(diff, -1, dtype=np.int64)
+            if stack_team_names:
+                p = np.array([self.stacks_dict[team] for team in stack_team_names])
+                uses_stack = rng.random(diff) < self.pct_field_using_stacks
+                chosen = rng.choice(len(stack_team_names), size=diff, p=p / p.sum())
+                stack_codes = np.array([team_codes[team] for team in stack_team_names])
+                stack_teams[uses_stack] = stack_codes[chosen[uses_stack]]
+            stack_lens = np.where(rng.random(diff) < self.pct_field_double_stacks, 2, 1)
+
+            problems = []
+            for b, batch_seed in enumerate(batch_seeds):
+                batch = slice(b * self.lineup_batch_size, (b + 1) * self.lineup_batch_size)
+                problems.append(
+                    (
+                        int(batch_seed.generate_state(1)[0]),
+                        stack_teams[batch],
+                        stack_lens[batch],
+                        slot_eligibility,
+                        stack_players,
+                        ownership,
+                        boosted_ownership,
+                        salaries,
+                        projections,
+                        teams,
+                        opponents,
+                        matchups,
+                        int(self.min_lineup_salary),
+                        int(self.salary),
+                        float(reasonable_projection),
+                        float(reasonable_stack_projection),
+                        float(self.overlap_limit),
+                        int(max_players_per_team),
+                        self.max_lineup_attempts,
+                    )
                 )
-                problems.append(lu_tuple)
             start_time = time.time()
-            with mp.Pool() as pool:
-                output = pool.starmap(self.generate_lineups, problems)
+            pool = get_pool()
+            lineups = np.concatenate(pool.starmap(self.generate_lineups, problems))
+            print("number of running processes =", get_worker_count())
+            built = lineups[:, 0] >= 0
+            if not built.all():
                 print(
-                    "number of running processes =",
-                    pool.__dict__["_processes"]
-                    if (pool.__dict__["_state"]).upper() == "RUN"
-                    else None,
+                    str(int((~built).sum()))
+                    + " lineups could not be built within "
+                    + str(self.max_lineup_attempts)
+                    + " attempts, check the salary and projection settings"
                 )
-                pool.close()
-                pool.join()
-            print("pool closed")
+            output = [
+                {
+                    lu_num: {
+                        "Lineup": [table.ids[row] for row in rows],
+                        "Wins": 0,
+                        "Top1Percent": 0,
+                        "ROI": 0,
+                        "Cashes": 0,
+                        "Type": "generated",
+                        "Count": 0,
+                    }
+                }
+                for lu_num, rows in enumerate(lineups[built].tolist())
+            ]
             self.update_field_lineups(output,diff)
             end_time = time.time()
             print("lineups took " + str(end_time - start_time) + " seconds")
-            print(str(diff) + " field lineups successfully generated")
+            print(str(len(output)) + " field lineups successfully generated")
             # print("Reject counters:", dict(overall_reject_counters))
 
             # print(self.field_lineups)
 
     def get_start_time(self, player_id):
-        for _, player in self.player_dict.items():
-            if player["ID"] == player_id:
-                matchup = player["Matchup"]
-                return self.game_info[matchup]
-        return None
+        player = self.players_by_id.get(player_id)
+        if player is None:
+            return None
+        return self.game_info[player["Matchup"]]
 
     def get_player_attribute(self, player_id, attribute):
-        for _, player in self.player_dict.items():
-            if player["ID"] == player_id:
-                return player.get(attribute, None)
-        return None
+        player = self.players_by_id.get(player_id)
+        if player is None:
+            return None
+        return player.get(attribute, None)
 
     def is_valid_for_position(self, player, position_idx):
         return any(
@@ -1818,6 +1402,19 @@ class NFL_GPP_Simulator:
 
         return lineup
 
+    def lineup_key(self, lineup):
+        # Canonical key of a lineup whatever its slot order: the sorted player rows packed
+        # into bytes
+        return np.sort(
+            np.array([self.player_table.rows[p] for p in lineup], dtype=np.int32)
+        ).tobytes()
+
+    def index_field_lineups(self):
+        # Lineups can be put straight into field_lineups (custom lineups from the view), so
+        # every lineup already in the field is indexed before new ones are merged in
+        for idx, lineup in self.field_lineups.items():
+            self.lineup_index.setdefault(self.lineup_key(lineup["Lineup"]), idx)
+
     def update_field_lineups(self, output, diff):
         if len(self.field_lineups) == 0:
             new_keys = list(range(0, self.field_size))
@@ -1830,184 +1427,131 @@ class NFL_GPP_Simulator:
             )
 
         nk = new_keys[0]
+        # Input, custom and generated lineups all share one index, so a duplicate is a
+        # single lookup and Count increment
+        self.index_field_lineups()
         for i, o in enumerate(output):
-            lineup_list = sorted(next(iter(o.values()))["Lineup"])
-            lineup_set = frozenset(lineup_list)
-
-            # Keeping track of lineup duplication counts
-            # if lineup_set in self.seen_lineups:
-            #     self.seen_lineups[lineup_set] += 1
-
-            #     # Increase the count in field_lineups using the index stored in seen_lineups_ix
-            #     self.field_lineups[self.seen_lineups_ix[lineup_set]]["Count"] += 1
-            # else:
-            #     self.seen_lineups[lineup_set] = 1
-
-            #     # Updating the field lineups dictionary
-            #     if nk in self.field_lineups.keys():
-            #         print("bad lineups dict, please check dk_data files")
-            #     else:
-            #         if self.site == "dk":
-            #             sorted_lineup = self.sort_lineup_by_start_time(
-            #                 next(iter(o.values()))["Lineup"]
-            #             )
-            #         else:
-            #             sorted_lineup = next(iter(o.values()))["Lineup"]
-
-            # Check if this lineup matches any existing input lineups
-            duplicate_of_input = False
-            for existing_idx, existing_lineup in self.field_lineups.items():
-                if frozenset(existing_lineup["Lineup"]) == lineup_set:
-                    # If it matches an input lineup, increment count and skip
-                    self.field_lineups[existing_idx]["Count"] += 1
-                    duplicate_of_input = True
-                    break
-
-            if not duplicate_of_input:
-                # If not a duplicate of input lineup, proceed with normal duplicate checking
-                if lineup_set in self.seen_lineups:
-                    self.seen_lineups[lineup_set] += 1
-                    self.field_lineups[self.seen_lineups_ix[lineup_set]]["Count"] += 1
+            lineup = next(iter(o.values()))
+            lineup_key = self.lineup_key(lineup["Lineup"])
+
+            if lineup_key in self.lineup_index:
+                self.field_lineups[self.lineup_index[lineup_key]]["Count"] += 1
+            elif nk in self.field_lineups.keys():
+                print("bad lineups dict, please check dk_data files")
+            else:
+                if self.site == "dk":
+                    sorted_lineup = self.sort_lineup_by_start_time(lineup["Lineup"])
                 else:
-                    self.seen_lineups[lineup_set] = 1
-                    if nk in self.field_lineups.keys():
-                        print("bad lineups dict, please check dk_data files")
-                    else:
-                        if self.site == "dk":
-                            sorted_lineup = self.sort_lineup_by_start_time(
-                                next(iter(o.values()))["Lineup"]
-                            )
-                        else:
-                            sorted_lineup = next(iter(o.values()))["Lineup"]
+                    sorted_lineup = lineup["Lineup"]
 
+                self.field_lineups[nk] = lineup
+                self.field_lineups[nk]["Lineup"] = sorted_lineup
+                self.field_lineups[nk]["Count"] = 1  # Start with count of 1
+                self.lineup_index[lineup_key] = nk
+                nk += 1
 
+    def calc_gamma(self, mean, sd):
+        alpha = (mean / sd) ** 2
+        beta = sd**2 / mean
+        return alpha, beta
 
+    @staticmethod
+    def build_covariance_matrix(players):
+        # players is a PlayerTable, its team and primary position codes let the whole
+        # matrix be filled with broadcasting instead of a correlation lookup per cell
+        std_devs = players.std_dev
+        team_codes = players.team
+        pos_codes = players.primary_position
+        num_pos = len(players.position_labels)
+
+        # Column k of the correlations holds each player's correlation with a teammate at
+        # position_labels[k], column num_pos + k the correlation with an opponent there
+        same_team = team_codes[:, None] == team_codes[None, :]
+        opponent_code = np.where(same_team, 0, num_pos)
+        corr_matrix = np.take_along_axis(
+            players.correlations, pos_codes[None, :] + opponent_code, axis=1
+        )
 
+        # Teammates at the same primary position use the fixed position correlation, 0 for
+        # positions without one
+        same_pos_corr = np.array(
+            [
+                NFL_GPP_Simulator.position_correlations.get(players.position_labels[code], 0)
+                for code in pos_codes
+            ],
+            dtype=np.float64,
+        )
+        same_team_and_pos = same_team & (pos_codes[:, None] == pos_codes[None, :])
+        corr_matrix = np.where(same_team_and_pos, same_pos_corr[:, None], corr_matrix)
 
-                    # self.field_lineups[nk] = next(iter(o.values()))
-                    # self.field_lineups[nk]["Lineup"] = sorted_lineup
-                    # self.field_lineups[nk]["Count"] += self.seen_lineups[lineup_set]
-                    # # Store the new nk in seen_lineups_ix for quick access in the future
-                    # self.seen_lineups_ix[lineup_set] = nk
-                    # nk += 1
+        # Custom player-to-player correlations take priority over everything else
+        corr_matrix[players.pair_rows, players.pair_cols] = players.pair_values
 
-                    self.field_lineups[nk] = next(iter(o.values()))
-                    self.field_lineups[nk]["Lineup"] = sorted_lineup
-                    self.field_lineups[nk]["Count"] = 1  # Start with count of 1
-                    self.seen_lineups_ix[lineup_set] = nk
-                    nk += 1
+        np.fill_diagonal(corr_matrix, 1)
+        covariance_matrix = corr_matrix * std_devs[:, None] * std_devs[None, :]
+        np.fill_diagonal(covariance_matrix, std_devs**2)  # Variance on the diagonal
+        return covariance_matrix, corr_matrix
 
-    def calc_gamma(self, mean, sd):
-        alpha = (mean / sd) ** 2
-        beta = sd**2 / mean
-        return alpha, beta
+    @staticmethod
+    def sample_game(means, covariance_matrix, num_iterations, seed, out, block_size=8192):
+        # Factorize the game's covariance matrix once. Cholesky covers the usual positive
+        # definite case; otherwise clip negative eigenvalues and use the eigenvector factor,
+        # which reproduces the PSD-repaired matrix without reconstructing it
+        try:
+            factor = np.linalg.cholesky(covariance_matrix)
+        except np.linalg.LinAlgError:
+            eigenvalues, eigenvectors = np.linalg.eigh(covariance_matrix)
+            eigenvalues[eigenvalues < 0] = 0
+            factor = eigenvectors * np.sqrt(eigenvalues)
+        factor = factor.astype(np.float32)
+        means = np.asarray(means, dtype=np.float32)[:, None]
+
+        # Draw standard normals in blocks of iterations and write each block straight into
+        # the players x iterations output so no float64 temporaries are created
+        rng = np.random.Generator(np.random.PCG64(seed))
+        for start in range(0, num_iterations, block_size):
+            end = min(start + block_size, num_iterations)
+            z = rng.standard_normal((factor.shape[1], end - start), dtype=np.float32)
+            np.matmul(factor, z, out=out[:, start:end])
+            out[:, start:end] += means
+        return out
 
     @staticmethod
     def run_simulation_for_game(
         team1_id,
-        team1,
         team2_id,
-        team2,
+        game,
         num_iterations,
-        roster_construction,
+        seed,
+        samples_name,
+        samples_shape,
+        first_row,
     ):
-        # Define correlations between positions
-
-        def get_corr_value(player1, player2):
-            # First, check for specific player-to-player correlations
-            if player2["Name"] in player1.get("Player Correlations", {}):
-                return player1["Player Correlations"][player2["Name"]]
-
-            # If no specific correlation is found, proceed with the general logic
-            position_correlations = {
-                "QB": -0.5,
-                "RB": -0.2,
-                "WR": 0.1,
-                "TE": -0.2,
-                "K": -0.5,
-                "DST": -0.5,
-            }
-
-            if player1["Team"] == player2["Team"] and player1["Position"][0] == player2["Position"][0]:
-                primary_position = player1["Position"][0]
-                return position_correlations[primary_position]
-
-            if player1["Team"] != player2["Team"]:
-                player_2_pos = "Opp " + str(player2["Position"][0])
-            else:
-                player_2_pos = player2["Position"][0]
-
-            return player1["Correlations"].get(
-                player_2_pos, 0
-            )  # Default to 0 if no correlation is found
-
-        def build_covariance_matrix(players):
-            N = len(players)
-            matrix = [[0 for _ in range(N)] for _ in range(N)]
-            corr_matrix = [[0 for _ in range(N)] for _ in range(N)]
-
-            for i in range(N):
-                for j in range(N):
-                    if i == j:
-                        matrix[i][j] = (
-                            players[i]["StdDev"] ** 2
-                        )  # Variance on the diagonal
-                        corr_matrix[i][j] = 1
-                    else:
-                        matrix[i][j] = (
-                            get_corr_value(players[i], players[j])
-                            * players[i]["StdDev"]
-                            * players[j]["StdDev"]
-                        )
-                        corr_matrix[i][j] = get_corr_value(players[i], players[j])
-            return matrix, corr_matrix
-
-        def ensure_positive_semidefinite(matrix):
-            eigs = np.linalg.eigvals(matrix)
-            if np.any(eigs < 0):
-                jitter = abs(min(eigs)) + 1e-6  # a small value
-                matrix += np.eye(len(matrix)) * jitter
-            return matrix
-
-        game = team1 + team2
-        covariance_matrix, corr_matrix = build_covariance_matrix(game)
+        covariance_matrix, corr_matrix = NFL_GPP_Simulator.build_covariance_matrix(game)
         # print(team1_id, team2_id)
         # print(corr_matrix)
-        corr_matrix = np.array(corr_matrix)
-
-        # Given eigenvalues and eigenvectors from previous code
-        eigenvalues, eigenvectors = np.linalg.eigh(covariance_matrix)
-
-        # Set negative eigenvalues to zero
-        eigenvalues[eigenvalues < 0] = 0
-
-        # Reconstruct the matrix
-        covariance_matrix = eigenvectors.dot(np.diag(eigenvalues)).dot(eigenvectors.T)
 
+        # Write straight into this game's rows of the shared players x iterations matrix
+        shm = shared_memory.SharedMemory(name=samples_name)
         try:
-            samples = multivariate_normal.rvs(
-                mean=[player["Fpts"] for player in game],
-                cov=covariance_matrix,
-                size=num_iterations,
-            )
-        except:
-            print(team1_id, team2_id, "bad matrix")
-
-        player_samples = []
-        for i, player in enumerate(game):
-            if "QB" in player["Position"]:
-                sample = samples[:, i]
-            else:
-                sample = samples[:, i]
-            # if player['Team'] in ['LAR','SEA']:
-            #     print(player['Name'], player['Fpts'], player['StdDev'], sample, np.mean(sample), np.std(sample))
-            player_samples.append(sample)
-
-        temp_fpts_dict = {}
-        # print(team1_id, team2_id, len(game), uniform_samples.T.shape, len(player_samples), covariance_matrix.shape )
+            player_samples = np.ndarray(samples_shape, dtype=np.float32, buffer=shm.buf)
+            samples = player_samples[first_row : first_row + len(game)]
+            try:
+                NFL_GPP_Simulator.sample_game(
+                    game.fpts,
+                    covariance_matrix,
+                    num_iterations,
+                    seed,
+                    samples,
+                )
+            except np.linalg.LinAlgError:
+                print(team1_id, team2_id, "bad matrix")
+                raise
+            del player_samples, samples
+        finally:
+            shm.close()
 
-        for i, player in enumerate(game):
-            temp_fpts_dict[player["ID"]] = player_samples[i]
+        # print(team1_id, team2_id, len(game), covariance_matrix.shape)
 
         # fig, (ax1, ax2, ax3,ax4) = plt.subplots(4, figsize=(15, 25))
         # fig.tight_layout(pad=5.0)
@@ -2050,160 +1594,261 @@ class NFL_GPP_Simulator:
         # plt.savefig(f'output/Team_{team1_id}{team2_id}_Distributions_Correlation.png', bbox_inches='tight')
         # plt.close()
 
-        return temp_fpts_dict
+        return team1_id, team2_id, len(game)
     
+    def get_lineup_rows(self):
+        # (N, 9) matrix of player rows, one row per field lineup in field_lineups order
+        missing = {
+            player
+            for values in self.field_lineups.values()
+            for player in values["Lineup"]
+            if player not in self.player_table.rows
+        }
+        if missing:
+            print("cant find players in sim index", missing)
+            raise ValueError(f"Lineups contain unknown player IDs: {sorted(missing)}")
+        return np.array(
+            [
+                [self.player_table.rows[player] for player in values["Lineup"]]
+                for values in self.field_lineups.values()
+            ],
+            dtype=np.int32,
+        ).reshape(-1, len(self.roster_construction))
+
     @staticmethod
-    @jit(nopython=True)
-    def calculate_payouts(args):
-        (
-            ranks,
-            payout_array,
-            entry_fee,
-            field_lineup_keys,
-            use_contest_data,
-            field_lineups_count,
-        ) = args
-        num_lineups = len(field_lineup_keys)
+    def score_lineups(player_samples, lineup_rows, out, chunk_size=2048):
+        # Score lineups a chunk at a time: each roster slot is one gather from the players x
+        # iterations sample matrix, summed into the matching rows of out
+        for start in range(0, len(lineup_rows), chunk_size):
+            rows = lineup_rows[start : start + chunk_size]
+            chunk = out[start : start + len(rows)]
+            chunk[:] = player_samples[rows[:, 0]]
+            for slot in range(1, rows.shape[1]):
+                chunk += player_samples[rows[:, slot]]
+        return out
+
+    @staticmethod
+    @jit(nopython=True, parallel=True)
+    def calculate_payouts(ranks, payout_cumsum, field_lineups_count, num_lineups):
+        # Prize won by every lineup summed over the iterations (columns) of ranks. Each
+        # thread takes a contiguous run of iterations and accumulates into its own row, so
+        # no two threads ever write to the same slot
+        num_iterations = ranks.shape[1]
+        num_chunks = max(min(get_num_threads(), num_iterations), 1)
+        thread_results = np.zeros((num_chunks, num_lineups))
+
+        for c in prange(num_chunks):
+            for r in range(
+                c * num_iterations // num_chunks, (c + 1) * num_iterations // num_chunks
+            ):
+                payout_index = 0
+                for i in range(ranks.shape[0]):
+                    lineup_index = ranks[i, r]
+                    lineup_count = field_lineups_count[lineup_index]
+                    prize_for_lineup = (
+                        (
+                            payout_cumsum[payout_index + lineup_count - 1]
+                            - payout_cumsum[payout_index - 1]
+                        )
+                        / lineup_count
+                        if payout_index != 0
+                        else payout_cumsum[payout_index + lineup_count - 1] / lineup_count
+                    )
+                    thread_results[c, lineup_index] += prize_for_lineup
+                    payout_index += lineup_count
+
         combined_result_array = np.zeros(num_lineups)
+        for c in range(num_chunks):
+            combined_result_array += thread_results[c]
+        return combined_result_array
 
-        payout_cumsum = np.cumsum(payout_array)
+    @staticmethod
+    def compile_kernels():
+        # Run the pool workers' numba kernels once on tiny inputs of the real dtypes so the
+        # compile happens before the first simulation instead of during it
+        build_lineup_batch(
+            0,
+            np.full(1, -1, dtype=np.int64),
+            np.ones(1, dtype=np.int64),
+            np.ones((9, 1), dtype=np.bool_),
+            np.zeros(1, dtype=np.int64),
+            np.ones(1),
+            np.ones(1),
+            np.ones(1, dtype=np.int64),
+            np.ones(1),
+            np.zeros(1, dtype=np.int64),
+            np.zeros(1, dtype=np.int64),
+            np.zeros(1, dtype=np.int64),
+            0,
+            1,
+            0.0,
+            0.0,
+            0.0,
+            9,
+            1,
+        )
 
-        for r in range(ranks.shape[1]):
-            ranks_in_sim = ranks[:, r]
-            payout_index = 0
-            for lineup_index in ranks_in_sim:
-                lineup_count = field_lineups_count[lineup_index]
-                prize_for_lineup = (
-                    (
-                        payout_cumsum[payout_index + lineup_count - 1]
-                        - payout_cumsum[payout_index - 1]
-                    )
-                    / lineup_count
-                    if payout_index != 0
-                    else payout_cumsum[payout_index + lineup_count - 1] / lineup_count
-                )
-                combined_result_array[lineup_index] += prize_for_lineup
-                payout_index += lineup_count
-        return combined_result_array    
+    @staticmethod
+    def compile_parallel_kernels():
+        # Same for the parallel payout kernel, which runs in this process and starts numba's
+        # thread pool
+        with _parallel_kernel_lock:
+            NFL_GPP_Simulator.calculate_payouts(
+                np.zeros((1, 1), dtype=np.uint32), np.zeros(1), np.ones(1, dtype=np.int64), 1
+            )
 
-    def run_tournament_simulation(self):
-        print("Running " + str(self.num_iterations) + " simulations")
-        for f in self.field_lineups:
-            if len(self.field_lineups[f]["Lineup"]) != 9:
-                print("bad lineup", f, self.field_lineups[f])
-        print(f"Number of unique field lineups: {len(self.field_lineups.keys())}")
+    def get_iteration_block_size(self, num_lineups, score_dtype):
+        # Iterations per tournament block, keeps the working set bounded by
+        # num_lineups x block size, not by num_lineups x num_iterations
+        if self.sim_block_size > 0:
+            return min(self.sim_block_size, self.num_iterations)
+        # float32 scores, the ranked copies in the score dtype and int64 argpartition output
+        bytes_per_cell = 4 + 2 * np.dtype(score_dtype).itemsize + 8
+        block_size = int(self.sim_memory_mb * 1024**2 // (bytes_per_cell * max(num_lineups, 1)))
+        return max(1, min(block_size, self.num_iterations))
 
-        start_time = time.time()
-        temp_fpts_dict = {}
-        size = self.num_iterations
+    @staticmethod
+    def rank_top_lineups(fpts_array, num_ranked):
+        # Indices of the num_ranked highest scoring lineups in every iteration (column), best
+        # first. argpartition isolates them in O(N) and only that slice is fully sorted
+        neg_fpts = -fpts_array
+        if num_ranked >= len(neg_fpts):
+            return np.argsort(neg_fpts, axis=0).astype(np.uint32)
+        top = np.argpartition(neg_fpts, num_ranked - 1, axis=0)[:num_ranked]
+        order = np.argsort(np.take_along_axis(neg_fpts, top, axis=0), axis=0)
+        return np.take_along_axis(top, order, axis=0).astype(np.uint32)
+
+    def simulate_player_samples(self, samples_name, samples_shape):
+        # Fill the shared players x iterations matrix one game at a time
         game_simulation_params = []
-        for m in self.matchups:
+        # independent, reproducible random streams for every game
+        table = self.player_table
+        game_seeds = self.seed_sequence(0).spawn(len(table.game_rows))
+        for (m, (first_row, last_row)), game_seed in zip(
+            table.game_rows.items(), game_seeds
+        ):
+            if first_row == last_row:
+                continue
             game_simulation_params.append(
                 (
                     m[0],
-                    self.teams_dict[m[0]],
                     m[1],
-                    self.teams_dict[m[1]],
+                    table.slice(first_row, last_row),
                     self.num_iterations,
-                    self.roster_construction,
+                    game_seed,
+                    samples_name,
+                    samples_shape,
+                    first_row,
                 )
             )
-        with mp.Pool() as pool:
-            results = pool.starmap(self.run_simulation_for_game, game_simulation_params)
-
-        for res in results:
-            temp_fpts_dict.update(res)
+        get_pool().starmap(self.run_simulation_for_game, game_simulation_params)
 
-        # generate arrays for every sim result for each player in the lineup and sum
-        fpts_array = np.zeros(shape=(len(self.field_lineups), self.num_iterations))
-        # converting payout structure into an np friendly format, could probably just do this in the load contest function
-        # print(self.field_lineups)
-        # print(temp_fpts_dict)
-        # print(payout_array)
-        # print(self.player_dict[('patrick mahomes', 'FLEX', 'KC')])
+    def accumulate_tournament(self, player_samples, score_dtype):
+        # Score, rank and pay out the field against the player samples. Returns the
+        # per lineup totals in field_lineups order
+        score_dtype = np.dtype(score_dtype)
         field_lineups_count = np.array(
             [self.field_lineups[idx]["Count"] for idx in self.field_lineups.keys()]
         )
-
-        for index, values in self.field_lineups.items():
-            try:
-                fpts_sim = sum([temp_fpts_dict[player] for player in values["Lineup"]])
-            except KeyError:
-                for player in values["Lineup"]:
-                    if player not in temp_fpts_dict.keys():
-                        print(player)
-                        # for k,v in self.player_dict.items():
-                        # if v['ID'] == player:
-                        #        print(k,v)
-                # print('cant find player in sim dict', values["Lineup"], temp_fpts_dict.keys())
-            # store lineup fpts sum in 2d np array where index (row) corresponds to index of field_lineups and columns are the fpts from each sim
-            fpts_array[index] = fpts_sim
-
-        fpts_array = fpts_array.astype(np.float16)
-        # ranks = np.argsort(fpts_array, axis=0)[::-1].astype(np.uint16)
-        ranks = np.argsort(-fpts_array, axis=0).astype(np.uint32)
-
-        # count wins, top 10s vectorized
-        wins, win_counts = np.unique(ranks[0, :], return_counts=True)
-        cashes, cash_counts = np.unique(ranks[0:len(list(self.payout_structure.values()))], return_counts=True)
-
-        top1pct, top1pct_counts = np.unique(
-            ranks[0 : math.ceil(0.01 * len(self.field_lineups)), :], return_counts=True
-        )
+        lineup_rows = self.get_lineup_rows()
+        num_lineups = len(lineup_rows)
 
         payout_array = np.array(list(self.payout_structure.values()))
         # subtract entry fee
         payout_array = payout_array - self.entry_fee
+        # pad out to every entry in the field so the payout slots of ranked lineups never
+        # run past the end of the array
+        num_entries = max(self.field_size, int(field_lineups_count.sum()))
         l_array = np.full(
-            shape=self.field_size - len(payout_array), fill_value=-self.entry_fee
+            shape=max(num_entries - len(payout_array), 0), fill_value=-self.entry_fee
         )
         payout_array = np.concatenate((payout_array, l_array))
-        field_lineups_keys_array = np.array(list(self.field_lineups.keys()))
+        payout_cumsum = np.cumsum(payout_array)
+        # print(payout_array)
+
+        # Running counters, one slot per field lineup in field_lineups order
+        wins = np.zeros(num_lineups, dtype=np.int64)
+        top1pct = np.zeros(num_lineups, dtype=np.int64)
+        cashes = np.zeros(num_lineups, dtype=np.int64)
+        combined_result_array = np.zeros(num_lineups)
+        # neighbouring ranked places with equal scores, their order is arbitrary
+        tied_places = 0
+        num_cash_places = len(self.payout_structure)
+        num_top1pct = math.ceil(0.01 * num_lineups)
+        # Every lineup takes up at least one payout slot, so a lineup ranked below
+        # num_cash_places can only receive the flat -entry_fee
+        num_ranked = min(num_lineups, max(num_cash_places, num_top1pct, 1))
+
+        # Stream the tournament through fixed size blocks of iterations: score, rank
+        # and accumulate each block, then drop it before moving on to the next
+        block_size = self.get_iteration_block_size(num_lineups, score_dtype)
+        fpts_buffer = np.empty((num_lineups, block_size), dtype=np.float32)
+        for block_start in range(0, self.num_iterations, block_size):
+            block_end = min(block_start + block_size, self.num_iterations)
+            block_iterations = block_end - block_start
+            fpts_array = fpts_buffer[:, :block_iterations]
+            self.score_lineups(
+                player_samples[:, block_start:block_end], lineup_rows, fpts_array
+            )
 
-        # Adjusted ROI calculation
-        # print(field_lineups_count.shape, payout_array.shape, ranks.shape, fpts_array.shape)
+            # Only the top num_ranked lineups of each iteration can cash, win or
+            # finish in the top 1%, so only those are ranked
+            scores = fpts_array.astype(score_dtype, copy=False)
+            ranks = self.rank_top_lineups(scores, num_ranked)
+            ranked_scores = np.take_along_axis(scores, ranks, axis=0)
+            tied_places += int(np.count_nonzero(ranked_scores[1:] == ranked_scores[:-1]))
+
+            # count wins, cashes and top 1% finishes vectorized
+            wins += np.bincount(ranks[0, :], minlength=num_lineups)
+            cashes += np.bincount(
+                ranks[:num_cash_places].ravel(), minlength=num_lineups
+            )
+            top1pct += np.bincount(
+                ranks[:num_top1pct].ravel(), minlength=num_lineups
+            )
 
-        # Split the simulation indices into chunks
-        field_lineups_keys_array = np.array(list(self.field_lineups.keys()))
+            # Adjusted ROI calculation, in process over the ranks of the whole block
+            with _parallel_kernel_lock:
+                combined_result_array += self.calculate_payouts(
+                    ranks, payout_cumsum, field_lineups_count, num_lineups
+                )
+            # everyone below the ranked places finishes out of the money
+            times_ranked = np.bincount(ranks.ravel(), minlength=num_lineups)
+            combined_result_array -= self.entry_fee * (
+                block_iterations - times_ranked
+            )
+            del scores, ranks, ranked_scores
+
+        return {
+            "Wins": wins,
+            "Top1Percent": top1pct,
+            "Cashes": cashes,
+            "ROI": combined_result_array,
+            "TieRate": tied_places / max((num_ranked - 1) * self.num_iterations, 1),
+        }
 
-        chunk_size = self.num_iterations // 16  # Adjust chunk size as needed
-        simulation_chunks = [
-            (
-                ranks[:, i : min(i + chunk_size, self.num_iterations)].copy(),
-                payout_array,
-                self.entry_fee,
-                field_lineups_keys_array,
-                self.use_contest_data,
-                field_lineups_count,
-            )  # Adding field_lineups_count here
-            for i in range(0, self.num_iterations, chunk_size)
-        ]
-
-        # Use the pool to process the chunks in parallel
-        with mp.Pool() as pool:
-            results = pool.map(self.calculate_payouts, simulation_chunks)
-
-        combined_result_array = np.sum(results, axis=0)
-
-        total_sum = 0
-        index_to_key = list(self.field_lineups.keys())
-        for idx, roi in enumerate(combined_result_array):
-            lineup_key = index_to_key[idx]
-            lineup_count = self.field_lineups[lineup_key][
-                "Count"
-            ]  # Assuming "Count" holds the count of the lineups
-            total_sum += roi * lineup_count
-            self.field_lineups[lineup_key]["ROI"] += roi
-
-        for idx in self.field_lineups.keys():
-            if idx in wins:
-                self.field_lineups[idx]["Wins"] += win_counts[np.where(wins == idx)][0]
-            if idx in top1pct:
-                self.field_lineups[idx]["Top1Percent"] += top1pct_counts[
-                    np.where(top1pct == idx)
-                ][0]
-            if idx in cashes:
-                self.field_lineups[idx]["Cashes"] += cash_counts[np.where(cashes == idx)][0]
+    def run_tournament_simulation(self):
+        print("Running " + str(self.num_iterations) + " simulations")
+        for f in self.field_lineups:
+            if len(self.field_lineups[f]["Lineup"]) != 9:
+                print("bad lineup", f, self.field_lineups[f])
+        print(f"Number of unique field lineups: {len(self.field_lineups.keys())}")
+
+        start_time = time.time()
+        # Game workers write their samples into one shared players x iterations matrix,
+        # so only the game metadata crosses the process boundary
+        samples_shape = (len(self.player_table), self.num_iterations)
+        with shared_ndarray(samples_shape, np.float32) as (samples_name, player_samples):
+            self.simulate_player_samples(samples_name, samples_shape)
+            results = self.accumulate_tournament(player_samples, self.score_dtype)
+            del player_samples
+
+        for idx, lineup_key in enumerate(self.field_lineups.keys()):
+            lineup = self.field_lineups[lineup_key]
+            lineup["ROI"] += results["ROI"][idx]
+            lineup["Wins"] += int(results["Wins"][idx])
+            lineup["Top1Percent"] += int(results["Top1Percent"][idx])
+            lineup["Cashes"] += int(results["Cashes"][idx])
 
         end_time = time.time()
         diff = end_time - start_time
@@ -2214,315 +1859,163 @@ class NFL_GPP_Simulator:
             + " seconds. Outputting."
         )
 
-    def output(self):
-        try:
-            unique = {}
-            for index, x in self.field_lineups.items():
-                # if index == 0:
-                #    print(x)
-                lu_type = x["Type"]
-                salary = 0
-                fpts_p = 0
-                fieldFpts_p = 0
-                ceil_p = 0
-                own_p = []
-                lu_names = []
-                lu_teams = []
-                qb_stack = 0
-                qb_tm = ""
-                players_vs_def = 0
-                def_opps = []
-                simDupes = x['Count']
-                for id in x["Lineup"]:
-                    for k, v in self.player_dict.items():
-                        if v["ID"] == id:
-                            if "DST" in v["Position"]:
-                                def_opps.append(v["Opp"])
-                            if "QB" in v["Position"]:
-                                qb_tm = v["Team"]
-
-                for id in x["Lineup"]:
-                    for k, v in self.player_dict.items():
-                        if v["ID"] == id:
-                            salary += v["Salary"]
-                            fpts_p += v["Fpts"]
-                            fieldFpts_p += v["fieldFpts"]
-                            ceil_p += v["Ceiling"]
-                            own_p.append(v["Ownership"] / 100)
-                            lu_names.append(v["Name"])
-                            if "DST" not in v["Position"]:
-                                lu_teams.append(v["Team"])
-                                if v["Team"] in def_opps:
-                                    players_vs_def += 1
-                            continue
-
-                try:
-                    counter = collections.Counter(lu_teams)
-                    stacks = counter.most_common()
+    def lineup_metrics(self, lineup_rows):
+        """Projection, stack and matchup columns for lineups given as player table rows.
+
+        lineup_rows is the (lineups, slots) matrix of player rows in simulator slot order.
+        Every metric is a gather over the player table's columns. Totals accumulate slot
+        by slot, in the same order the old per-lineup loops added them up.
+        """
+        table = self.player_table
+        num_lineups, num_slots = lineup_rows.shape
+        num_teams = len(table.team_labels)
+        lineup_index = np.arange(num_lineups)
+
+        salary = np.zeros(num_lineups, dtype=np.int64)
+        fpts = np.zeros(num_lineups, dtype=np.float64)
+        field_fpts = np.zeros(num_lineups, dtype=np.float64)
+        ceiling = np.zeros(num_lineups, dtype=np.float64)
+        own_product = np.ones(num_lineups, dtype=np.float64)
+        for slot in range(num_slots):
+            rows = lineup_rows[:, slot]
+            salary += table.salary[rows]
+            fpts += table.fpts[rows]
+            field_fpts += table.field_fpts[rows]
+            ceiling += table.ceiling[rows]
+            own_product *= table.ownership[rows] / 100
+
+        teams = table.team[lineup_rows]
+        is_dst = table.has_position("DST")[lineup_rows]
+        is_qb = table.has_position("QB")[lineup_rows]
+
+        # Players per team, DSTs excluded, and the first slot each team appears in
+        stacked = ~is_dst
+        team_counts = np.bincount(
+            (lineup_index[:, None] * num_teams + teams)[stacked],
+            minlength=num_lineups * num_teams,
+        ).reshape(num_lineups, num_teams)
+        first_slot = np.full((num_lineups, num_teams), num_slots, dtype=np.int64)
+        for slot in reversed(range(num_slots)):
+            has_team = stacked[:, slot]
+            first_slot[lineup_index[has_team], teams[has_team, slot]] = slot
+
+        # The QB's team is the primary stack. The secondary stack is the biggest team,
+        # ties going to the team listed first, unless that team is the QB's own
+        qb_team = np.full(num_lineups, -1, dtype=np.int64)
+        for slot in range(num_slots):
+            qb_team = np.where(is_qb[:, slot], teams[:, slot], qb_team)
+        has_qb = qb_team >= 0
+        qb_count = np.where(has_qb, team_counts[lineup_index, np.maximum(qb_team, 0)], 0)
+        top_team = np.argmax(team_counts * (num_slots + 1) - first_slot, axis=1)
+        top_count = team_counts[lineup_index, top_team]
+
+        labels = np.array(table.team_labels + [""], dtype=str)
+        primary_stack = np.where(
+            has_qb & (qb_count > 0),
+            np.char.add(np.char.add(labels[qb_team], " "), qb_count.astype(str)),
+            "No Stack",
+        )
+        secondary_stack = np.where(
+            (top_count > 0) & (top_team != qb_team),
+            np.char.add(np.char.add(labels[top_team], " "), top_count.astype(str)),
+            "No Stack",
+        )
 
-                    # Find the QB team in stacks and set it as primary stack, remove it from stacks and subtract 1 to make sure qb isn't counted
-                    primaryStack = "No Stack"  # Default value
-                    secondaryStack = "No Stack"  # Default value
+        # Players facing one of the lineup's defenses
+        defended = np.zeros((num_lineups, num_teams), dtype=np.bool_)
+        opponents = table.opp[lineup_rows]
+        defended[np.nonzero(is_dst)[0], opponents[is_dst]] = True
+        players_vs_def = (stacked & defended[lineup_index[:, None], teams]).sum(axis=1)
+
+        return {
+            "Fpts": fpts,
+            "FieldFpts": field_fpts,
+            "Ceiling": ceiling,
+            "Salary": salary,
+            "Own%": own_product,
+            "Stack1 Type": primary_stack.astype(str),
+            "Stack2 Type": secondary_stack.astype(str),
+            "Players vs DST": players_vs_def.astype(np.int64),
+        }
 
-                    for s in stacks:
-                        if s[0] == qb_tm:
-                            primaryStack = str(qb_tm) + " " + str((s[1]))
-                            stacks.remove(s)
-                            break
+    def output(self):
+        """Builds the columnar SimulationResult for the finished tournament.
 
-                        # Only try to get secondary stack if there are remaining stacks
-                        if stacks:  # Check if any stacks remain after removing QB stack
-                            secondaryStack = str(stacks[0][0]) + " " + str(stacks[0][1])
-
-                except Exception as e:
-                    logger.error(f"Error processing stacks for lineup {index}: {str(e)}")
-                    primaryStack = "Error"
-                    secondaryStack = "Error"
-
-                # After removing QB team, the first team in stacks will be the team with most players not in QB stack
-                # secondaryStack = str(stacks[0][0]) + " " + str(stacks[0][1])
-                own_p = np.prod(own_p)
-                win_p = round(x["Wins"] / self.num_iterations * 100, 2)
-                top10_p = round(x["Top1Percent"] / self.num_iterations * 100, 2)
-                cash_p = round(x["Cashes"] / self.num_iterations * 100, 2)
-                if self.site == "dk":
-                    if self.use_contest_data:
-                        roi_p = round(
-                            x["ROI"] / self.entry_fee / self.num_iterations * 100, 2
-                        )
-                        roi_round = round(x["ROI"] / x['Count'] / self.num_iterations, 2)
-                        lineup_str = "{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{},{},{},{},{},${},{}%,{}%,{}%,{},{},{},{},{}".format(
-                            lu_names[1].replace("#", "-"),
-                            x["Lineup"][1],
-                            lu_names[2].replace("#", "-"),
-                            x["Lineup"][2],
-                            lu_names[3].replace("#", "-"),
-                            x["Lineup"][3],
-                            lu_names[4].replace("#", "-"),
-                            x["Lineup"][4],
-                            lu_names[5].replace("#", "-"),
-                            x["Lineup"][5],
-                            lu_names[6].replace("#", "-"),
-                            x["Lineup"][6],
-                            lu_names[7].replace("#", "-"),
-                            x["Lineup"][7],
-                            lu_names[8].replace("#", "-"),
-                            x["Lineup"][8],
-                            lu_names[0].replace("#", "-"),
-                            x["Lineup"][0],
-                            fpts_p,
-                            fieldFpts_p,
-                            ceil_p,
-                            salary,
-                            win_p,
-                            top10_p,
-                            roi_p,
-                            own_p,
-                            roi_round,
-                            primaryStack,
-                            secondaryStack,
-                            players_vs_def,
-                            lu_type,
-                            simDupes,
-                        )
-                    else:
-                        lineup_str = "{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{} ({}),{},{},{},{},{}%,{}%,{}%,{},{},{},{},{}".format(
-                            lu_names[1].replace("#", "-"),
-                            x["Lineup"][1],
-                            lu_names[2].replace("#", "-"),
-                            x["Lineup"][2],
-                            lu_names[3].replace("#", "-"),
-                            x["Lineup"][3],
-                            lu_names[4].replace("#", "-"),
-                            x["Lineup"][4],
-                            lu_names[5].replace("#", "-"),
-                            x["Lineup"][5],
-                            lu_names[6].replace("#", "-"),
-                            x["Lineup"][6],
-                            lu_names[7].replace("#", "-"),
-                            x["Lineup"][7],
-                            lu_names[8].replace("#", "-"),
-                            x["Lineup"][8],
-                            lu_names[0].replace("#", "-"),
-                            x["Lineup"][0],
-                            fpts_p,
-                            fieldFpts_p,
-                            ceil_p,
-                            salary,
-                            win_p,
-                            top10_p,
-                            own_p,
-                            primaryStack,
-                            secondaryStack,
-                            players_vs_def,
-                            lu_type,
-                            simDupes
-                        )
-                elif self.site == "fd":
-                    if self.use_contest_data:
-                        roi_p = round(
-                            x["ROI"] / x['Count'] / self.entry_fee / self.num_iterations * 100, 2
-                        )
-                        roi_round = round(x["ROI"] / x['Count'] / self.num_iterations, 2)
-                        lineup_str = "{}:{},{}:{},{}:{},{}:{},{}:{},{}:{},{},{},{},{},{}%,{}%,{}%,{},${},{},{},{},{},{},{},{},{},{},{},{}".format(
-                            x["Lineup"][1],
-                            lu_names[1].replace("#", "-"),
-                            x["Lineup"][2],
-                            lu_names[2].replace("#", "-"),
-                            x["Lineup"][3],
-                            lu_names[3].replace("#", "-"),
-                            x["Lineup"][4],
-                            lu_names[4].replace("#", "-"),
-                            x["Lineup"][5],
-                            lu_names[5].replace("#", "-"),
-                            x["Lineup"][6],
-                            lu_names[6].replace("#", "-"),
-                            x["Lineup"][7],
-                            lu_names[7].replace("#", "-"),
-                            x["Lineup"][8],
-                            lu_names[8].replace("#", "-"),
-                            x["Lineup"][0],
-                            lu_names[0].replace("#", "-"),
-                            fpts_p,
-                            fieldFpts_p,
-                            ceil_p,
-                            salary,
-                            win_p,
-                            top10_p,
-                            roi_p,
-                            own_p,
-                            roi_round,
-                            primaryStack,
-                            secondaryStack,
-                            players_vs_def,
-                            lu_type,
-                            simDupes
-                        )
-                    else:
-                        lineup_str = "{}:{},{}:{},{}:{},{}:{},{}:{},{}:{},{},{},{},{},{}%,{}%,{},{},{},{},{},{},{},{},{},{},{},{},{},{}".format(
-                            x["Lineup"][1],
-                            lu_names[1].replace("#", "-"),
-                            x["Lineup"][2],
-                            lu_names[2].replace("#", "-"),
-                            x["Lineup"][3],
-                            lu_names[3].replace("#", "-"),
-                            x["Lineup"][4],
-                            lu_names[4].replace("#", "-"),
-                            x["Lineup"][5],
-                            lu_names[5].replace("#", "-"),
-                            x["Lineup"][6],
-                            lu_names[6].replace("#", "-"),
-                            x["Lineup"][7],
-                            lu_names[7].replace("#", "-"),
-                            x["Lineup"][8],
-                            lu_names[8].replace("#", "-"),
-                            x["Lineup"][0],
-                            lu_names[0].replace("#", "-"),
-                            fpts_p,
-                            fieldFpts_p,
-                            ceil_p,
-                            salary,
-                            win_p,
-                            top10_p,
-                            own_p,
-                            primaryStack,
-                            secondaryStack,
-                            players_vs_def,
-                            lu_type,
-                            simDupes
-                        )
-                unique[index] = lineup_str
+        Nothing is written here, the CSV downloads are streamed from the saved result
+        when they are requested.
+        """
+        try:
+            table = self.player_table
+            records = list(self.field_lineups.values())
+            lineup_rows = np.array(
+                [[table.rows[player] for player in x["Lineup"]] for x in records],
+                dtype=np.int64,
+            ).reshape(len(records), -1)
+
+            lineups = self.lineup_metrics(lineup_rows)
+            lineups.update(
+                {
+                    "Wins": np.array([x["Wins"] for x in records], dtype=np.int64),
+                    "Top1Percent": np.array([x["Top1Percent"] for x in records], dtype=np.int64),
+                    "Cashes": np.array([x["Cashes"] for x in records], dtype=np.int64),
+                    "ROI": np.array([x["ROI"] for x in records], dtype=np.float64),
+                    "Count": np.array([x["Count"] for x in records], dtype=np.int64),
+                    "Type": np.array([x["Type"] for x in records], dtype=str),
+                }
+            )
 
-            formatted_timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            filename_out = (
-                f"{self.site}_gpp_sim_lineups_{self.field_size}_{self.num_iterations}_{formatted_timestamp}.csv"
+            # every player in the field, in order of first appearance, and each lineup's
+            # slots as indexes into them
+            unique_rows, first_seen, inverse = np.unique(
+                lineup_rows.ravel(), return_index=True, return_inverse=True
             )
-            out_dir = os.path.join(settings.MEDIA_ROOT, "simulator_output")
-            os.makedirs(out_dir, exist_ok=True)
-            lineups_out_path = os.path.join(out_dir, filename_out)
-            with open(lineups_out_path, "w") as f:
-                if self.site == "dk":
-                    if self.use_contest_data:
-                        f.write(
-                            "QB,RB,RB,WR,WR,WR,TE,FLEX,DST,Fpts Proj,Field Fpts Proj,Ceiling,Salary,Win %,Top 10%,ROI%,Proj. Own. Product,Avg. Return,Stack1 Type,Stack2 Type,Players vs DST,Lineup Type, Sim Dupes\n"
-                        )
-                    else:
-                        f.write(
-                            "QB,RB,RB,WR,WR,WR,TE,FLEX,DST,Fpts Proj,Field Fpts Proj,Ceiling,Salary,Win %,Top 10%, Proj. Own. Product,Stack1 Type,Stack2 Type,Players vs DST,Lineup Type, Sim Dupes\n"
-                        )
-                elif self.site == "fd":
-                    if self.use_contest_data:
-                        f.write(
-                            "QB,RB,RB,WR,WR,WR,TE,FLEX,DST,Fpts Proj,Field Fpts Proj,Ceiling,Salary,Win %,Top 10%,ROI%,Proj. Own. Product,Avg. Return,Stack1 Type,Stack2 Type,Players vs DST,Lineup Type, Sim Dupes\n"
-                        )
-                    else:
-                        f.write(
-                            "QB,RB,RB,WR,WR,WR,TE,FLEX,DST,Fpts Proj,Field Fpts Proj,Ceiling,Salary,Win %,Top 10%,Proj. Own. Product,Stack1 Type,Stack2 Type,Players vs DST,Lineup Type, Sim Dupes\n"
-                        )
+            order = np.argsort(first_seen, kind="stable")
+            player_rows = unique_rows[order]
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            lineup_players = rank[inverse].reshape(lineup_rows.shape).astype(np.int32)
+
+            team_labels = np.array(table.team_labels, dtype=str)
+            players = {
+                "ID": np.array(table.ids, dtype=str)[player_rows],
+                "Name": np.array(table.names, dtype=str)[player_rows],
+                "Position": np.array(
+                    ["/".join(table.position_lists[row]) for row in player_rows.tolist()],
+                    dtype=str,
+                ),
+                "Team": team_labels[table.team[player_rows]],
+            }
 
-                for fpts, lineup_str in unique.items():
-                    f.write("%s\n" % lineup_str)
+            # Exposure totals per player. bincount adds each lineup's values in field
+            # order, as the running totals always did
+            slots = lineup_players.ravel()
+            num_players = len(player_rows)
+
+            def player_totals(column):
+                weights = np.repeat(lineups[column], lineup_players.shape[1])
+                return np.bincount(slots, weights=weights, minlength=num_players)
+
+            exposures = {
+                "Wins": player_totals("Wins").astype(np.int64),
+                "Top1Percent": player_totals("Top1Percent").astype(np.int64),
+                "In": player_totals("Count").astype(np.int64),
+                "ROI": player_totals("ROI"),
+                "Proj. Own%": table.ownership[player_rows],
+            }
 
-            formatted_timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            filename_out = (
-                f"{self.site}_gpp_sim_player_exposure_{self.field_size}_{self.num_iterations}_{formatted_timestamp}.csv"
+            return SimulationResult(
+                self.site,
+                self.field_size,
+                self.num_iterations,
+                self.use_contest_data,
+                self.entry_fee,
+                players,
+                lineup_players,
+                lineups,
+                exposures,
             )
-            out_dir = os.path.join(settings.MEDIA_ROOT, "simulator_output")
-            os.makedirs(out_dir, exist_ok=True)
-            exp_out_path = os.path.join(out_dir, filename_out)
-            with open(exp_out_path, "w") as f:
-                f.write(
-                    "Player,Position,Team,Win%,Top1%,Sim. Own%,Proj. Own%,Avg. Return\n"
-                )
-                unique_players = {}
-                for val in self.field_lineups.values():
-                    for player in val["Lineup"]:
-                        if player not in unique_players:
-                            unique_players[player] = {
-                                "Wins": val["Wins"],
-                                "Top1Percent": val["Top1Percent"],
-                                "In": val['Count'],
-                                "ROI": val["ROI"],
-                            }
-                        else:
-                            unique_players[player]["Wins"] = (
-                                unique_players[player]["Wins"] + val["Wins"]
-                            )
-                            unique_players[player]["Top1Percent"] = (
-                                unique_players[player]["Top1Percent"] + val["Top1Percent"]
-                            )
-                            unique_players[player]["In"] = unique_players[player]["In"] + val['Count']
-                            unique_players[player]["ROI"] = (
-                                unique_players[player]["ROI"] + val["ROI"]
-                            )
-                top1PercentCount = (0.01) * self.field_size
-                for player, data in unique_players.items():
-                    field_p = round(data["In"] / self.field_size * 100, 2)
-                    win_p = round(data["Wins"] / self.num_iterations * 100, 2)
-                    top10_p = round(data["Top1Percent"] / top1PercentCount / self.num_iterations  * 100, 2)
-                    roi_p = round(data["ROI"] / data["In"] / self.num_iterations, 2)
-                    for k, v in self.player_dict.items():
-                        if player == v["ID"]:
-                            proj_own = v["Ownership"]
-                            p_name = v["Name"]
-                            position = "/".join(v.get("Position"))
-                            team = v.get("Team")
-                            break
-                    f.write(
-                        "{},{},{},{}%,{}%,{}%,{}%,${}\n".format(
-                            p_name.replace("#", "-"),
-                            position,
-                            team,
-                            win_p,
-                            top10_p,
-                            field_p,
-                            proj_own,
-                            roi_p,
-                        )
-                    )
-            return lineups_out_path, exp_out_path
-        
+
         except Exception as e:
             logger.error(f"Error in simulator output method: {str(e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
-            raise
\ No newline at end of file
+            raise
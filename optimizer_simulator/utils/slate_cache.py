@@ -0,0 +1,115 @@
+import collections
+import copy
+import glob
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Bump when the shape of a cached slate changes so old pickles are never loaded
+CACHE_VERSION = 1
+
+# namespace -> OrderedDict of key -> slate, least recently used first
+_slates = collections.defaultdict(collections.OrderedDict)
+_slates_lock = threading.Lock()
+
+
+def get_cache_size():
+    return max(0, int(getattr(settings, 'SLATE_CACHE_SIZE', 8) or 0))
+
+
+def get_cache_dir():
+    return os.path.join(settings.MEDIA_ROOT, 'slate_cache')
+
+
+def slate_key(namespace, paths, fields):
+    """Hash of the slate files' contents plus the config fields that change how they parse"""
+    digest = hashlib.sha256()
+    digest.update(f'{namespace}:{CACHE_VERSION}'.encode())
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        digest.update(b'\0')
+    digest.update(json.dumps(fields, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def _cache_path(namespace, key):
+    return os.path.join(get_cache_dir(), f'{namespace}_{key}.pkl')
+
+
+def get(namespace, key):
+    """Return a private copy of the cached slate, or None on a miss"""
+    if get_cache_size() == 0:
+        return None
+    with _slates_lock:
+        slates = _slates[namespace]
+        slate = slates.get(key)
+        if slate is not None:
+            slates.move_to_end(key)
+            return copy.deepcopy(slate)
+
+    path = _cache_path(namespace, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            slate = pickle.load(f)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable slate cache file {path}: {str(e)}")
+        return None
+    _remember(namespace, key, slate)
+    return copy.deepcopy(slate)
+
+
+def put(namespace, key, slate):
+    """Cache a parsed slate in memory and on disk, callers keep their own copy"""
+    if get_cache_size() == 0:
+        return
+    slate = copy.deepcopy(slate)
+    _remember(namespace, key, slate)
+    try:
+        os.makedirs(get_cache_dir(), exist_ok=True)
+        path = _cache_path(namespace, key)
+        # write then rename so a concurrent reader never sees half a pickle
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(slate, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        _prune_disk(namespace)
+    except OSError as e:
+        logger.warning(f"Could not write slate cache for {namespace}: {str(e)}")
+
+
+def clear():
+    with _slates_lock:
+        _slates.clear()
+
+
+def _remember(namespace, key, slate):
+    with _slates_lock:
+        slates = _slates[namespace]
+        slates[key] = slate
+        slates.move_to_end(key)
+        while len(slates) > get_cache_size():
+            slates.popitem(last=False)
+
+
+def _prune_disk(namespace):
+    # keep the most recently written files of the namespace
+    paths = sorted(
+        glob.glob(os.path.join(get_cache_dir(), f'{namespace}_*.pkl')),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    for path in paths[get_cache_size():]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,98 @@
+import atexit
+import logging
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# One pool per server process, shared by every simulator phase and every request
+_pool = None
+_pool_lock = threading.Lock()
+# Imported by the forkserver before it forks the workers, see worker_preload
+PRELOAD_MODULES = ['optimizer_simulator.utils.worker_preload']
+
+
+def get_worker_count():
+    workers = int(getattr(settings, 'SIMULATOR_WORKERS', 0) or 0)
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def get_pool():
+    """Return the shared worker pool, starting it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # The pool can be started from a request or job thread, and forking a process
+            # that has threads can leave a worker holding a lock no thread will release.
+            # Workers are forked from a single-threaded forkserver instead, which preloads
+            # the worker code once and shares this process's resource tracker
+            workers = get_worker_count()
+            worker_settings = {
+                name: getattr(settings, name) for name in dir(settings) if name.isupper()
+            }
+            context = mp.get_context('forkserver')
+            context.set_forkserver_preload(PRELOAD_MODULES)
+            _pool = context.Pool(
+                workers, initializer=_init_worker, initargs=(worker_settings,)
+            )
+            atexit.register(shutdown_pool)
+            logger.info(f"Started simulator pool with {workers} workers")
+        return _pool
+
+
+def _init_worker(worker_settings):
+    # Workers are not copies of this process, give them the settings the pool started under
+    if not settings.configured:
+        settings.configure(**worker_settings)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.terminate()
+            _pool.join()
+            _pool = None
+
+
+def _worker_ready(_):
+    return os.getpid()
+
+
+def warm_up():
+    """Start the pool, whose forkserver compiles the workers' numba kernels, and compile
+    the payout kernel that runs in this process
+    """
+    from optimizer_simulator.utils.simulator import NFL_GPP_Simulator
+
+    start_time = time.time()
+    try:
+        pool = get_pool()
+        pool.map(_worker_ready, range(get_worker_count()))
+        NFL_GPP_Simulator.compile_parallel_kernels()
+        logger.info(f"Simulator pool warmed up in {time.time() - start_time:.2f} seconds")
+    except Exception as e:
+        logger.error(f"Error warming up simulator pool: {str(e)}")
+
+
+def should_warm_up():
+    if not getattr(settings, 'SIMULATOR_WARM_UP', True):
+        return False
+    # Management commands other than the dev server never run a simulation
+    if os.path.basename(sys.argv[0]) == 'manage.py':
+        if len(sys.argv) < 2 or sys.argv[1] != 'runserver':
+            return False
+        # the autoreloader's parent process only watches files
+        return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+    return True
+
+
+def start_warm_up():
+    # Warm up in the background so app startup and health checks are not held up. The
+    # workers come from the forkserver, so starting the pool here never forks this process
+    if should_warm_up():
+        threading.Thread(target=warm_up, name='simulator-warm-up', daemon=True).start()
@@ -0,0 +1,18 @@
+"""Imported once by the worker pool's forkserver, before it forks any worker.
+
+Everything done here, the imports and the numba compile, is inherited by every worker
+instead of being repeated in each of them.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from optimizer_simulator.utils.optimizer import NFL_Optimizer  # noqa: F401
+    from optimizer_simulator.utils.simulator import NFL_GPP_Simulator
+
+    NFL_GPP_Simulator.compile_kernels()
+except Exception as e:
+    # a failed preload must not take the forkserver down, workers then import and
+    # compile on first use
+    logger.error(f"Error preloading simulator workers: {str(e)}")
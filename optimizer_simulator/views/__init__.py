@@ -5,6 +5,7 @@ from .common_views import (
 from .optimizer_views import (
     download_output_view,
     run_optimizer_view,
+    submit_optimizer,
     optimizer_view,
     get_players,
     optimizer_stats_view,
@@ -14,12 +15,20 @@ from .optimizer_views import (
 from .simulator_views import (
     simulator_view,
     run_simulation,
+    submit_simulation,
     simulation_stats_view,    
 )
 
+from .job_views import (
+    job_status_view,
+    job_result_view,
+    job_lineups_view,
+)
+
 __all__ = [
     'upload_file',
     'run_optimizer_view',
+    'submit_optimizer',
     'download_output_view',
     'optimizer_view',
     'get_players',
@@ -27,5 +36,9 @@ __all__ = [
     'get_optimizer_stats_data',
     'simulator_view',
     'run_simulation',
+    'submit_simulation',
     'simulation_stats_view',
+    'job_status_view',
+    'job_result_view',
+    'job_lineups_view',
 ]
\ No newline at end of file
@@ -0,0 +1,76 @@
+from django.http import JsonResponse
+from optimizer_simulator.models import Job
+from optimizer_simulator.utils import jobs
+import logging
+
+logger = logging.getLogger(__name__)
+
+def job_status_view(request, job_id):
+    """Reports a background job's status, the phase it is in and how long each phase took"""
+    try:
+        job = Job.objects.get(id=job_id)
+    except Job.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+
+    return JsonResponse({
+        'success': True,
+        'job_id': str(job.id),
+        'kind': job.kind,
+        'status': job.status,
+        'phase': job.phase,
+        'timings': job.timings,
+        'error': job.error,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    })
+
+def job_result_view(request, job_id):
+    """Returns a finished job's results, the same JSON the synchronous endpoint sends"""
+    try:
+        job = Job.objects.get(id=job_id)
+    except Job.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+
+    if job.status == Job.FAILED:
+        return JsonResponse({'success': False, 'error': job.error}, status=500)
+    if job.status != Job.SUCCEEDED:
+        # still queued or running, poll the status endpoint
+        return JsonResponse({
+            'success': False,
+            'job_id': str(job.id),
+            'status': job.status,
+            'phase': job.phase,
+        }, status=202)
+    return JsonResponse(job.result)
+
+def job_lineups_view(request, job_id):
+    """Pages through the lineups a job has published so far.
+
+    ?offset= is the number of lineups the client already has. Keep polling with the
+    returned next_offset until done is true
+    """
+    try:
+        job = Job.objects.get(id=job_id)
+    except Job.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+
+    try:
+        offset = max(0, int(request.GET.get('offset', 0)))
+        limit = min(500, max(1, int(request.GET.get('limit', 100))))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'offset and limit must be integers'}, status=400)
+
+    # Read the status first, a finished job has already written every lineup
+    finished = job.done
+    lineups = jobs.read_stream(job.id, offset, limit)
+    return JsonResponse({
+        'success': job.status != Job.FAILED,
+        'job_id': str(job.id),
+        'status': job.status,
+        'phase': job.phase,
+        'error': job.error,
+        'lineups': lineups,
+        'next_offset': offset + len(lineups),
+        'done': finished and len(lineups) < limit,
+    })
@@ -5,104 +5,143 @@ from django.core.serializers.json import DjangoJSONEncoder
 from optimizer_simulator.utils.optimizer import NFL_Optimizer
 from optimizer_simulator.utils.optimizer_stats_processing import process_lineup_data
 from optimizer_simulator.utils.numpy_encoder import NumpyEncoder
+from optimizer_simulator.utils.optimal_baseline import start_warm_simulator_baseline
+from optimizer_simulator.utils import jobs
+from optimizer_simulator.utils.jobs import PhaseTimer
 import numpy as np
 import pandas as pd
 import os
 import logging
-import glob
 import json
 
 logger = logging.getLogger(__name__)
 
-def run_optimizer_view(request):
-    """Handles POST requests to run NFL lineup optimizer"""
-    if request.method == 'POST':
-        try:
-            config = json.loads(request.body.decode('utf-8'))
-            
-            # Load and validate player data
-            players_file = os.path.join(settings.MEDIA_ROOT, 'uploads', 'players.json')
-            with open(players_file, 'r') as f:
-                players = json.load(f)
-                for pos in ['QB', 'RB', 'WR', 'TE', 'DST']:
-                    sample = next((p for p in players if p['Position'] == pos), None)
-            
-            num_lineups = config.get('num_lineups', 10)
-            num_uniques = config.get('num_uniques', 1)
-            
-            # Set up file paths
-            config_path = os.path.join(settings.MEDIA_ROOT, 'uploads', 'config.json')
-            player_ids_path = os.path.join(settings.MEDIA_ROOT, 'uploads', 'player_ids.csv')
-            projections_path = os.path.join(settings.MEDIA_ROOT, 'uploads', 'projections.csv')
-
-            # Clean up old files
-            optimizer_output_dir = os.path.join(settings.MEDIA_ROOT, 'optimizer_output')
-            existing_files = glob.glob(os.path.join(optimizer_output_dir, 'dk_optimal_lineups*'))
-            for f in existing_files:
-                os.remove(f)
-
-            if os.path.exists(config_path):
-                os.remove(config_path)
-
-            # Build optimizer config
-            optimizer_config = {
-                "projection_path": projections_path,
-                "player_path": player_ids_path,
-                "contest_structure_path": "contest_structure.csv",
-                "use_double_te": config.get('use_double_te', True),
-                "global_team_limit": int(config.get('global_team_limit', 4)),
-                "projection_minimum": float(config.get('projection_minimum', 5)),
-                "randomness": float(config.get('randomness', 25)),
-                "min_lineup_salary": int(config.get('min_lineup_salary', 49200)),
-                "max_pct_off_optimal": float(config.get('max_pct_off_optimal', 0.25)),
-                "num_players_vs_def": int(config.get('num_players_vs_def', 0)),
-                "pct_field_using_stacks": float(config.get('pct_field_using_stacks', 0.65)),
-                "pct_field_double_stacks": float(config.get('pct_field_double_stacks', 0.4)),
-                "default_qb_var": float(config.get('default_qb_var', 0.4)),
-                "default_skillpos_var": float(config.get('default_skillpos_var', 0.5)),
-                "default_def_var": float(config.get('default_def_var', 0.5)),
-                "allow_qb_vs_dst": config.get('allow_qb_vs_dst', False),
-                "at_most": config.get('at_most', {}),
-                "at_least": config.get('at_least', {}),
-                "stack_rules": config.get('stack_rules', {}),
-                "matchup_limits": config.get('matchup_limits', {}),
-                "matchup_at_least": config.get('matchup_at_least', {}),
-                "team_limits": config.get('team_limits', {}),
-            }
+def output_files(result):
+    """Files an optimizer job's result points at, its download_url ends in the filename"""
+    return [os.path.basename(result.get('download_url', '').rstrip('/'))]
 
-            with open(config_path, 'w') as f:
-                json.dump(optimizer_config, f, indent=4)
-            
-            # Verify required files exist
-            required_files = [config_path, player_ids_path, projections_path]
-            for file_path in required_files:
-                if not os.path.exists(file_path):
-                    raise FileNotFoundError(f"Required file not found: {file_path}")
-            
-            # Run optimization
+def execute_optimizer(config, progress):
+    """Builds lineups from the user's config and returns the JSON results.
+
+    Each lineup is published through progress as soon as it is solved, background
+    jobs stream them to the client before the build finishes
+    """
+    with progress.phase('setup'):
+        # Load and validate player data
+        players_file = os.path.join(settings.MEDIA_ROOT, 'uploads', 'players.json')
+        with open(players_file, 'r') as f:
+            players = json.load(f)
+            for pos in ['QB', 'RB', 'WR', 'TE', 'DST']:
+                sample = next((p for p in players if p['Position'] == pos), None)
+
+        num_lineups = config.get('num_lineups', 10)
+        num_uniques = config.get('num_uniques', 1)
+
+        # Set up file paths
+        player_ids_path = os.path.join(settings.MEDIA_ROOT, 'uploads', 'player_ids.csv')
+        projections_path = os.path.join(settings.MEDIA_ROOT, 'uploads', 'projections.csv')
+
+        # Clean up old files, earlier jobs' downloads stay until they expire
+        jobs.prune_outputs(
+            os.path.join(settings.MEDIA_ROOT, 'optimizer_output'),
+            'dk_optimal_lineups*',
+            'optimizer',
+            output_files,
+        )
+
+        # Build optimizer config
+        optimizer_config = {
+            "projection_path": projections_path,
+            "player_path": player_ids_path,
+            "contest_structure_path": "contest_structure.csv",
+            "use_double_te": config.get('use_double_te', True),
+            "global_team_limit": int(config.get('global_team_limit', 4)),
+            "projection_minimum": float(config.get('projection_minimum', 5)),
+            "randomness": float(config.get('randomness', 25)),
+            "min_lineup_salary": int(config.get('min_lineup_salary', 49200)),
+            "max_pct_off_optimal": float(config.get('max_pct_off_optimal', 0.25)),
+            "num_players_vs_def": int(config.get('num_players_vs_def', 0)),
+            "pct_field_using_stacks": float(config.get('pct_field_using_stacks', 0.65)),
+            "pct_field_double_stacks": float(config.get('pct_field_double_stacks', 0.4)),
+            "default_qb_var": float(config.get('default_qb_var', 0.4)),
+            "default_skillpos_var": float(config.get('default_skillpos_var', 0.5)),
+            "default_def_var": float(config.get('default_def_var', 0.5)),
+            "allow_qb_vs_dst": config.get('allow_qb_vs_dst', False),
+            "at_most": config.get('at_most', {}),
+            "at_least": config.get('at_least', {}),
+            "stack_rules": config.get('stack_rules', {}),
+            "matchup_limits": config.get('matchup_limits', {}),
+            "matchup_at_least": config.get('matchup_at_least', {}),
+            "team_limits": config.get('team_limits', {}),
+        }
+
+        # Verify required files exist
+        required_files = [player_ids_path, projections_path]
+        for file_path in required_files:
+            if not os.path.exists(file_path):
+                raise FileNotFoundError(f"Required file not found: {file_path}")
+
+        # Run optimization, the config file only lives as long as the load
+        with jobs.run_config_file(optimizer_config) as config_path:
             optimizer = NFL_Optimizer(
                 site='dk',
                 num_lineups=num_lineups,
                 num_uniques=num_uniques,
                 config_path=config_path,
             )
+
+    with progress.phase('optimize'):
+        optimizer.lineup_callback = progress.publish
+        optimizer.optimize()
+
+    with progress.phase('output'):
+        output_file, lineup_data = optimizer.output()
+        if not lineup_data:
+            raise ValueError("No lineup data generated")
+
+        # Solve the simulator's optimal baseline for this slate while the user reviews
+        # the lineups, a sim launched next skips the LP
+        start_warm_simulator_baseline(projections_path, player_ids_path, 'dk')
+
+    download_url = f"/optimizer_simulator/download/{output_file}/"
+
+    return {
+        'success': True,
+        'lineups': lineup_data,
+        'download_url': download_url,
+        'timings': progress.timings,
+    }
+
+def run_optimizer_view(request):
+    """Handles POST requests to run NFL lineup optimizer"""
+    if request.method == 'POST':
+        try:
+            config = json.loads(request.body.decode('utf-8'))
+            return JsonResponse(execute_optimizer(config, PhaseTimer()))
             
-            optimizer.optimize()
-            
-            output_file, lineup_data = optimizer.output()
-            if not lineup_data:
-                raise ValueError("No lineup data generated")
-                
-            download_url = f"/optimizer_simulator/download/{output_file}/"
-            
+        except Exception as e:
+            logger.error(f"Error running optimizer: {str(e)}", exc_info=True)
+            return JsonResponse({'error': str(e)}, status=500)
+
+    return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+def submit_optimizer(request):
+    """Queues an optimizer run in the background and returns its job id straight away.
+
+    Lineups can be paged from jobs/<id>/lineups/ while the run is still solving
+    """
+    if request.method == 'POST':
+        try:
+            config = json.loads(request.body.decode('utf-8'))
+            job = jobs.submit('optimizer', execute_optimizer, config)
             return JsonResponse({
                 'success': True,
-                'lineups': lineup_data,
-                'download_url': download_url
-            })
-            
+                'job_id': str(job.id),
+                'status': job.status,
+            }, status=202)
+
         except Exception as e:
-            logger.error(f"Error running optimizer: {str(e)}", exc_info=True)
+            logger.error(f"Error submitting optimizer: {str(e)}", exc_info=True)
             return JsonResponse({'error': str(e)}, status=500)
 
     return JsonResponse({'error': 'Invalid request method'}, status=405)